@@ -0,0 +1,90 @@
+"""User accounts indexed by id and email."""
+import threading
+
+
+class UserStore:
+    """Users kept in registration order with id and email hash indexes.
+
+    Email lookups are exact matches, the same as comparing the stored
+    address with ``==``.
+    """
+
+    def __init__(self, users=()):
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_email = {}
+        self._last_id = 0
+        for user in users:
+            self._put(user)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    def get(self, user_id):
+        try:
+            return self._by_id.get(user_id)
+        except TypeError:  # unhashable ids from JSON bodies never match
+            return None
+
+    def get_by_email(self, email):
+        try:
+            return self._by_email.get(email)
+        except TypeError:
+            return None
+
+    def create(self, build):
+        """Add the user returned by build(new_id) and return it.
+
+        Returns None without adding anything when the email is already taken;
+        the check and the insert happen under one lock so concurrent sign-ups
+        cannot claim the same address or id.
+        """
+        with self._lock:
+            user = build(self._last_id + 1)
+            if user['email'] in self._by_email:
+                return None
+            self._put(user)
+            return user
+
+    def put(self, user):
+        """Insert a user or replace the one with the same id"""
+        with self._lock:
+            self._put(user)
+
+    def update(self, user, changes):
+        """Apply changes to a stored user, keeping the email index current.
+
+        Returns None without changing anything when the new email belongs to
+        another user.
+        """
+        with self._lock:
+            old_email = user.get('email')
+            if 'email' in changes and changes['email'] != old_email:
+                other = self.get_by_email(changes['email'])
+                if other is not None and other is not user:
+                    return None
+            user.update(changes)
+            if user.get('email') != old_email:
+                if self._by_email.get(old_email) is user:
+                    del self._by_email[old_email]
+                self._by_email[user.get('email')] = user
+        return user
+
+    def replace_all(self, users):
+        with self._lock:
+            self._by_id.clear()
+            self._by_email.clear()
+            self._last_id = 0
+            for user in users:
+                self._put(user)
+
+    def _put(self, user):
+        previous = self._by_id.get(user['id'])
+        if previous is not None and self._by_email.get(previous.get('email')) is previous:
+            del self._by_email[previous.get('email')]
+        self._by_id[user['id']] = user
+        self._last_id = max(self._last_id, user['id'])
+        self._by_email[user.get('email')] = user
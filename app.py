@@ -1,16 +1,72 @@
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, Response, jsonify, render_template, request, send_file
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_content_range_header
+from werkzeug.middleware.proxy_fix import ProxyFix
 import json
 import os
 import uuid
 from datetime import datetime
 import hashlib
-import secrets
+import hmac
+import atexit
+from contextlib import nullcontext
+from functools import wraps
+
+from accounts import UserStore
+from assets import ASSET_URL_PREFIX, BUILD_DIR, StaticAssets
+from blob_store import BlobStore, FileIndex, UploadError
+from catalog import Catalog
+from catalog_loader import CatalogReloader, Deferred, read_products
+from compression import Compressor
+from contacts import ContactStore
+from durability import FSYNC_POLICIES, Durability
+from exports import FILE_COLUMNS, FORMATS as EXPORT_FORMATS, ORDER_COLUMNS, export_response, file_rows, order_rows
+from facets import FACETS, FacetIndex
+from image_variants import VARIANTS, ImageVariants
+from inventory import Inventory, OutOfStock, order_quantities, valid_quantity
+from json_provider import FastJSONProvider
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics
+from order_store import OrderStore
+from pagination import DEFAULT_PAGE_SIZE, PaginationError, encode_cursor, list_response, page_args, project
+from payload_scanner import contact_xss, login_sqli, search_sqli
+from product_pages import DETAIL_PAGE, LISTING_PAGE, ProductPages
+from rate_limit import RateLimiter, parse_rules
+from response_cache import ResponseCache
+from sales_stats import WINDOWS, SalesAggregates
+from search_index import SearchIndex
+from sessions import SessionStore
+from shared_state import (SYNCHRONOUS, SharedCatalog, SharedDatabase, SqliteContactStore, SqliteFileIndex,
+                          SqliteInventory, SqliteOrderStore, SqliteSalesAggregates, SqliteSessionStore, SqliteUserStore)
+from write_behind import QueueFull, WriteBehindQueue
 
 # Serve static files directly from project root so index.html, common.js, etc. are available at '/'
 app = Flask(__name__, static_folder='.', static_url_path='')
 CORS(app)
 
+# JSON is encoded with orjson when it is installed; NGM_JSON=stdlib turns that off
+app.json = FastJSONProvider(app, use_orjson=os.environ.get('NGM_JSON', 'orjson') != 'stdlib')
+
+# Text and JSON responses of at least COMPRESS_MIN_BYTES are sent gzip or
+# brotli compressed when the client accepts it; NGM_COMPRESSION=off turns that off
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('NGM_COMPRESS_MIN_BYTES', 1024))
+compressor = Compressor(min_size=app.config['COMPRESS_MIN_BYTES'])
+if os.environ.get('NGM_COMPRESSION') != 'off':
+    compressor.install(app)
+
+# Per-route latency, size and error metrics served at /metrics. Requests slower
+# than SLOW_REQUEST_MS (0 turns the log off) are logged with a timing
+# breakdown. With several workers, NGM_METRICS_DIR is where each process
+# leaves its totals so /metrics can report all of them.
+app.config['SLOW_REQUEST_MS'] = float(os.environ.get('NGM_SLOW_REQUEST_MS', 1000))
+app.config['METRICS_DIR'] = os.environ.get('NGM_METRICS_DIR', '')
+request_metrics = Metrics(slow_ms=app.config['SLOW_REQUEST_MS'], directory=app.config['METRICS_DIR'] or None)
+
+def error_response(error):
+    """500 response for an exception a view caught, counted in the metrics"""
+    request_metrics.record_exception(error)
+    return jsonify({'error': str(error)}), 500
+
 # Configure upload folder
 UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx'}
@@ -21,99 +77,106 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
-# Static product data (no database as requested)
-PRODUCTS = [
-    {
-        "id": 1,
-        "name": "iPhone 15 Pro",
-        "price": 999,
-        "image": "https://via.placeholder.com/300x300?text=iPhone+15+Pro",
-        "description": "Latest iPhone with advanced camera system",
-        "brand": "Apple",
-        "storage": "128GB",
-        "color": "Natural Titanium"
-    },
-    {
-        "id": 2,
-        "name": "Samsung Galaxy S24",
-        "price": 899,
-        "image": "https://via.placeholder.com/300x300?text=Galaxy+S24",
-        "description": "Premium Android smartphone with AI features",
-        "brand": "Samsung",
-        "storage": "256GB",
-        "color": "Titanium Gray"
-    },
-    {
-        "id": 3,
-        "name": "Google Pixel 8",
-        "price": 699,
-        "image": "https://via.placeholder.com/300x300?text=Pixel+8",
-        "description": "Pure Android experience with excellent camera",
-        "brand": "Google",
-        "storage": "128GB",
-        "color": "Obsidian"
-    },
-    {
-        "id": 4,
-        "name": "OnePlus 12",
-        "price": 799,
-        "image": "https://via.placeholder.com/300x300?text=OnePlus+12",
-        "description": "Fast charging and smooth performance",
-        "brand": "OnePlus",
-        "storage": "256GB",
-        "color": "Silky Black"
-    },
-    {
-        "id": 5,
-        "name": "Xiaomi 14",
-        "price": 599,
-        "image": "https://via.placeholder.com/300x300?text=Xiaomi+14",
-        "description": "Great value flagship smartphone",
-        "brand": "Xiaomi",
-        "storage": "128GB",
-        "color": "Black"
-    },
-    {
-        "id": 6,
-        "name": "Huawei P60 Pro",
-        "price": 899,
-        "image": "https://via.placeholder.com/300x300?text=P60+Pro",
-        "description": "Premium camera and design",
-        "brand": "Huawei",
-        "storage": "256GB",
-        "color": "Rococo Pearl"
-    },
-    {
-        "id": 7,
-        "name": "Sony Xperia 1 V",
-        "price": 1299,
-        "image": "https://via.placeholder.com/300x300?text=Xperia+1+V",
-        "description": "Professional camera smartphone",
-        "brand": "Sony",
-        "storage": "256GB",
-        "color": "Black"
-    },
-    {
-        "id": 8,
-        "name": "Nothing Phone 2",
-        "price": 599,
-        "image": "https://via.placeholder.com/300x300?text=Nothing+Phone+2",
-        "description": "Unique transparent design",
-        "brand": "Nothing",
-        "storage": "128GB",
-        "color": "White"
+# Resized AVIF/WebP/JPEG variants of product photos, cached on disk by source hash
+image_variants = ImageVariants('images', os.path.join('images', '.cache'))
+
+# Uploaded bytes are stored once per distinct content under uploads/blobs/.
+# Open resumable uploads are capped in total and per client (see begin_upload).
+app.config['MAX_PARTIAL_UPLOADS'] = int(os.environ.get('NGM_MAX_PARTIAL_UPLOADS', 1000))
+app.config['MAX_PARTIAL_UPLOADS_PER_CLIENT'] = int(os.environ.get('NGM_MAX_PARTIAL_UPLOADS_PER_CLIENT', 10))
+blob_store = BlobStore(UPLOAD_FOLDER, max_partials=app.config['MAX_PARTIAL_UPLOADS'],
+                       max_partials_per_client=app.config['MAX_PARTIAL_UPLOADS_PER_CLIENT'])
+
+# Multi-worker mode: with NGM_SHARED_DB set to a file path, every worker
+# process keeps catalog, orders, users, sessions, contacts and uploads metadata
+# in that one SQLite database (see gunicorn.conf.py). The write-ahead log
+# below is not used then; SQLite makes the changes durable instead.
+# NGM_FSYNC sets how often either one is synced to disk.
+app.config['FSYNC_POLICY'] = os.environ.get('NGM_FSYNC', 'interval')
+if app.config['FSYNC_POLICY'] not in FSYNC_POLICIES:
+    raise ValueError(f"NGM_FSYNC must be one of {', '.join(FSYNC_POLICIES)}, "
+                     f"not {app.config['FSYNC_POLICY']!r}")
+app.config['SHARED_DB'] = os.environ.get('NGM_SHARED_DB', '')
+shared_db = None
+if app.config['SHARED_DB']:
+    shared_db = SharedDatabase(app.config['SHARED_DB'], synchronous=SYNCHRONOUS[app.config['FSYNC_POLICY']])
+
+# Fingerprinted, precompressed front end produced by `python assets.py`; when
+# no build exists the pages are served straight from the project root
+static_assets = StaticAssets(os.path.join(app.root_path, BUILD_DIR))
+
+def present_product(product):
+    images = image_variants.describe(product['photo']) if product.get('photo') else None
+    return dict(product, images=images) if images else product
+
+def page_path(filename):
+    """File an HTML page is served from"""
+    if static_assets.has_page(filename):
+        return static_assets.page_path(filename)
+    return os.path.join(app.static_folder, filename)
+
+# Products are read from a JSON Lines file, one product per line, at startup
+# and again on POST /api/admin/catalog/reload; NGM_CATALOG points at another file
+app.config['CATALOG_PATH'] = os.environ.get('NGM_CATALOG') or os.path.join(app.root_path, 'catalog.jsonl')
+
+# products.html and product-detail.html are sent with their products rendered
+# in, from fragments cached per product; NGM_SSR=off serves them as plain pages
+app.config['SSR_MAX_PRODUCTS'] = int(os.environ.get('NGM_SSR_MAX_PRODUCTS', 500))
+app.config['SSR'] = os.environ.get('NGM_SSR') != 'off'
+
+def build_catalog(products, ready=False):
+    """An indexed Catalog over products with the structures derived from it, for install_catalog.
+
+    The search and facet indexes are built in the background on first use,
+    or before returning when ``ready`` is set.
+    """
+    new_catalog = Catalog(products)
+    built = {
+        'catalog': new_catalog,
+        'search_index': Deferred(lambda: SearchIndex(new_catalog), name='search-index'),
+        'facet_index': Deferred(lambda: FacetIndex(new_catalog), name='facet-index'),
+        'product_pages': None,
     }
-]
+    if app.config['SSR']:
+        built['product_pages'] = ProductPages(new_catalog, page_path, app.jinja_env, present_product,
+                                              max_listing=app.config['SSR_MAX_PRODUCTS'])
+    if ready:
+        built['search_index'].get()
+        built['facet_index'].get()
+    return built
 
-# In-memory storage (no database)
-orders = []
-order_counter = 1
-users = []
-user_files = {}
-contacts = []
+def install_catalog(built):
+    """Make a catalog from build_catalog the one every endpoint uses"""
+    # A single dict update: no other thread runs until all the names are replaced
+    globals().update(built)
+    if shared_catalog is not None:
+        shared_catalog.catalog = built['catalog']
+    response_cache.clear()
 
-# Sample users for demo
-users = [
+catalog = search_index = facet_index = product_pages = None  # set by install_catalog
+# Encoded catalog responses, reused until the catalog version changes; NGM_RESPONSE_CACHE_MB
+# bounds their total size, and a single response over an eighth of it is not kept
+app.config['RESPONSE_CACHE_BYTES'] = int(os.environ.get('NGM_RESPONSE_CACHE_MB', 256)) * 1024 * 1024
+response_cache = ResponseCache(lambda: catalog.version, max_entry_bytes=app.config['RESPONSE_CACHE_BYTES'] // 8,
+                               max_bytes=app.config['RESPONSE_CACHE_BYTES'])
+# Reloads build the replacement catalog in a background thread and install it when complete
+catalog_reloader = CatalogReloader(lambda products: build_catalog(products, ready=True), install_catalog)
+# In multi-worker mode, products published by any worker are picked up here
+shared_catalog = SharedCatalog(shared_db, None, rebuild=catalog_reloader.reload) if shared_db is not None else None
+install_catalog(build_catalog(read_products(app.config['CATALOG_PATH'])))
+
+@app.before_request
+def build_catalog_indexes():
+    """Start the index builds in the process that serves requests (a no-op once started)"""
+    search_index.start()
+    facet_index.start()
+
+# Contact messages and uploads metadata (in memory unless NGM_SHARED_DB is set)
+user_files = SqliteFileIndex(shared_db) if shared_db is not None else FileIndex()
+contacts = SqliteContactStore(shared_db) if shared_db is not None else ContactStore()
+
+# Sample users for demo; the store indexes users by id and email
+DEMO_USERS = [
     {
         "id": 1,
         "firstName": "John",
@@ -126,9 +189,31 @@ users = [
         "createdAt": "2024-01-01T00:00:00Z"
     }
 ]
+user_store = SqliteUserStore(shared_db) if shared_db is not None else UserStore(DEMO_USERS)
+
+# Login sessions: bearer token -> user id, expiring after SESSION_TTL seconds
+app.config['SESSION_TTL'] = int(os.environ.get('NGM_SESSION_TTL', 24 * 3600))
+app.config['MAX_SESSIONS'] = int(os.environ.get('NGM_MAX_SESSIONS', 100000))
+if shared_db is not None:
+    sessions = SqliteSessionStore(shared_db, ttl=app.config['SESSION_TTL'], max_sessions=app.config['MAX_SESSIONS'])
+else:
+    sessions = SessionStore(ttl=app.config['SESSION_TTL'], max_sessions=app.config['MAX_SESSIONS'])
 
-# Sample orders for demo
-orders = [
+# Demo user the API falls back to when a request carries no valid session
+DEMO_USER_ID = 1
+
+def bearer_token():
+    auth = request.headers.get('Authorization', '')
+    scheme, _, token = auth.partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' else None
+
+def current_user_id():
+    """Id of the user behind the request's bearer token, or the demo user"""
+    user_id = sessions.resolve(bearer_token())
+    return DEMO_USER_ID if user_id is None else user_id
+
+# Sample orders for demo; the store indexes orders by id and by userId
+DEMO_ORDERS = [
     {
         "id": 1,
         "userId": 1,
@@ -142,43 +227,292 @@ orders = [
                 "name": "iPhone 15 Pro",
                 "price": 999,
                 "quantity": 1,
-                "image": "https://via.placeholder.com/60x60?text=iPhone+15+Pro"
+                "image": "https://via.placeholder.com/60x60?text=iPhone+15+Pro",
+                "brand": "Apple"
             }
         ],
         "shippingAddress": "123 Main St, City, State 12345",
         "trackingNumber": "TRK123456789"
     }
 ]
+order_store = SqliteOrderStore(shared_db) if shared_db is not None else OrderStore(DEMO_ORDERS)
+
+def _product_brand(product_id):
+    product = catalog.get(product_id)
+    return product['brand'] if product else None
+
+# Running totals and rolling windows, updated as orders are added and removed
+if shared_db is not None:
+    sales_stats = SqliteSalesAggregates(shared_db, order_store, brand_of=_product_brand)
+else:
+    sales_stats = SalesAggregates(order_store, brand_of=_product_brand)
+
+# Stock per product: its "stock" field if it has one, otherwise DEFAULT_STOCK.
+# Checkout reserves stock for every item of an order or fails with a 409.
+app.config['DEFAULT_STOCK'] = int(os.environ.get('NGM_DEFAULT_STOCK', 100))
+
+def _initial_stock(product_id):
+    product = catalog.get(product_id)
+    return product.get('stock', app.config['DEFAULT_STOCK']) if product else 0
+
+inventory = SqliteInventory(shared_db, _initial_stock) if shared_db is not None else Inventory(_initial_stock)
+
+def transaction():
+    """Make several store calls one transaction in multi-worker mode"""
+    return shared_db.write() if shared_db is not None else nullcontext()
+
+if shared_db is not None:
+    # The first worker to open a new database fills it with the demo data
+    with shared_db.write():
+        if shared_db.claim('seeded'):
+            shared_catalog.publish(catalog.all())
+            for user in DEMO_USERS:
+                user_store.put(user)
+            for order in DEMO_ORDERS:
+                order_store.add(order)
+                inventory.consume(order_quantities(order['items']))
+    shared_catalog.refresh(force=True)
+
+    @app.before_request
+    def refresh_shared_catalog():
+        shared_catalog.refresh()
+
+# Durable storage: every change to orders, users, contacts and uploads metadata
+# is appended to a write-ahead log under DATA_DIR, with periodic snapshots, and
+# replayed on startup. Set NGM_DATA_DIR to an empty string to keep state in
+# memory only.
+app.config['DATA_DIR'] = os.environ.get('NGM_DATA_DIR', 'data')
+app.config['SNAPSHOT_INTERVAL'] = float(os.environ.get('NGM_SNAPSHOT_INTERVAL', 300))
+
+def _capture_state():
+    return {
+        'orders': list(order_store),
+        'last_order_id': order_store.last_id,
+        'users': [dict(u) for u in user_store],
+        'contacts': list(contacts),
+        'user_files': user_files.items(),
+    }
+
+def _restore_state(state):
+    snapshot_order_ids = {order['id'] for order in state['orders']}
+    for order in order_store:
+        if order['id'] not in snapshot_order_ids:
+            order_store.remove(order['id'])
+    for order in state['orders']:
+        _apply_change('order.put', order)
+    order_store.reserve(state['last_order_id'])
+    user_store.replace_all(state['users'])
+    contacts.replace_all(state['contacts'])
+    user_files.replace_all(state['user_files'])
+
+def _apply_change(kind, data):
+    """Replay one logged change; applying a change twice has no extra effect"""
+    if kind == 'order.put':
+        if order_store.get(data['id']) is None:
+            order_store.add(data)
+    elif kind == 'order.delete':
+        order_store.remove(data['id'])
+        order_store.reserve(data['id'])
+    elif kind == 'user.put':
+        user_store.put(data)
+    elif kind == 'contact.put':
+        contacts.put(data)
+    elif kind == 'file.put':
+        user_files.add(data['userId'], data['file'])
+
+durable = None
+if app.config['DATA_DIR'] and shared_db is None:
+    durable = Durability(app.config['DATA_DIR'], _capture_state, _restore_state, _apply_change,
+                         fsync=app.config['FSYNC_POLICY'],
+                         snapshot_interval=app.config['SNAPSHOT_INTERVAL'])
+    durable.recover()
+    durable.start()
+    atexit.register(durable.close)
+
+if shared_db is None:
+    # Orders that already exist (demo and recovered ones) have taken their stock
+    for order in order_store:
+        inventory.consume(order_quantities(order.get('items', ())))
+
+def record_change(kind, data):
+    """Log a change that has already been applied in memory"""
+    if durable is not None:
+        durable.record(kind, data)
+
+# Contact messages are queued and stored in batches by a background thread.
+# When CONTACT_QUEUE_SIZE messages are still waiting, new ones get a 503.
+app.config['CONTACT_QUEUE_SIZE'] = int(os.environ.get('NGM_CONTACT_QUEUE_SIZE', 10000))
+
+def _store_contacts(messages):
+    contacts.put_many(messages)
+    for message in messages:
+        record_change('contact.put', message)
+
+contact_queue = WriteBehindQueue(_store_contacts, max_pending=app.config['CONTACT_QUEUE_SIZE'], name='contact-writer')
+atexit.register(contact_queue.close)  # runs before durable.close, which was registered first
+
+# Admin endpoints need NGM_ADMIN_TOKEN in the X-Admin-Token header; without
+# the setting they are disabled
+app.config['ADMIN_TOKEN'] = os.environ.get('NGM_ADMIN_TOKEN', '')
+
+def require_admin(view):
+    """Allow a view only for requests that carry the admin token"""
+    @wraps(view)
+    def guarded(*args, **kwargs):
+        token = app.config['ADMIN_TOKEN']
+        if not token:
+            return jsonify({'error': 'Admin access is not configured'}), 403
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), token.encode()):
+            return jsonify({'error': 'Admin token required'}), 401
+        return view(*args, **kwargs)
+    return guarded
+
+# Admission control. Each client gets a token bucket per rate-limited
+# endpoint, as (tokens per second, burst); NGM_RATE_LIMITS overrides rules as
+# 'endpoint=rate:burst,...' (rate 0 removes one) or turns them all 'off'.
+# Past MAX_CONCURRENT_REQUESTS requests in flight in this process (0 for no
+# limit), new requests are shed with a 503.
+app.config['RATE_LIMITS'] = {
+    'upload_file': (2, 10),
+    'begin_upload': (2, 10),
+    'upload_chunk': (20, 100),
+    'complete_upload': (2, 10),
+    'create_order': (5, 20),
+    'create_orders_batch': (1, 5),
+    'login': (1, 10),
+    'search_products': (20, 50),
+}
+if os.environ.get('NGM_RATE_LIMITS') == 'off':
+    app.config['RATE_LIMITS'] = {}
+else:
+    app.config['RATE_LIMITS'].update(parse_rules(os.environ.get('NGM_RATE_LIMITS', '')))
+app.config['MAX_CONCURRENT_REQUESTS'] = int(os.environ.get('NGM_MAX_CONCURRENT', 256))
+# Behind a reverse proxy, set NGM_PROXY_HOPS so client IPs come from X-Forwarded-For
+app.config['PROXY_HOPS'] = int(os.environ.get('NGM_PROXY_HOPS', 0))
+if app.config['PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_HOPS'])
+
+def rate_limit_client():
+    """Signed-in clients are limited per session, everyone else per IP"""
+    token = bearer_token()
+    if token and sessions.resolve(token) is not None:
+        return 'token:' + token
+    return 'ip:' + (request.remote_addr or '')
+
+rate_limiter = RateLimiter(app.config['RATE_LIMITS'], rate_limit_client,
+                           max_concurrent=app.config['MAX_CONCURRENT_REQUESTS'], exempt=('get_metrics',))
+rate_limiter.install(app)
 
 @app.route('/')
 def index():
     """Serve the main HTML page"""
-    return app.send_static_file('index.html')
+    return page('index')
+
+@app.route('/<name>.html')
+def page(name):
+    """Serve an HTML page, preferring the built copy"""
+    filename = name + '.html'
+    rendered = render_product_page(filename)
+    if rendered is not None:
+        return rendered
+    if static_assets.has_page(filename):
+        return static_assets.send_page(filename)
+    return app.send_static_file(filename)
+
+@app.route(ASSET_URL_PREFIX + '<name>')
+def asset(name):
+    """Serve a fingerprinted script or stylesheet"""
+    if not static_assets.has_asset(name):
+        return jsonify({'error': 'Not found'}), 404
+    return static_assets.send_asset(name)
+
+def present_products(products, fields=None):
+    """Products as the API returns them, with image variant URLs added"""
+    if fields is not None and 'images' not in fields:
+        return products
+    return [present_product(p) for p in products]
+
+def render_product_page(filename):
+    """A product page with its products rendered in, or None to serve the page as it is"""
+    if product_pages is None:
+        return None
+    if filename == LISTING_PAGE:
+        rendered = product_pages.listing()
+    elif filename == DETAIL_PAGE:
+        rendered = product_pages.detail(request.args.get('id', type=int))
+    else:
+        return None
+    if rendered is None:
+        return None
+    body, etag = rendered
+    response = Response(body, mimetype='text/html')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
 
 @app.route('/api/products')
+@response_cache.cached
 def get_products():
-    """Get all products"""
-    return jsonify(PRODUCTS)
+    """Get all products (supports cursor/limit pagination and fields= projection), or those in ?ids="""
+    paginated, after, limit, fields = page_args()
+    if request.args.get('ids') is not None:
+        return lookup_products(request.args['ids'], fields)
+    if not paginated:
+        return list_response(present_products(catalog.all(), fields), fields)
+    products, next_cursor = catalog.page(after=after, limit=limit)
+    return list_response(present_products(products, fields), fields, next_cursor)
+
+# Most products one ?ids= lookup or orders one batch may carry
+app.config['MAX_BATCH_SIZE'] = int(os.environ.get('NGM_MAX_BATCH_SIZE', 500))
+
+def lookup_products(ids, fields):
+    """One result per requested id, in request order: the product, or why there is none"""
+    ids = [i.strip() for i in ids.split(',') if i.strip()]
+    if len(ids) > app.config['MAX_BATCH_SIZE']:
+        return jsonify({'error': f'At most {app.config["MAX_BATCH_SIZE"]} ids per request'}), 400
+    current = catalog  # one catalog for the whole lookup, even if a reload swaps it meanwhile
+    results = []
+    for raw in ids:
+        try:
+            product_id = int(raw)
+        except ValueError:
+            results.append({'id': raw, 'status': 400, 'error': 'Product id must be an integer'})
+            continue
+        product = current.get(product_id)
+        if product is None:
+            results.append({'id': product_id, 'status': 404, 'error': 'Product not found'})
+        else:
+            results.append({'id': product_id, 'status': 200,
+                            'product': project(present_products([product], fields)[0], fields)})
+    return jsonify({'results': results})
 
 @app.route('/api/products/<int:product_id>')
+@response_cache.cached
 def get_product(product_id):
     """Get a specific product by ID"""
-    product = next((p for p in PRODUCTS if p['id'] == product_id), None)
+    product = catalog.get(product_id)
     if product:
-        return jsonify(product)
+        return jsonify(present_product(product))
     return jsonify({'error': 'Product not found'}), 404
 
 @app.route('/api/products/search')
+@response_cache.cached
 def search_products():
-    """Search products by name or brand"""
+    """Search products by name, brand, description or color, ranked by relevance"""
     query = request.args.get('q', '')
+    limit = request.args.get('limit', type=int)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    if limit is not None:
+        limit = max(limit, 0)
     if not query:
-        return jsonify(PRODUCTS)
+        products = catalog.all()
+        end = None if limit is None else offset + limit
+        response = jsonify(present_products(products[offset:end]))
+        response.headers['X-Total-Count'] = str(len(products))
+        return response
     
     # Detect common SQL injection patterns in the search query and return a flag for CTF
-    q_lower = query.lower()
-    sqli_patterns = ["' or ", '" or ', "'--", '/*', '*/', '--', ';', ' union ', ' select ', ' drop ', ' insert ', ' update ', ' delete ']
-    if any(pat in q_lower for pat in sqli_patterns) or "'1'='1" in q_lower or ' or 1=1' in q_lower:
+    if search_sqli.search(query):
         return jsonify({
             'message': 'SQL Injection detected in search!',
             'flag': 'THM{SQL_INJECTION_SUCCESS}',
@@ -188,37 +522,117 @@ def search_products():
             'exploit_type': 'Query manipulation in search parameter'
         })
     
-    filtered_products = [
-        p for p in PRODUCTS 
-        if q_lower in p['name'].lower() or q_lower in p['brand'].lower()
-    ]
-    return jsonify(filtered_products)
+    total, filtered_products = search_index.search(query, limit=limit, offset=offset)
+    response = jsonify(present_products(filtered_products))
+    response.headers['X-Total-Count'] = str(total)
+    return response
 
 @app.route('/api/products/filter')
+@response_cache.cached
 def filter_products():
     """Filter products by brand, price range, etc."""
     brand = request.args.get('brand')
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
+    paginated, after, limit, fields = page_args()
     
-    filtered_products = PRODUCTS.copy()
-    
-    if brand:
-        filtered_products = [p for p in filtered_products if p['brand'].lower() == brand.lower()]
-    
-    if min_price is not None:
-        filtered_products = [p for p in filtered_products if p['price'] >= min_price]
-    
-    if max_price is not None:
-        filtered_products = [p for p in filtered_products if p['price'] <= max_price]
+    if not paginated:
+        filtered_products = catalog.filter(brand=brand, min_price=min_price, max_price=max_price)
+        return list_response(present_products(filtered_products, fields), fields)
+    filtered_products, next_cursor = catalog.page(brand=brand, min_price=min_price, max_price=max_price,
+                                                  after=after, limit=limit)
+    return list_response(present_products(filtered_products, fields), fields, next_cursor)
+
+@app.route('/api/products/facets')
+@response_cache.cached
+def facet_products():
+    """Filter products on any combination of brand, storage, color and price bucket, with facet counts.
+
+    Repeat a parameter or separate values with commas to accept any of them,
+    e.g. ``?brand=Apple,Samsung&storage=256GB&price=800-1000``.
+    """
+    filters = {facet: [v.strip() for value in request.args.getlist(facet) for v in value.split(',') if v.strip()]
+               for facet in FACETS}
+    _, after, limit, fields = page_args()
+    products, total, counts, next_cursor = facet_index.search(filters, after=after, limit=limit or DEFAULT_PAGE_SIZE)
+    response = jsonify({'products': [project(p, fields) for p in present_products(products, fields)],
+                        'total': total, 'facets': counts})
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = encode_cursor(next_cursor)
+    return response
+
+@app.route('/api/images/<variant>/<path:name>')
+def product_image(variant, name):
+    """Serve a resized product photo in the best format the client accepts"""
+    source = image_variants.source_path(name)
+    if variant not in VARIANTS or source is None:
+        return jsonify({'error': 'Image not found'}), 404
+    if not image_variants.enabled:
+        return send_file(source, conditional=True)
     
-    return jsonify(filtered_products)
+    fmt, mimetype = image_variants.negotiate(request.accept_mimetypes, request.args.get('format'))
+    response = send_file(image_variants.render(source, variant, fmt), mimetype=mimetype, conditional=True)
+    response.vary.add('Accept')
+    # URLs carrying the current source hash never change content
+    if request.args.get('v') == image_variants.source_digest(source)[:12]:
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+class InvalidOrder(Exception):
+    """An order request that cannot be placed as sent."""
+
+def price_items(items, lookup):
+    """Order lines and total for requested {id, quantity} items; raises InvalidOrder"""
+    total_amount = 0
+    order_items = []
+    for item in items:
+        product = lookup(item['id'])
+        if not product:
+            raise InvalidOrder(f'Product {item["id"]} not found')
+        if not valid_quantity(item.get('quantity')):
+            raise InvalidOrder(f'Quantity for product {item["id"]} must be a positive integer')
+        
+        item_total = product['price'] * item['quantity']
+        total_amount += item_total
+        
+        order_items.append({
+            'id': product['id'],
+            'name': product['name'],
+            'price': product['price'],
+            'quantity': item['quantity'],
+            'image': product['image'],
+            'brand': product['brand']  # sales stats credit this brand even if the catalog changes
+        })
+    return order_items, total_amount
+
+def place_order(user_id, order_items, total_amount, shipping_address):
+    """Reserve stock for every item, then create the order; raises OutOfStock"""
+    quantities = order_quantities(order_items)
+    with transaction():
+        inventory.reserve(quantities)
+        try:
+            order_id = order_store.next_id()
+            order = {
+                'id': order_id,
+                'userId': user_id,
+                'orderNumber': f'ORD-2024-{order_id:03d}',
+                'date': datetime.now().strftime('%Y-%m-%d'),
+                'status': 'pending',
+                'total': total_amount,
+                'items': order_items,
+                'shippingAddress': shipping_address,
+                'trackingNumber': None,
+                'createdAt': datetime.now().isoformat() + 'Z'
+            }
+            order_store.add(order)
+        except Exception:
+            inventory.release(quantities)
+            raise
+    return order
 
 @app.route('/api/orders', methods=['POST'])
 def create_order():
     """Create a new order"""
-    global order_counter
-    
     try:
         data = request.get_json()
         
@@ -226,40 +640,13 @@ def create_order():
             return jsonify({'error': 'Invalid order data'}), 400
         
         # Validate order items and calculate total
-        total_amount = 0
-        order_items = []
-        for item in data['items']:
-            product = next((p for p in PRODUCTS if p['id'] == item['id']), None)
-            if not product:
-                return jsonify({'error': f'Product {item["id"]} not found'}), 400
-            
-            item_total = product['price'] * item['quantity']
-            total_amount += item_total
-            
-            order_items.append({
-                'id': product['id'],
-                'name': product['name'],
-                'price': product['price'],
-                'quantity': item['quantity'],
-                'image': product['image']
-            })
-        
-        # Create order
-        order = {
-            'id': order_counter,
-            'userId': 1,  # In real app, get from JWT token
-            'orderNumber': f'ORD-2024-{order_counter:03d}',
-            'date': datetime.now().strftime('%Y-%m-%d'),
-            'status': 'pending',
-            'total': total_amount,
-            'items': order_items,
-            'shippingAddress': data.get('shipping_address', ''),
-            'trackingNumber': None,
-            'createdAt': datetime.now().isoformat() + 'Z'
-        }
+        try:
+            order_items, total_amount = price_items(data['items'], catalog.get)
+        except InvalidOrder as e:
+            return jsonify({'error': str(e)}), 400
         
-        orders.append(order)
-        order_counter += 1
+        order = place_order(current_user_id(), order_items, total_amount, data.get('shipping_address', ''))
+        record_change('order.put', order)
         
         return jsonify({
             'message': 'Order created successfully',
@@ -268,13 +655,73 @@ def create_order():
             'total_amount': total_amount
         }), 201
         
+    except OutOfStock as e:
+        return jsonify({'error': 'Insufficient stock', 'items': e.shortages}), 409
+    except Exception as e:
+        return error_response(e)
+
+def batch_order_items(order_data, lookup):
+    """price_items for one order of a batch, with malformed orders raised as InvalidOrder"""
+    if not isinstance(order_data, dict) or not isinstance(order_data.get('items'), list):
+        raise InvalidOrder('Invalid order data')
+    try:
+        return price_items(order_data['items'], lookup)
+    except (KeyError, TypeError) as e:
+        raise InvalidOrder('Every item needs an id and a quantity') from e
+
+@app.route('/api/orders/batch', methods=['POST'])
+def create_orders_batch():
+    """Create many orders in one request: {"orders": [{"items": [...], "shipping_address": ...}, ...]}
+
+    Each order succeeds or fails on its own, and gets a result at its index
+    with the status a single POST /api/orders would have answered. A batch
+    is not all-or-nothing: a failed order, for whatever reason, keeps no
+    stock and leaves the others in place. Every order is priced against
+    the same catalog. In multi-worker mode the batch is one transaction and
+    each order a savepoint in it (place_order's own transaction() nests),
+    so both modes give the same results.
+    """
+    try:
+        data = request.get_json(silent=True)
+        orders = data.get('orders') if isinstance(data, dict) else None
+        if not isinstance(orders, list) or not orders:
+            return jsonify({'error': 'Expected {"orders": [...]} with at least one order'}), 400
+        if len(orders) > app.config['MAX_BATCH_SIZE']:
+            return jsonify({'error': f'At most {app.config["MAX_BATCH_SIZE"]} orders per batch'}), 400
+        
+        user_id = current_user_id()
+        lookup = catalog.get  # one catalog for the whole batch, even if a reload swaps it meanwhile
+        results = []
+        with transaction():
+            for index, order_data in enumerate(orders):
+                try:
+                    order_items, total_amount = batch_order_items(order_data, lookup)
+                    order = place_order(user_id, order_items, total_amount, order_data.get('shipping_address', ''))
+                except InvalidOrder as e:
+                    results.append({'index': index, 'status': 400, 'error': str(e)})
+                    continue
+                except OutOfStock as e:
+                    results.append({'index': index, 'status': 409, 'error': 'Insufficient stock',
+                                    'items': e.shortages})
+                    continue
+                except Exception as e:
+                    request_metrics.record_exception(e)
+                    results.append({'index': index, 'status': 500, 'error': str(e)})
+                    continue
+                record_change('order.put', order)
+                results.append({'index': index, 'status': 201, 'order_id': order['id'],
+                                'order_number': order['orderNumber'], 'total_amount': total_amount})
+        
+        created = sum(1 for result in results if result['status'] == 201)
+        return jsonify({'created': created, 'failed': len(results) - created, 'results': results})
+        
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/orders/<int:order_id>')
 def get_order(order_id):
     """Get order by ID"""
-    order = next((o for o in orders if o['id'] == order_id), None)
+    order = order_store.get(order_id)
     if order:
         return jsonify(order)
     return jsonify({'error': 'Order not found'}), 404
@@ -287,7 +734,7 @@ def delete_order(order_id):
         # In real scenario, should check CSRF token
         
         # Check if order exists
-        order = next((o for o in orders if o['id'] == order_id), None)
+        order = order_store.get(order_id)
         if not order:
             return jsonify({'error': 'Order not found'}), 404
         
@@ -304,33 +751,37 @@ def delete_order(order_id):
                 'exploit_type': 'CSRF on state-changing action (order deletion)'
             }), 200
         
-        # Normal deletion logic (if CSRF token was provided)
-        orders.remove(order)
+        # Normal deletion logic (if CSRF token was provided); the stock goes back
+        with transaction():
+            removed = order_store.remove(order_id)
+            if removed is not None:
+                inventory.release(order_quantities(removed.get('items', ())))
+        if removed is None:
+            return jsonify({'error': 'Order not found'}), 404
+        record_change('order.delete', {'id': order_id})
         return jsonify({'message': 'Order deleted successfully'})
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/brands')
+@response_cache.cached
 def get_brands():
     """Get all available brands"""
-    brands = list(set(product['brand'] for product in PRODUCTS))
-    return jsonify(sorted(brands))
+    return jsonify(catalog.brands())
 
 @app.route('/api/stats')
 def get_stats():
-    """Get basic statistics"""
-    total_products = len(PRODUCTS)
-    total_orders = len(orders)
-    # 'total' is the key used in created orders; avoid KeyError on 'total_amount'
-    total_revenue = sum(order.get('total', 0) for order in orders)
+    """Get sales statistics, optionally for a recent time window (?window=1h)"""
+    window = request.args.get('window')
+    if window and window not in WINDOWS:
+        return jsonify({'error': f'window must be one of: {", ".join(WINDOWS)}'}), 400
     
-    return jsonify({
-        'total_products': total_products,
-        'total_orders': total_orders,
-        'total_revenue': total_revenue,
-        'average_order_value': (total_revenue / total_orders) if total_orders > 0 else 0
-    })
+    stats = sales_stats.snapshot()
+    stats['total_products'] = len(catalog)
+    if window:
+        stats['window'] = sales_stats.window(window)
+    return jsonify(stats)
 
 # Authentication endpoints
 @app.route('/api/auth/register', methods=['POST'])
@@ -346,12 +797,12 @@ def register():
                 return jsonify({'error': f'{field} is required'}), 400
         
         # Check if user already exists
-        if any(user['email'] == data['email'] for user in users):
+        if user_store.get_by_email(data['email']) is not None:
             return jsonify({'error': 'Email already registered'}), 400
         
         # Create new user
-        new_user = {
-            'id': len(users) + 1,
+        new_user = user_store.create(lambda user_id: {
+            'id': user_id,
             'firstName': data['firstName'],
             'lastName': data['lastName'],
             'email': data['email'],
@@ -360,9 +811,11 @@ def register():
             'address': data.get('address', ''),
             'birthDate': data.get('birthDate', ''),
             'createdAt': datetime.now().isoformat() + 'Z'
-        }
+        })
+        if new_user is None:
+            return jsonify({'error': 'Email already registered'}), 400
         
-        users.append(new_user)
+        record_change('user.put', new_user)
         
         # Return user without password
         user_response = {k: v for k, v in new_user.items() if k != 'password'}
@@ -372,7 +825,7 @@ def register():
         }), 201
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/auth/login', methods=['POST'])
 def login():
@@ -391,9 +844,7 @@ def login():
         
         # Check for SQL injection patterns (simulated detection for CTF)
         payload = f"{email}|{password}"
-        payload_lower = payload.lower()
-        sql_patterns = ["'", '"', ';', '--', '/*', '*/', ' union ', ' select ', ' drop ', ' insert ', ' update ', ' delete ', " or ", "' or '"]
-        if any(pattern.strip() in payload_lower for pattern in sql_patterns) or "'1'='1" in payload_lower or ' or 1=1' in payload_lower:
+        if login_sqli.search(payload):
             # SQL Injection detected - return flag
             return jsonify({
                 'message': 'SQL Injection detected!',
@@ -405,12 +856,12 @@ def login():
             }), 200
         
         # Normal login logic
-        user = next((u for u in users if u['email'] == email), None)
+        user = user_store.get_by_email(email)
         if not user or user['password'] != hashlib.sha256(password.encode()).hexdigest():
             return jsonify({'error': 'Invalid credentials'}), 401
         
-        # Generate token (simple implementation)
-        token = secrets.token_urlsafe(32)
+        # Start a session; the token identifies the user on /api/user/* requests
+        token = sessions.create(user['id'])
         
         # Return user without password
         user_response = {k: v for k, v in user.items() if k != 'password'}
@@ -421,7 +872,13 @@ def login():
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
+
+@app.route('/api/auth/logout', methods=['POST'])
+def logout():
+    """End the session behind the request's bearer token"""
+    sessions.revoke(bearer_token())
+    return jsonify({'message': 'Logged out'})
 
 # User profile endpoints
 @app.route('/api/user/profile', methods=['PUT'])
@@ -438,7 +895,7 @@ def update_profile():
         # In real scenario, should verify user can only edit their own profile
         
         # Check for IDOR exploitation (trying to edit another user's profile)
-        if user_id != 1:  # Default user ID is 1
+        if user_id != current_user_id():
             return jsonify({
                 'message': 'IDOR Vulnerability Detected!',
                 'flag': 'THM{IDOR_EXPLOIT_SUCCESS}',
@@ -449,21 +906,23 @@ def update_profile():
             }), 200
         
         # Find user
-        user = next((u for u in users if u['id'] == user_id), None)
+        user = user_store.get(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         # Update user data
-        for key, value in data.items():
-            if key not in ['id', 'password', 'createdAt']:
-                user[key] = value
+        updated = user_store.update(user, {key: value for key, value in data.items()
+                                           if key not in ['id', 'password', 'createdAt']})
+        if updated is None:
+            return jsonify({'error': 'Email already registered'}), 409
+        record_change('user.put', user)
         
         # Return updated user without password
         user_response = {k: v for k, v in user.items() if k != 'password'}
         return jsonify(user_response)
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # IDOR GET endpoint to fetch arbitrary user profile by ID via URL (CTF helper)
 @app.route('/api/user/profile/<int:user_id>')
@@ -471,7 +930,7 @@ def get_profile_by_id(user_id):
     """Get user profile by ID - VULNERABLE TO IDOR (for CTF)"""
     try:
         # VULNERABLE: No authorization check
-        if user_id != 1:
+        if user_id != current_user_id():
             return jsonify({
                 'message': 'IDOR Vulnerability Detected!',
                 'flag': 'THM{IDOR_EXPLOIT_SUCCESS}',
@@ -481,32 +940,74 @@ def get_profile_by_id(user_id):
                 'exploit_type': 'Profile access without authorization'
             }), 200
         
-        # Return the demo user (id 1) when requested
-        user = next((u for u in users if u['id'] == 1), None)
+        # Return the caller's own profile when requested
+        user = user_store.get(user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         user_response = {k: v for k, v in user.items() if k != 'password'}
         return jsonify(user_response)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 @app.route('/api/user/orders')
 def get_user_orders():
-    """Get orders for authenticated user"""
+    """Get orders for authenticated user (supports cursor/limit pagination and fields= projection)"""
+    paginated, after, limit, fields = page_args()
     try:
-        # In a real app, you'd get user_id from JWT token
-        user_id = 1  # Demo user ID
+        user_id = current_user_id()
         
-        user_orders = [order for order in orders if order.get('userId') == user_id]
-        return jsonify(user_orders)
+        if not paginated:
+            return list_response(order_store.for_user(user_id), fields)
+        
+        # Orders are listed oldest first; the cursor is the id of the last order sent
+        page = order_store.for_user(user_id, after=after, limit=limit + 1)
+        next_cursor = page[limit - 1]['id'] if len(page) > limit else None
+        return list_response(page[:limit], fields, next_cursor)
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # File upload endpoints
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _register_upload(filename, digest, size, filepath):
+    """Record an uploaded file for the caller and build the upload response"""
+    # Always keep the file regardless of extension (VULNERABLE BRANCH when not allowed)
+    is_allowed = allowed_file(filename)
+    
+    # Store file info; saved_filename points at the shared content-addressed blob
+    file_info = {
+        'id': str(uuid.uuid4()),
+        'filename': filename,
+        'saved_filename': blob_store.relative_name(digest),
+        'filepath': filepath,
+        'size': size,
+        'sha256': digest,
+        'upload_date': datetime.now().isoformat() + 'Z'
+    }
+    
+    user_id = current_user_id()
+    user_files.add(user_id, file_info)
+    record_change('file.put', {'userId': user_id, 'file': file_info})
+    
+    if is_allowed:
+        # Normal (non-flag) success for allowed extensions
+        return jsonify({
+            'message': 'File uploaded successfully',
+            'file': file_info
+        })
+    else:
+        # VULNERABILITY: Unrestricted file upload accepted
+        return jsonify({
+            'message': 'Unrestricted File Upload Vulnerability Detected!',
+            'flag': 'THM{UNRESTRICTED_FILE_UPLOAD_SUCCESS}',
+            'vulnerability': 'Unrestricted File Upload',
+            'description': 'You uploaded a disallowed file type and the server accepted and stored it.',
+            'exploit_type': 'Missing server-side validation on file type',
+            'file': file_info
+        })
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """Upload file (intentionally vulnerable to unrestricted file upload for CTF)"""
@@ -518,58 +1019,83 @@ def upload_file():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Always save the file regardless of extension (VULNERABLE BRANCH when not allowed)
-        is_allowed = allowed_file(file.filename)
-        filename = str(uuid.uuid4()) + '_' + file.filename
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        # Store file info
-        file_info = {
-            'id': str(uuid.uuid4()),
-            'filename': file.filename,
-            'saved_filename': filename,
-            'filepath': filepath,
-            'size': os.path.getsize(filepath),
-            'upload_date': datetime.now().isoformat() + 'Z'
-        }
-        
-        # In a real app, you'd associate this with the user
-        user_id = 1
-        if user_id not in user_files:
-            user_files[user_id] = []
-        user_files[user_id].append(file_info)
-        
-        if is_allowed:
-            # Normal (non-flag) success for allowed extensions
-            return jsonify({
-                'message': 'File uploaded successfully',
-                'file': file_info
-            })
-        else:
-            # VULNERABILITY: Unrestricted file upload accepted
-            return jsonify({
-                'message': 'Unrestricted File Upload Vulnerability Detected!',
-                'flag': 'THM{UNRESTRICTED_FILE_UPLOAD_SUCCESS}',
-                'vulnerability': 'Unrestricted File Upload',
-                'description': 'You uploaded a disallowed file type and the server accepted and stored it.',
-                'exploit_type': 'Missing server-side validation on file type',
-                'file': file_info
-            })
+        # Stream into the blob store in chunks, hashing on the way
+        digest, size, filepath = blob_store.write(file.stream)
+        return _register_upload(file.filename, digest, size, filepath)
         
+    except HTTPException:
+        raise  # e.g. 413 for a body over MAX_CONTENT_LENGTH
+    except Exception as e:
+        return error_response(e)
+
+# Resumable uploads: create a session, PUT the file in chunks with a
+# Content-Range header, then complete it. GET reports how much has arrived so
+# an interrupted client knows where to resume.
+@app.route('/api/upload/sessions', methods=['POST'])
+def begin_upload():
+    """Start a chunked upload"""
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename')
+    if not filename:
+        return jsonify({'error': 'filename is required'}), 400
+    try:
+        upload_id = blob_store.begin(filename, max_size=app.config['MAX_CONTENT_LENGTH'],
+                                     client=rate_limit_client())
+    except UploadError as e:
+        return _upload_error(e)
+    return jsonify({'upload_id': upload_id, 'offset': 0, 'chunk_size': blob_store.chunk_size}), 201
+
+@app.route('/api/upload/sessions/<upload_id>')
+def upload_status(upload_id):
+    """Report how many bytes of a chunked upload have been received"""
+    try:
+        filename, offset = blob_store.status(upload_id)
+        return jsonify({'upload_id': upload_id, 'filename': filename, 'offset': offset})
+    except UploadError as e:
+        return _upload_error(e)
+
+@app.route('/api/upload/sessions/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Append one chunk; Content-Range gives its start offset"""
+    offset = 0
+    if 'Content-Range' in request.headers:
+        content_range = parse_content_range_header(request.headers['Content-Range'])
+        if content_range is None:
+            return jsonify({'error': 'Invalid Content-Range header'}), 400
+        offset = content_range.start
+    try:
+        new_offset = blob_store.append(upload_id, offset, request.stream)
+        return jsonify({'upload_id': upload_id, 'offset': new_offset})
+    except UploadError as e:
+        return _upload_error(e)
+
+@app.route('/api/upload/sessions/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Finish a chunked upload and register the file"""
+    try:
+        filename, digest, size, filepath = blob_store.finish(upload_id)
+        return _register_upload(filename, digest, size, filepath)
+    except UploadError as e:
+        return _upload_error(e)
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
+
+def _upload_error(error):
+    body = {'error': str(error)}
+    if error.offset is not None:
+        body['offset'] = error.offset
+    return jsonify(body), error.status
 
 @app.route('/api/user/files')
 def get_user_files():
     """Get user's uploaded files"""
     try:
-        user_id = 1  # Demo user ID
-        files = user_files.get(user_id, [])
+        user_id = current_user_id()
+        files = user_files.for_user(user_id)
         return jsonify(files)
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
 
 # Contact endpoints
 @app.route('/api/contact', methods=['POST'])
@@ -579,10 +1105,9 @@ def submit_contact():
         data = request.get_json()
         
         # Check for XSS patterns in the message field
-        xss_patterns = ['<script>', '</script>', 'javascript:', 'onload=', 'onerror=', 'onclick=', 'alert(', 'document.cookie']
         message = data.get('message', '')
         
-        if any(pattern in message.lower() for pattern in xss_patterns):
+        if contact_xss.search(message):
             # XSS detected - return flag
             return jsonify({
                 'message': 'Stored XSS Vulnerability Detected!',
@@ -593,8 +1118,8 @@ def submit_contact():
                 'exploit_type': 'Stored XSS in contact message field'
             }), 200
         
-        contact_message = {
-            'id': len(contacts) + 1,
+        contact_message = contact_queue.submit(lambda: {
+            'id': contacts.next_id(),
             'firstName': data.get('firstName'),
             'lastName': data.get('lastName'),
             'email': data.get('email'),
@@ -603,17 +1128,108 @@ def submit_contact():
             'message': message,  # VULNERABLE: No HTML sanitization
             'newsletter': data.get('newsletter', False),
             'submittedAt': datetime.now().isoformat() + 'Z'
-        }
-        
-        contacts.append(contact_message)
+        })
         
         return jsonify({
             'message': 'Contact form submitted successfully',
             'contactId': contact_message['id']
         })
         
+    except QueueFull:
+        response = jsonify({'error': 'Too many messages are waiting to be saved; please try again shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return error_response(e)
+
+@app.route('/api/admin/contacts')
+@require_admin
+def list_contacts():
+    """List contact messages oldest first, filtered by date, subject and newsletter opt-in"""
+    paginated, after, limit, fields = page_args()
+    limit = limit or DEFAULT_PAGE_SIZE
+    newsletter = request.args.get('newsletter')
+    if newsletter is not None:
+        if newsletter.lower() not in ('true', 'false', '1', '0'):
+            return jsonify({'error': 'newsletter must be true or false'}), 400
+        newsletter = newsletter.lower() in ('true', '1')
+    # The cursor is the id of the last message sent
+    page = contacts.page(after=after, limit=limit + 1, since=request.args.get('since'),
+                         before=request.args.get('before'), subject=request.args.get('subject'),
+                         newsletter=newsletter)
+    next_cursor = page[limit - 1]['id'] if len(page) > limit else None
+    return list_response(page[:limit], fields, next_cursor)
+
+def export_args():
+    """Read ``format``, ``since`` and ``before`` for an export; format is None when unsupported"""
+    fmt = request.args.get('format', 'csv')
+    return (fmt if fmt in EXPORT_FORMATS else None), request.args.get('since'), request.args.get('before')
+
+@app.route('/api/admin/exports/orders')
+@require_admin
+def export_orders():
+    """Stream all orders oldest first, one row per line item, filtered by date and status"""
+    fmt, since, before = export_args()
+    if fmt is None:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    status = request.args.get('status')
+    statuses = {s.strip() for s in status.split(',') if s.strip()} if status else None
+    orders = order_store.scan(since=since, before=before, statuses=statuses)
+    return export_response(order_rows(orders), ORDER_COLUMNS, fmt, 'orders')
+
+@app.route('/api/admin/exports/files')
+@require_admin
+def export_files():
+    """Stream uploads metadata of all users by upload date, filtered by date"""
+    fmt, since, before = export_args()
+    if fmt is None:
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    return export_response(file_rows(user_files.scan(since=since, before=before)), FILE_COLUMNS, fmt, 'files')
+
+def reload_catalog():
+    """Read the catalog file again and swap it in once built; False if a reload is already running"""
+    path = app.config['CATALOG_PATH']
+    if shared_catalog is None:
+        return catalog_reloader.reload(lambda: read_products(path))
+
+    def load_and_publish():
+        products = read_products(path)
+        # The other workers see the new version and rebuild from the database
+        shared_catalog.publish(products)
+        return products
+    return catalog_reloader.reload(load_and_publish)
+
+def catalog_status():
+    return {
+        'source': app.config['CATALOG_PATH'],
+        'products': len(catalog),
+        'version': catalog.version,
+        'indexesReady': search_index.ready and facet_index.ready,
+        'reload': catalog_reloader.status(),
+    }
+
+@app.route('/api/admin/catalog')
+@require_admin
+def get_catalog_status():
+    """Size and version of the catalog in use, and how the last reload went"""
+    return jsonify(catalog_status())
+
+@app.route('/api/admin/catalog/reload', methods=['POST'])
+@require_admin
+def reload_catalog_file():
+    """Reload the catalog file in the background; the new catalog is swapped in once fully built"""
+    if not reload_catalog():
+        return jsonify({'error': 'A catalog reload is already running'}), 409
+    return jsonify(catalog_status()), 202
+
+@app.route('/metrics')
+def get_metrics():
+    """Request metrics in Prometheus text format"""
+    return Response(request_metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.errorhandler(PaginationError)
+def bad_page_request(error):
+    return jsonify({'error': str(error)}), 400
 
 @app.errorhandler(404)
 def not_found(error):
@@ -623,17 +1239,23 @@ def not_found(error):
 def internal_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
+# Must come after every route so each view is timed
+request_metrics.instrument(app)
+
 if __name__ == '__main__':
     print("Starting NextGen Mobiles Backend...")
     print("Available endpoints:")
-    print("- GET  /api/products - Get all products")
+    print("- GET  /api/products?cursor=C&limit=N&fields=a,b - Get all products")
     print("- GET  /api/products/<id> - Get specific product")
-    print("- GET  /api/products/search?q=query - Search products")
+    print("- GET  /api/products/search?q=query&limit=N&offset=M - Search products")
     print("- GET  /api/products/filter?brand=X&min_price=Y&max_price=Z - Filter products")
     print("- POST /api/orders - Create new order")
     print("- GET  /api/orders/<id> - Get order by ID")
     print("- GET  /api/brands - Get all brands")
-    print("- GET  /api/stats - Get statistics")
+    print("- GET  /api/stats?window=1h - Get statistics")
+    print("- GET  /metrics - Request metrics (Prometheus text format)")
     print("\nFrontend will be available at: http://localhost:5000")
+    print("For several worker processes run: gunicorn app:app (settings in gunicorn.conf.py)")
+    print("For many slow clients (uploads, forms) run: uvicorn asgi:app")
     
     app.run(debug=True, host='0.0.0.0', port=5000)
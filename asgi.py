@@ -0,0 +1,294 @@
+"""ASGI entry point for serving many slow clients with few workers.
+
+    uvicorn asgi:app --workers 4
+
+Request bodies are received on the event loop, so a client that sends
+slowly holds no thread while it does. ``POST /api/upload`` is handled
+natively: the multipart body is parsed as it arrives and the file part is
+written to the blob store on a thread pool, so a 16 MB upload is never
+buffered in memory. Rate limits and the concurrency cap are checked before
+the body is read, and the blob is only stored once the app's request hooks
+have let the upload through. Every other request, ``/api/contact`` included, is
+buffered (up to MAX_CONTENT_LENGTH) and then runs through the Flask app on
+the thread pool, so responses, hooks and error bodies are the same as under
+WSGI. With more than one worker, set NGM_SHARED_DB as gunicorn.conf.py
+does.
+"""
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify
+from werkzeug.exceptions import BadRequest, HTTPException, RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+
+from app import _register_upload, app as flask_app, blob_store, error_response, rate_limiter
+from rate_limit import ADMITTED
+
+# Threads that run Flask views and blob writes
+THREADS = int(os.environ.get('NGM_ASGI_THREADS', 32))
+# Response bytes collected per hop from the thread pool to the event loop
+RESPONSE_BATCH = 64 * 1024
+
+_executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='asgi')
+
+
+class _Disconnected(Exception):
+    pass
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] == 'http':
+        if scope['method'] == 'POST' and scope['path'] == '/api/upload':
+            await _upload(scope, receive, send)
+        else:
+            await _buffered(scope, receive, send)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def _run(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+async def _body_chunks(receive, mark_end=False):
+    """Yield the body as it arrives, and then None if ``mark_end`` is set"""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise _Disconnected()
+        yield message.get('body', b'')
+        if not message.get('more_body'):
+            if mark_end:
+                yield None
+            return
+
+
+async def _buffered(scope, receive, send):
+    """Receive the whole body, then let the Flask app handle the request"""
+    limit = flask_app.config['MAX_CONTENT_LENGTH']
+    declared = _content_length(scope)
+    body = bytearray()
+    try:
+        if declared is None or limit is None or declared <= limit:
+            async for chunk in _body_chunks(receive):
+                body += chunk
+                if limit is not None and len(body) > limit:
+                    break
+    except _Disconnected:
+        return
+    # An oversized body is not passed on; its length alone makes Flask refuse it
+    too_large = limit is not None and max(len(body), declared or 0) > limit
+    environ = _environ(scope, b'' if too_large else bytes(body), max(len(body), declared or 0) if too_large else None)
+    await _send_wsgi(send, flask_app, environ)
+
+
+async def _upload(scope, receive, send):
+    """Stream a multipart upload into the blob store"""
+    content_type, options = parse_options_header(_header(scope, b'content-type') or '')
+    limit = flask_app.config['MAX_CONTENT_LENGTH']
+    declared = _content_length(scope)
+    if (content_type != 'multipart/form-data' or 'boundary' not in options
+            or (limit is not None and declared is not None and declared > limit)):
+        await _buffered(scope, receive, send)
+        return
+
+    # Rate limits and the concurrency cap are checked before any of the body is read
+    environ = _environ(scope, b'', 0)
+    rejection = await _run(_admit, environ)
+    if rejection is not None:
+        response = await _run(_dispatch, environ, lambda: rejection)
+        await _send_wsgi(send, response, environ)
+        return
+
+    decoder = MultipartDecoder(options['boundary'].encode('latin-1'))
+    writer = current = filename = error = None
+    received = 0
+    try:
+        async for chunk in _body_chunks(receive, mark_end=True):
+            if chunk is not None:
+                received += len(chunk)
+                if limit is not None and received > limit:
+                    raise RequestEntityTooLarge()
+            # None tells the decoder the body is complete; a truncated one is then an error
+            _decode(decoder.receive_data, chunk)
+            event = _decode(decoder.next_event)
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, File) and event.name == 'file' and writer is None:
+                    filename = event.filename
+                    writer = current = blob_store.writer()
+                elif isinstance(event, Data):
+                    if current is not None and event.data:
+                        await _run(current.write, event.data)
+                    if not event.more_data:
+                        current = None
+                else:
+                    current = None
+                event = _decode(decoder.next_event)
+    except _Disconnected:
+        if writer is not None:
+            writer.abort()
+        if environ.pop(ADMITTED, False):
+            rate_limiter.release()
+        return
+    except Exception as e:
+        if writer is not None:
+            writer.abort()
+            writer = None
+        error = e
+
+    def view():
+        # Same responses as upload_file() in app.py. The blob is only stored
+        # here, so a request the app's hooks turn away leaves nothing behind.
+        nonlocal writer
+        try:
+            if error is not None:
+                raise error
+            if filename is None:
+                return jsonify({'error': 'No file provided'}), 400
+            if filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            result, writer = writer.finish(), None
+            return _register_upload(filename, *result)
+        except HTTPException:
+            raise
+        except Exception as e:
+            return error_response(e)
+
+    try:
+        response = await _run(_dispatch, environ, view)
+    finally:
+        if writer is not None:
+            writer.abort()
+    await _send_wsgi(send, response, environ)
+
+
+def _admit(environ):
+    with flask_app.request_context(environ):
+        return rate_limiter.admit()
+
+
+def _decode(call, *args):
+    """Run a multipart decoder call, with a malformed body raised as a 400"""
+    try:
+        return call(*args)
+    except ValueError as e:
+        raise BadRequest(f'Malformed multipart body: {e}') from e
+
+
+def _dispatch(environ, view):
+    """Run view() as a Flask route for this request, with the app's hooks"""
+    with flask_app.request_context(environ):
+        try:
+            rv = flask_app.preprocess_request()
+            if rv is None:
+                rv = view()
+        except Exception as e:
+            rv = flask_app.handle_user_exception(e)
+        return flask_app.process_response(flask_app.make_response(rv))
+
+
+async def _send_wsgi(send, wsgi_app, environ):
+    """Call a WSGI app on the thread pool and send its response"""
+    status, headers, iterable, iterator = await _run(_start_wsgi, wsgi_app, environ)
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+        })
+        done = False
+        while not done:
+            body, done = await _run(_read_batch, iterator)
+            await send({'type': 'http.response.body', 'body': body, 'more_body': not done})
+    finally:
+        if hasattr(iterable, 'close'):
+            await _run(iterable.close)
+
+
+def _start_wsgi(wsgi_app, environ):
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(' ', 1)[0]), headers]
+
+    iterable = wsgi_app(environ, start_response)
+    iterator = iter(iterable)
+    if not started:  # generators may call start_response on first iteration
+        first = next(iterator, b'')
+        iterator = _prepend(first, iterator)
+    return started[0], started[1], iterable, iterator
+
+
+def _prepend(first, iterator):
+    yield first
+    yield from iterator
+
+
+def _read_batch(iterator):
+    chunks, size = [], 0
+    for chunk in iterator:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= RESPONSE_BATCH:
+            return b''.join(chunks), False
+    return b''.join(chunks), True
+
+
+def _header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def _content_length(scope):
+    value = _header(scope, b'content-length')
+    return int(value) if value and value.isdigit() else None
+
+
+def _environ(scope, body, content_length=None):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': '',
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for key, value in scope['headers']:
+        key, value = key.decode('latin-1'), value.decode('latin-1')
+        if key == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif key == 'content-length':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            name = 'HTTP_' + key.upper().replace('-', '_')
+            environ[name] = environ[name] + ',' + value if name in environ else value
+    if content_length is not None:
+        environ['CONTENT_LENGTH'] = str(content_length)
+    return environ
+
@@ -0,0 +1,136 @@
+"""Fingerprinted, precompressed static assets.
+
+``python assets.py`` copies every script and stylesheet in the project root
+to ``build/assets/<name>.<content hash>.<ext>`` and rewrites the HTML pages
+to reference those names. It then writes gzip (and, if the Brotli package is
+installed, brotli) variants of every file next to it. A manifest records
+what was built.
+
+At runtime ``StaticAssets`` serves the build: fingerprinted files are
+immutable and cached for a year, while pages are revalidated through their
+ETag. Each response uses the smallest encoding the client accepts. Range
+and conditional requests are handled by ``send_file``. Without a build, the
+app keeps serving the project files directly.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped without the package
+    brotli = None
+
+BUILD_DIR = 'build'
+ASSET_URL_PREFIX = '/assets/'
+FINGERPRINT_EXTENSIONS = ('.js', '.css')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Content-Encoding -> file suffix, in order of preference
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def build(source_dir='.', build_dir=BUILD_DIR):
+    """Build fingerprinted assets and rewritten pages; returns the manifest"""
+    assets_dir = os.path.join(build_dir, 'assets')
+    pages_dir = os.path.join(build_dir, 'pages')
+    for directory in (assets_dir, pages_dir):
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+    assets = {}
+    for name in sorted(os.listdir(source_dir)):
+        root, ext = os.path.splitext(name)
+        if ext in FINGERPRINT_EXTENSIONS:
+            with open(os.path.join(source_dir, name), 'rb') as f:
+                data = f.read()
+            fingerprinted = f'{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+            _write_variants(os.path.join(assets_dir, fingerprinted), data)
+            assets[name] = fingerprinted
+
+    reference = re.compile(r'''(\b(?:src|href)=["'])(%s)(["'])''' % '|'.join(map(re.escape, assets)))
+    pages = []
+    for name in sorted(os.listdir(source_dir)):
+        if name.endswith('.html'):
+            with open(os.path.join(source_dir, name), encoding='utf-8') as f:
+                html = f.read()
+            if assets:
+                html = reference.sub(lambda m: m.group(1) + ASSET_URL_PREFIX + assets[m.group(2)] + m.group(3), html)
+            _write_variants(os.path.join(pages_dir, name), html.encode('utf-8'))
+            pages.append(name)
+
+    manifest = {'assets': assets, 'pages': pages}
+    with open(os.path.join(build_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _write_variants(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+class StaticAssets:
+    """Serves the output of build() with encoding negotiation."""
+
+    def __init__(self, build_dir=BUILD_DIR):
+        self.build_dir = os.path.abspath(build_dir)
+        self.pages = set()
+        try:
+            with open(os.path.join(self.build_dir, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            self.enabled = False
+            return
+        self.enabled = True
+        self.pages = set(manifest['pages'])
+        self.assets = set(manifest['assets'].values())
+
+    def has_page(self, name):
+        return self.enabled and name in self.pages
+
+    def has_asset(self, name):
+        return self.enabled and name in self.assets
+
+    def page_path(self, name):
+        return os.path.join(self.build_dir, 'pages', name)
+
+    def send_page(self, name):
+        response = self._send(self.page_path(name))
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def send_asset(self, name):
+        response = self._send(os.path.join(self.build_dir, 'assets', name))
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+    def _send(self, path):
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        encoding = None
+        for name, suffix in _ENCODINGS:
+            if request.accept_encodings[name] > 0 and os.path.exists(path + suffix):
+                encoding, path = name, path + suffix
+                break
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=True)
+        if encoding is not None:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+if __name__ == '__main__':
+    built = build()
+    print(f"Built {len(built['assets'])} assets and {len(built['pages'])} pages into {BUILD_DIR}/"
+          + ('' if brotli is not None else ' (install Brotli for .br variants)'))
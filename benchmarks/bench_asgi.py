@@ -0,0 +1,112 @@
+"""p99 latency under slow clients: gunicorn (WSGI) against uvicorn (ASGI).
+
+Usage: python benchmarks/bench_asgi.py [--workers 2] [--threads 4] [--slow-clients 200]
+                                       [--fast-clients 10] [--seconds 15]
+
+Starts each server in turn with the same number of worker processes. Slow
+clients keep trickling contact forms and 256 KB uploads, each spread over
+``--slow-seconds``. Meanwhile fast clients send product reads back to back.
+Prints one JSON document with p50/p95/p99 latency and throughput of the
+fast requests and the number of slow requests completed, per server.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import REQUEST_ERRORS, ROOT, percentiles, request, wait_until_ready
+
+HOST = '127.0.0.1'
+FAST_PATHS = ['/api/products/1', '/api/products/search?q=pixel', '/api/brands']
+CONTACT = json.dumps({'firstName': 'Ann', 'lastName': 'Lee', 'email': 'ann@example.com',
+                      'subject': 'Order', 'message': 'Where is my order? ' * 20}).encode()
+BOUNDARY = 'benchboundary'
+UPLOAD = (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="scan.pdf"\r\n'
+          'Content-Type: application/pdf\r\n\r\n').encode() + os.urandom(256 * 1024) + f'\r\n--{BOUNDARY}--\r\n'.encode()
+
+
+async def fast_client(port, deadline, latencies, errors):
+    i = 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            status = await request(HOST, port, 'GET', FAST_PATHS[i % len(FAST_PATHS)])
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(status)
+        except REQUEST_ERRORS as e:
+            errors.append(type(e).__name__)
+        i += 1
+
+
+async def slow_client(port, deadline, spread, completed, errors, n):
+    while time.monotonic() < deadline:
+        try:
+            if n % 2:
+                status = await request(HOST, port, 'POST', '/api/contact', CONTACT, 'application/json',
+                                       pieces=10, spread=spread)
+            else:
+                status = await request(HOST, port, 'POST', '/api/upload', UPLOAD,
+                                       f'multipart/form-data; boundary={BOUNDARY}', pieces=32, spread=spread)
+            (completed if status == 200 else errors).append(status)
+        except REQUEST_ERRORS as e:
+            errors.append(type(e).__name__)
+
+
+async def load(port, args):
+    deadline = time.monotonic() + args.seconds
+    latencies, fast_errors, completed, slow_errors = [], [], [], []
+    await asyncio.gather(
+        *(slow_client(port, deadline, args.slow_seconds, completed, slow_errors, n) for n in range(args.slow_clients)),
+        *(fast_client(port, deadline, latencies, fast_errors) for _ in range(args.fast_clients)))
+    latency = percentiles(latencies)
+    return {'fast_requests': len(latencies), 'fast_per_sec': round(len(latencies) / args.seconds, 1),
+            'p50_ms': latency['p50'], 'p95_ms': latency['p95'], 'p99_ms': latency['p99'],
+            'fast_errors': len(fast_errors), 'slow_completed': len(completed), 'slow_errors': len(slow_errors)}
+
+
+def bench(name, command, port, args):
+    data_dir = tempfile.mkdtemp(prefix='ngm-asgi-')
+    env = dict(os.environ, NGM_SHARED_DB=os.path.join(data_dir, 'shared.db'), NGM_DATA_DIR='',
+               NGM_RATE_LIMITS='off')
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    try:
+        wait_until_ready(HOST, port)
+        result = asyncio.run(load(port, args))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    return dict(server=name, **result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--slow-clients', type=int, default=200)
+    parser.add_argument('--slow-seconds', type=float, default=2.0)
+    parser.add_argument('--fast-clients', type=int, default=10)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--port', type=int, default=8775)
+    args = parser.parse_args()
+
+    servers = [
+        ('wsgi', [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers), '--threads', str(args.threads),
+                  '--bind', f'{HOST}:{args.port}', '--log-level', 'warning', 'app:app'], args.port),
+        ('asgi', [sys.executable, '-m', 'uvicorn', '--workers', str(args.workers), '--host', HOST,
+                  '--port', str(args.port + 1), '--log-level', 'warning', 'asgi:app'], args.port + 1),
+    ]
+    results = [bench(name, command, port, args) for name, command, port in servers]
+    print(json.dumps({'workers': args.workers, 'slow_clients': args.slow_clients, 'fast_clients': args.fast_clients,
+                      'seconds': args.seconds, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
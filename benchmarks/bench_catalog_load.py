@@ -0,0 +1,66 @@
+"""Catalog load time by size: what startup waits for, and what is built after it.
+
+Usage: python benchmarks/bench_catalog_load.py [--sizes 10000,100000,1000000] [--output results.json]
+
+For each size, writes a JSON Lines catalog to a temporary file and times
+reading it back (parsed with orjson when installed, and validated),
+indexing it into a Catalog, and building the search and facet indexes.
+Startup waits for the first two only; the indexes are built in
+the background, and a reload builds all four before swapping them in.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from common import ROOT, environment, write_results
+from datasets import make_products
+
+sys.path.insert(0, ROOT)
+
+from catalog import Catalog  # noqa: E402
+from catalog_loader import orjson, read_products, write_products  # noqa: E402
+from facets import FacetIndex  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+
+
+def timed(fn):
+    start = time.perf_counter()
+    value = fn()
+    return value, round((time.perf_counter() - start) * 1e3, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (int(s) for s in args.sizes.split(',')):
+            path = os.path.join(directory, f'catalog-{size}.jsonl')
+            write_products(path, make_products(size))
+            products, read_ms = timed(lambda: read_products(path))
+            catalog, catalog_ms = timed(lambda: Catalog(products))
+            _, search_ms = timed(lambda: SearchIndex(catalog))
+            _, facets_ms = timed(lambda: FacetIndex(catalog))
+            results[str(size)] = {
+                'file_mb': round(os.path.getsize(path) / 1e6, 1),
+                'read_ms': read_ms,
+                'catalog_ms': catalog_ms,
+                'startup_ms': round(read_ms + catalog_ms, 1),
+                'search_index_ms': search_ms,
+                'facet_index_ms': facets_ms,
+                'reload_ms': round(read_ms + catalog_ms + search_ms + facets_ms, 1),
+            }
+            print(f'{size:>8} products  startup {results[str(size)]["startup_ms"]:>9} ms  '
+                  f'reload {results[str(size)]["reload_ms"]:>9} ms', file=sys.stderr)
+            del products, catalog
+    write_results({'benchmark': 'catalog_load', 'environment': environment(),
+                   'parser': 'orjson' if orjson is not None else 'json', 'sizes': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Faceted filtering latency by catalog size: bitmap index against a filtering scan.
+
+Usage: python benchmarks/bench_facets.py [--sizes 1000,10000,100000,1000000] [--queries 200]
+                                         [--max-seconds 10] [--output results.json]
+
+For each catalog size, runs ``--queries`` random filter combinations (zero
+to two values per facet) through FacetIndex.search, which returns the
+first page and the counts of every facet value, and the same work done the
+straightforward way: one pass over the catalog per facet. Reports p50/p95
+microseconds per query for both, and the time to build the index.
+Each method stops early after ``--max-seconds`` per size.
+"""
+import argparse
+import random
+import sys
+import time
+
+from common import ROOT, environment, percentiles, write_results
+from datasets import BRANDS, COLORS, STORAGE, make_products
+
+sys.path.insert(0, ROOT)
+
+from catalog import Catalog  # noqa: E402
+from facets import FACETS, FacetIndex, price_bucket  # noqa: E402
+
+VALUES = {'brand': BRANDS, 'storage': STORAGE, 'color': COLORS, 'price': ['0-500', '500-800', '800-1000', '1000+']}
+
+
+def make_queries(count, seed=0):
+    rng = random.Random(seed)
+    return [{facet: rng.sample(VALUES[facet], rng.randint(0, 2)) for facet in FACETS} for _ in range(count)]
+
+
+def scan(products, filters, limit):
+    """Reference implementation: filter and count with plain loops"""
+    def value(product, facet):
+        return price_bucket(product['price']) if facet == 'price' else product[facet]
+
+    def matches(product, skip=None):
+        return all(not values or value(product, facet) in values
+                   for facet, values in filters.items() if facet != skip)
+
+    page = [p for p in products if matches(p)]
+    counts = {}
+    for facet in FACETS:
+        counts[facet] = {}
+        for product in products:
+            if matches(product, skip=facet):
+                key = value(product, facet)
+                counts[facet][key] = counts[facet].get(key, 0) + 1
+    return page[:limit], len(page), counts
+
+
+def timed(fn, queries, max_seconds):
+    samples = []
+    deadline = time.perf_counter() + max_seconds
+    for filters in queries:
+        start = time.perf_counter()
+        fn(filters)
+        samples.append(time.perf_counter() - start)
+        if time.perf_counter() > deadline:
+            break
+    return percentiles(samples, scale=1e6, digits=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--max-seconds', type=float, default=10)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries)
+    results = {}
+    for size in (int(s) for s in args.sizes.split(',')):
+        products = make_products(size)
+        catalog = Catalog(products)
+        start = time.perf_counter()
+        index = FacetIndex(catalog)
+        build = time.perf_counter() - start
+        results[str(size)] = {
+            'build_ms': round(build * 1e3, 1),
+            'bitmap': timed(lambda f: index.search(f, limit=50), queries, args.max_seconds),
+            'scan': timed(lambda f: scan(products, f, 50), queries, args.max_seconds),
+        }
+        print(f'{size:>8} products  bitmap p50 {results[str(size)]["bitmap"]["p50"]:>10} us  '
+              f'scan p50 {results[str(size)]["scan"]["p50"]:>12} us', file=sys.stderr)
+    write_results({'benchmark': 'facets', 'environment': environment(), 'queries': args.queries,
+                   'sizes': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Time every API handler through the Flask test client at several catalog sizes.
+
+Usage: python benchmarks/bench_handlers.py [--sizes 1000,10000,100000,1000000] [--users 1000]
+                                           [--orders 10000] [--iterations 200] [--max-seconds 2]
+                                           [--output results.json]
+
+For each catalog size, installs a synthetic catalog, user set and order
+history into the app, then calls each endpoint up to ``--iterations`` times
+(stopping early after ``--max-seconds``). Catalog reads are timed twice:
+``warm`` repeats one URL, so it is served from the response cache, and
+``cold`` adds a distinct query parameter each time so the view runs. The
+JSON output has per-endpoint p50/p95/p99/mean in microseconds for each size,
+plus ``growth``: each endpoint's p50 at the largest size divided by its p50
+at the smallest. A handler whose cost should not depend on catalog size
+shows up there when it starts to.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+os.environ.setdefault('NGM_DATA_DIR', '')  # no write-ahead log while benchmarking
+os.environ.setdefault('NGM_SLOW_REQUEST_MS', '0')
+os.environ.setdefault('NGM_RATE_LIMITS', 'off')
+os.environ.setdefault('NGM_DEFAULT_STOCK', str(10 ** 9))  # checkouts never run out
+
+from common import ROOT, environment, percentiles, write_results  # noqa: E402
+from datasets import install, make_orders, make_products, make_users  # noqa: E402
+
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import app as app_module  # noqa: E402
+
+ORDER_ITEMS = {'items': [{'id': 1, 'quantity': 1}, {'id': 2, 'quantity': 2}]}
+# Orders per batch and ids per lookup in the batch endpoints
+BATCH = 100
+
+
+def endpoints(size, users, orders):
+    """(name, function of the iteration number returning test client kwargs)"""
+    def get(path):
+        return lambda i: {'method': 'GET', 'path': path.format(i=i, product=i % size + 1, order=i % orders + 1)}
+
+    cached = [
+        ('products_all', '/api/products'),
+        ('products_page', '/api/products?limit=50'),
+        ('products_page_fields', '/api/products?limit=50&fields=id,name,price'),
+        ('product_detail', '/api/products/{product}'),
+        ('products_ids', '/api/products?ids=' + ','.join(str(i * 7 % size + 1) for i in range(BATCH))),
+        ('search', '/api/products/search?q=pro&limit=20'),
+        ('search_two_terms', '/api/products/search?q=samsung+ultra&limit=20'),
+        ('search_fuzzy', '/api/products/search?q=galxy&limit=20'),
+        ('filter_brand', '/api/products/filter?brand=Samsung&limit=50'),
+        ('filter_price', '/api/products/filter?min_price=500&max_price=600&limit=50'),
+        ('facets', '/api/products/facets?limit=50'),
+        ('facets_filtered', '/api/products/facets?brand=Apple,Samsung&storage=256GB&price=800-1000&limit=50'),
+        ('brands', '/api/brands'),
+    ]
+    for name, path in cached:
+        yield name + '_warm', get(path)
+        yield name + '_cold', get(path + ('&' if '?' in path else '?') + 'nocache={i}')
+
+    yield 'page_index', get('/')
+    yield 'page_products', get('/products.html')
+    yield 'page_product_detail', get('/product-detail.html?id={product}')
+    yield 'stats', get('/api/stats')
+    yield 'stats_window', get('/api/stats?window=24h')
+    yield 'create_order', lambda i: {'method': 'POST', 'path': '/api/orders', 'json': ORDER_ITEMS}
+    yield 'create_orders_batch', lambda i: {'method': 'POST', 'path': '/api/orders/batch',
+                                            'json': {'orders': [ORDER_ITEMS] * BATCH}}
+    yield 'get_order', get('/api/orders/{order}')
+    yield 'delete_order', lambda i: {'method': 'DELETE', 'path': f'/api/orders/{orders + 1 + i}',
+                                     'headers': {'X-CSRF-Token': 'bench'}}
+    yield 'register', lambda i: {'method': 'POST', 'path': '/api/auth/register', 'json': {
+        'firstName': 'New', 'lastName': 'User', 'email': f'new{size}-{i}@example.com', 'password': 'secret'}}
+    yield 'login', lambda i: {'method': 'POST', 'path': '/api/auth/login', 'json': {
+        'email': f'user{i % users + 1}@example.com', 'password': 'password123'}}
+    yield 'logout', lambda i: {'method': 'POST', 'path': '/api/auth/logout'}
+    yield 'profile_get', get('/api/user/profile/1')
+    yield 'profile_update', lambda i: {'method': 'PUT', 'path': '/api/user/profile',
+                                       'json': {'id': 1, 'phone': f'+1 555 {i:04d}'}}
+    yield 'user_orders', get('/api/user/orders?limit=20')
+    yield 'upload', lambda i: {'method': 'POST', 'path': '/api/upload', 'content_type': 'multipart/form-data',
+                               'data': {'file': (io.BytesIO(b'%PDF-1.4 ' + str(i).encode() * 2048), 'scan.pdf')}}
+    yield 'user_files', get('/api/user/files')
+    yield 'contact', lambda i: {'method': 'POST', 'path': '/api/contact', 'json': {
+        'firstName': 'Ann', 'email': 'ann@example.com', 'subject': 'Hi', 'message': 'Where is my order?'}}
+    yield 'metrics', get('/metrics')
+
+
+def run_endpoint(client, make_request, iterations, max_seconds):
+    samples, statuses = [], {}
+    deadline = time.perf_counter() + max_seconds
+    for i in range(iterations):
+        kwargs = make_request(i)
+        start = time.perf_counter()
+        response = client.open(buffered=True, **kwargs)
+        samples.append(time.perf_counter() - start)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if time.perf_counter() > deadline:
+            break
+    return dict(iterations=len(samples), statuses=statuses, **percentiles(samples, scale=1e6, digits=1))
+
+
+def bench_size(size, args):
+    start = time.perf_counter()
+    products = make_products(size)
+    users = make_users(args.users)
+    orders = make_orders(args.orders, args.users, products[:1000])
+    install(app_module, products, users, orders)
+    setup = time.perf_counter() - start
+    client = app_module.app.test_client()
+    results = {}
+    for name, make_request in endpoints(size, args.users, args.orders):
+        results[name] = run_endpoint(client, make_request, args.iterations, args.max_seconds)
+        print(f'{size:>8} {name:<26} p50 {results[name]["p50"]:>10} us', file=sys.stderr)
+    return {'setup_seconds': round(setup, 2), 'endpoints': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--max-seconds', type=float, default=2.0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    by_size = {str(size): bench_size(size, args) for size in sizes}
+    smallest, largest = by_size[str(sizes[0])]['endpoints'], by_size[str(sizes[-1])]['endpoints']
+    growth = {name: round(largest[name]['p50'] / smallest[name]['p50'], 2)
+              for name in smallest if smallest[name]['p50'] and largest[name]['p50']}
+    write_results({'benchmark': 'handlers', 'environment': environment(), 'users': args.users,
+                   'orders': args.orders, 'sizes': by_size, 'growth': growth}, args.output)
+
+
+if __name__ == '__main__':
+    main()
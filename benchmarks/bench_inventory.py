@@ -0,0 +1,80 @@
+"""Checkout throughput against thread count for striped and single-lock stock counters.
+
+Usage: python benchmarks/bench_inventory.py [--threads 1,2,4,8,16] [--stripes 1,64]
+                                            [--products 1000] [--seconds 3] [--work-us 200]
+                                            [--hot 0.0] [--output results.json]
+
+Each thread runs checkouts back to back: pick one to three products,
+reserve them all or nothing, then spend ``--work-us`` outside the stock
+locks (a stand-in for the rest of the request, which releases the GIL the
+way database and socket I/O do) and release the stock again so it never
+runs out. ``--hot`` is the share of checkouts that include product 1, to
+model a flash sale on one item. With ``--stripes 1`` every checkout takes
+the same lock, as a single global lock would.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from common import ROOT, environment, write_results
+
+sys.path.insert(0, ROOT)
+
+from inventory import Inventory  # noqa: E402
+
+
+def worker(inventory, products, hot, work, deadline, seed, counts, index):
+    rng = random.Random(seed)
+    done = 0
+    while time.perf_counter() < deadline:
+        quantities = {rng.randint(1, products): 1 for _ in range(rng.randint(1, 3))}
+        if hot and rng.random() < hot:
+            quantities[1] = 1
+        inventory.reserve(quantities)
+        if work:
+            time.sleep(work)
+        inventory.release(quantities)
+        done += 1
+    counts[index] = done
+
+
+def run(threads, stripes, args):
+    inventory = Inventory(lambda product_id: 10 ** 9, stripes=stripes)
+    counts = [0] * threads
+    deadline = time.perf_counter() + args.seconds
+    pool = [threading.Thread(target=worker, args=(inventory, args.products, args.hot, args.work_us / 1e6,
+                                                  deadline, i, counts, i))
+            for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return round(sum(counts) / args.seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', default='1,2,4,8,16')
+    parser.add_argument('--stripes', default='1,64')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--work-us', type=float, default=200)
+    parser.add_argument('--hot', type=float, default=0.0)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    results = {}
+    for stripes in (int(s) for s in args.stripes.split(',')):
+        results[str(stripes)] = {}
+        for threads in (int(t) for t in args.threads.split(',')):
+            results[str(stripes)][str(threads)] = rate = run(threads, stripes, args)
+            print(f'stripes {stripes:>3} threads {threads:>3} {rate:>9} checkouts/s', file=sys.stderr)
+    write_results({'benchmark': 'inventory', 'environment': environment(), 'products': args.products,
+                   'work_us': args.work_us, 'hot': args.hot, 'checkouts_per_sec': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""CPU time per request and bytes on the wire for JSON encoders and compression.
+
+Usage: python benchmarks/bench_json.py [--products 10000] [--orders 2000] [--files 500]
+                                       [--iterations 100] [--output results.json]
+
+Installs a synthetic dataset, then calls each endpoint ``--iterations``
+times under every configuration: the standard library encoder or orjson,
+each sent uncompressed, gzip or brotli (chosen through Accept-Encoding).
+Catalog reads carry a distinct query parameter so the response cache does
+not hide the encoding cost. Reports mean CPU microseconds per request
+(process time, so compression counts) and mean response bytes.
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import sys
+import time
+
+os.environ.setdefault('NGM_DATA_DIR', '')
+os.environ.setdefault('NGM_SLOW_REQUEST_MS', '0')
+os.environ.setdefault('NGM_RATE_LIMITS', 'off')
+
+from common import ROOT, environment, write_results  # noqa: E402
+from datasets import install, make_orders, make_products, make_users  # noqa: E402
+
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import app as app_module  # noqa: E402
+from json_provider import FastJSONProvider, orjson  # noqa: E402
+
+ENDPOINTS = [
+    ('products_all', 'GET', '/api/products?nocache={i}', None),
+    ('products_page', 'GET', '/api/products?limit=50&nocache={i}', None),
+    ('search', 'GET', '/api/products/search?q=pro&limit=50&nocache={i}', None),
+    ('user_orders', 'GET', '/api/user/orders', None),
+    ('user_files', 'GET', '/api/user/files', None),
+    ('stats', 'GET', '/api/stats', None),
+    ('login_flag', 'POST', '/api/auth/login', {'email': "admin'--", 'password': 'x'}),
+]
+ENCODINGS = [('identity', None), ('gzip', 'gzip'), ('br', 'br')]
+# Request numbers for nocache=, unique across configurations
+_sequence = itertools.count()
+
+
+def add_files(count):
+    for i in range(count):
+        digest = hashlib.sha256(str(i).encode()).hexdigest()
+        app_module.user_files.add(app_module.DEMO_USER_ID, {
+            'id': f'bench-{i}', 'filename': f'scan-{i}.pdf', 'saved_filename': f'blobs/{digest[:2]}/{digest}',
+            'filepath': f'uploads/blobs/{digest[:2]}/{digest}', 'size': 4096 + i, 'sha256': digest,
+            'upload_date': '2024-01-01T00:00:00.000000Z'})
+
+
+def measure(client, method, path, body, encoding, iterations):
+    headers = {'Accept-Encoding': encoding} if encoding else {}
+    cpu, sent = 0.0, 0
+    for _ in range(iterations):
+        url = path.format(i=next(_sequence))
+        start = time.process_time()
+        response = client.open(url, method=method, json=body, headers=headers, buffered=True)
+        cpu += time.process_time() - start
+        sent += len(response.get_data())
+        if response.status_code != 200:
+            raise SystemExit(f'{path} returned {response.status_code}')
+    return {'cpu_us': round(cpu / iterations * 1e6, 1), 'bytes': sent // iterations}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--orders', type=int, default=2000, help='orders of the user whose history is read')
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    products = make_products(args.products)
+    install(app_module, products, make_users(1), make_orders(args.orders, 1, products[:1000]))
+    add_files(args.files)
+    client = app_module.app.test_client()
+    encoders = [('json', False)] + ([('orjson', True)] if orjson is not None else [])
+
+    results = {}
+    for encoder, use_orjson in encoders:
+        app_module.app.json = FastJSONProvider(app_module.app, use_orjson=use_orjson)
+        for label, encoding in ENCODINGS:
+            config = f'{encoder}+{label}'
+            results[config] = {}
+            for name, method, path, body in ENDPOINTS:
+                results[config][name] = measure(client, method, path, body, encoding, args.iterations)
+                print(f'{config:<14} {name:<14} {results[config][name]["cpu_us"]:>10} us '
+                      f'{results[config][name]["bytes"]:>10} B', file=sys.stderr)
+    write_results({'benchmark': 'json', 'environment': environment(), 'products': args.products,
+                   'orders': args.orders, 'files': args.files, 'configs': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Write throughput and recovery time of the write-ahead log.
+
+Usage: python benchmarks/bench_wal.py [--records 1000000] [--always-records 20000]
+
+Appends order-sized records under each fsync policy, then measures how long
+startup takes to replay the full log and to recover from a snapshot plus a
+10% log tail. Prints one JSON document with the results.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from durability import Durability, WriteAheadLog  # noqa: E402
+
+
+def make_order(i):
+    return {
+        'id': i, 'userId': i % 1000, 'orderNumber': f'ORD-2024-{i:03d}', 'date': '2024-01-15',
+        'status': 'pending', 'total': 999.0, 'shippingAddress': '123 Main St',
+        'items': [{'id': 1, 'name': 'iPhone 15 Pro', 'price': 999, 'quantity': 1}],
+    }
+
+
+def bench_append(directory, fsync, records, threads=1):
+    log = WriteAheadLog(directory, fsync=fsync)
+    per_thread = records // threads
+
+    def worker(offset):
+        for i in range(offset, offset + per_thread):
+            log.append('order.put', make_order(i))
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(t * per_thread,)) for t in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    log.sync()
+    elapsed = time.perf_counter() - start
+    log.close()
+    total = per_thread * threads
+    return {'fsync': fsync, 'threads': threads, 'records': total,
+            'seconds': round(elapsed, 3), 'records_per_sec': round(total / elapsed)}
+
+
+def bench_recovery(directory, records, tail_fraction=0.1):
+    state = {}
+
+    def capture():
+        return {'orders': list(state.values())}
+
+    def restore(snapshot):
+        state.clear()
+        state.update((o['id'], o) for o in snapshot['orders'])
+
+    def apply(kind, data):
+        state[data['id']] = data
+
+    durable = Durability(directory, capture, restore, apply, fsync='never')
+    start = time.perf_counter()
+    replayed = durable.recover()
+    full_replay = time.perf_counter() - start
+
+    durable.snapshot()
+    tail = int(records * tail_fraction)
+    for i in range(records, records + tail):
+        order = make_order(i)
+        state[i] = order
+        durable.record('order.put', order)
+    durable.close()
+
+    state.clear()
+    durable = Durability(directory, capture, restore, apply, fsync='never')
+    start = time.perf_counter()
+    tail_replayed = durable.recover()
+    snapshot_recovery = time.perf_counter() - start
+    durable.close()
+    return {
+        'full_replay': {'records': replayed, 'seconds': round(full_replay, 3)},
+        'snapshot_plus_tail': {'snapshot_records': records, 'tail_records': tail_replayed,
+                               'seconds': round(snapshot_recovery, 3)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--always-records', type=int, default=20000,
+                        help='records for fsync=always, which is bound by disk flush latency')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench-wal-')
+    try:
+        results = {'append': []}
+        for fsync, records, threads in (('never', args.records, 1), ('interval', args.records, 1),
+                                        ('always', args.always_records, 1), ('always', args.always_records, 16)):
+            directory = os.path.join(root, f'{fsync}-{threads}')
+            results['append'].append(bench_append(directory, fsync, records, threads))
+        results['recovery'] = bench_recovery(os.path.join(root, 'interval-1'), args.records)
+        print(json.dumps(results, indent=2))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
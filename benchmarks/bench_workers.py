@@ -0,0 +1,112 @@
+"""Requests per second with 1, 2, 4 and 8 gunicorn workers sharing one database.
+
+Usage: python benchmarks/bench_workers.py [--workers 1,2,4,8] [--seconds 10] [--clients 16] [--write-ratio 0.1]
+
+For each worker count, starts ``gunicorn app:app`` in multi-worker mode on a
+fresh SQLite database. Client processes then send a mix of product reads,
+order history reads and order creation for the given number of seconds.
+Prints one JSON document with requests/sec and error counts per worker
+count. The clients run on the same machine as the server, so scaling flattens
+out once workers and clients together use every core.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READS = [
+    '/api/products/{product}',
+    '/api/products?limit=4',
+    '/api/products/filter?brand=Apple',
+    '/api/user/orders?limit=10',
+    '/api/stats',
+]
+ORDER = json.dumps({'items': [{'id': 1, 'quantity': 1}, {'id': 3, 'quantity': 2}]})
+
+
+def client(port, seconds, write_ratio, seed):
+    """Send requests until the deadline; returns (ok, errors)"""
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    ok = errors = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            if rng.random() < write_ratio:
+                conn.request('POST', '/api/orders', ORDER, {'Content-Type': 'application/json'})
+            else:
+                conn.request('GET', rng.choice(READS).format(product=rng.randint(1, 8)))
+            response = conn.getresponse()
+            response.read()
+            if response.status < 400:
+                ok += 1
+            else:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+    conn.close()
+    return ok, errors
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/api/brands')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f'server on port {port} did not start')
+
+
+def bench(workers, args, port):
+    data_dir = tempfile.mkdtemp(prefix='ngm-workers-')
+    env = dict(os.environ, NGM_SHARED_DB=os.path.join(data_dir, 'shared.db'), NGM_DATA_DIR='',
+               NGM_RATE_LIMITS='off', NGM_DEFAULT_STOCK=str(10 ** 9))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(args.threads),
+         '--bind', f'127.0.0.1:{port}', '--log-level', 'warning', 'app:app'],
+        cwd=ROOT, env=env)
+    try:
+        wait_until_ready(port)
+        with multiprocessing.Pool(args.clients) as pool:
+            results = pool.starmap(client, [(port, args.seconds, args.write_ratio, i) for i in range(args.clients)])
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(data_dir, ignore_errors=True)
+    ok = sum(r[0] for r in results)
+    errors = sum(r[1] for r in results)
+    return {'workers': workers, 'requests': ok, 'errors': errors,
+            'requests_per_sec': round(ok / args.seconds)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4,8')
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--write-ratio', type=float, default=0.1)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    results = [bench(int(n), args, args.port + i) for i, n in enumerate(args.workers.split(','))]
+    print(json.dumps({'cpu_count': os.cpu_count(), 'clients': args.clients, 'seconds': args.seconds,
+                      'write_ratio': args.write_ratio, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
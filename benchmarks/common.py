@@ -0,0 +1,81 @@
+"""Helpers shared by the benchmark scripts."""
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+async def request(host, port, method, path, body=b'', content_type=None, headers=None,
+                  pieces=1, spread=0.0, timeout=60):
+    """Send one HTTP/1.1 request on a new connection; returns the status.
+
+    The body can be trickled in ``pieces`` over ``spread`` seconds to act
+    like a slow client.
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        head = f'{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n'
+        for name, value in (headers or {}).items():
+            head += f'{name}: {value}\r\n'
+        if body:
+            head += f'Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n'
+        writer.write((head + '\r\n').encode())
+        step = -(-len(body) // pieces) if body else 0
+        for i in range(0, len(body), step or 1):
+            writer.write(body[i:i + step])
+            await writer.drain()
+            if spread:
+                await asyncio.sleep(spread / pieces)
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+REQUEST_ERRORS = (OSError, asyncio.TimeoutError, ValueError, IndexError)
+
+
+def wait_until_ready(host, port, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if asyncio.run(request(host, port, 'GET', '/api/brands', timeout=1)) == 200:
+                return
+        except REQUEST_ERRORS:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f'server on {host}:{port} did not start')
+
+
+def percentiles(samples, scale=1000.0, digits=2):
+    """p50/p95/p99 and mean of a list of seconds, in milliseconds by default"""
+    if not samples:
+        return {'p50': None, 'p95': None, 'p99': None, 'mean': None}
+    ordered = sorted(samples)
+
+    def pick(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * scale, digits)
+
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99),
+            'mean': round(sum(ordered) / len(ordered) * scale, digits)}
+
+
+def environment():
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+
+
+def write_results(results, output=None):
+    """Print results as JSON, or write them to ``output``"""
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+        print(f'wrote {output}', file=sys.stderr)
+    else:
+        print(text)
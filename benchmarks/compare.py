@@ -0,0 +1,49 @@
+"""Compare two benchmark result files and flag regressions.
+
+Usage: python benchmarks/compare.py baseline.json current.json [--threshold 1.25]
+
+Works on the output of bench_handlers.py (p50 per size and endpoint) and
+load_test.py (p99 per endpoint). Prints every measurement that got slower
+by more than ``--threshold`` times and exits with status 1 if there is any.
+"""
+import argparse
+import json
+import sys
+
+
+def measurements(results):
+    """Yield (label, milliseconds-or-microseconds) pairs from a results file"""
+    if results.get('benchmark') == 'handlers':
+        for size, data in results['sizes'].items():
+            for name, timing in data['endpoints'].items():
+                yield f'{size} {name} p50_us', timing['p50']
+    elif results.get('benchmark') == 'load':
+        for name, data in results['endpoints'].items():
+            yield f'{name} p99_ms', data['latency_ms']['p99']
+    else:
+        raise SystemExit('unrecognised results file')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=1.25)
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = dict(measurements(json.load(f)))
+    with open(args.current) as f:
+        current = dict(measurements(json.load(f)))
+    regressions = 0
+    for label, before in baseline.items():
+        after = current.get(label)
+        if before and after and after / before > args.threshold:
+            print(f'{label}: {before} -> {after} ({after / before:.2f}x)')
+            regressions += 1
+    print(f'{regressions} regression(s) over {args.threshold}x', file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
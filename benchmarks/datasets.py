@@ -0,0 +1,94 @@
+"""Synthetic catalogs, users and order histories for the benchmarks.
+
+Every generator is deterministic for a given size and seed. Product names
+draw from a fixed vocabulary of brands, series and model numbers, so the
+search index grows the way a real phone catalog's would rather than
+gaining a new word per product.
+"""
+import hashlib
+import random
+
+BRANDS = ['Apple', 'Samsung', 'Google', 'OnePlus', 'Xiaomi', 'Huawei', 'Sony', 'Nothing',
+          'Motorola', 'Nokia', 'Oppo', 'Vivo', 'Realme', 'Asus', 'Honor', 'Fairphone']
+SERIES = ['Pro', 'Max', 'Ultra', 'Lite', 'Plus', 'Mini', 'Edge', 'Fold', 'Flip', 'Neo', 'Note', 'Prime']
+COLORS = ['Black', 'White', 'Silver', 'Blue', 'Green', 'Titanium Gray', 'Rose Gold', 'Obsidian', 'Coral']
+STORAGE = ['64GB', '128GB', '256GB', '512GB', '1TB']
+FEATURES = ['camera', 'battery', 'display', 'charging', 'design', 'performance', 'zoom', 'AI', 'gaming']
+
+
+def make_products(count, seed=0):
+    rng = random.Random(seed)
+    products = []
+    for i in range(1, count + 1):
+        brand = rng.choice(BRANDS)
+        name = f'{brand} {rng.choice(SERIES)} {rng.randint(1, 99)}'
+        products.append({
+            'id': i,
+            'name': name,
+            'price': rng.randrange(99, 2000),
+            'image': f'https://via.placeholder.com/300x300?text={name.replace(" ", "+")}',
+            'description': f'Great {rng.choice(FEATURES)} and {rng.choice(FEATURES)}',
+            'brand': brand,
+            'storage': rng.choice(STORAGE),
+            'color': rng.choice(COLORS),
+        })
+    return products
+
+
+def make_users(count, seed=0):
+    password = hashlib.sha256(b'password123').hexdigest()
+    return [{
+        'id': i,
+        'firstName': f'User{i}',
+        'lastName': 'Bench',
+        'email': f'user{i}@example.com',
+        'password': password,
+        'phone': '',
+        'address': f'{i} Bench St',
+        'birthDate': '1990-01-01',
+        'createdAt': '2024-01-01T00:00:00Z',
+    } for i in range(1, count + 1)]
+
+
+def make_orders(count, users, products, seed=0):
+    """Orders spread over ``users`` users, dated across 2024"""
+    rng = random.Random(seed)
+    orders = []
+    for i in range(1, count + 1):
+        items = []
+        for product in rng.sample(products, min(len(products), rng.randint(1, 3))):
+            items.append({'id': product['id'], 'name': product['name'], 'price': product['price'],
+                          'quantity': rng.randint(1, 2), 'image': product['image'], 'brand': product['brand']})
+        day = rng.randrange(365)
+        orders.append({
+            'id': i,
+            'userId': rng.randint(1, users),
+            'orderNumber': f'ORD-2024-{i:03d}',
+            'date': f'2024-{day // 31 + 1:02d}-{day % 28 + 1:02d}',
+            'status': rng.choice(['pending', 'shipped', 'delivered']),
+            'total': sum(item['price'] * item['quantity'] for item in items),
+            'items': items,
+            'shippingAddress': '1 Bench St',
+            'trackingNumber': None,
+        })
+    return orders
+
+
+def install(app_module, products, users=(), orders=()):
+    """Replace the catalog, users and orders of an imported ``app`` module.
+
+    Views look these up as module globals on every call, so swapping the
+    globals is enough. The catalog goes in through ``install_catalog`` with
+    its indexes already built, as a reload would put it; stock counters
+    start afresh.
+    """
+    from accounts import UserStore
+    from inventory import Inventory
+    from order_store import OrderStore
+    from sales_stats import SalesAggregates
+
+    app_module.install_catalog(app_module.build_catalog(products, ready=True))
+    app_module.user_store = UserStore(users)
+    app_module.order_store = OrderStore(orders)
+    app_module.sales_stats = SalesAggregates(app_module.order_store, brand_of=app_module._product_brand)
+    app_module.inventory = Inventory(app_module._initial_stock)  # synthetic orders take no stock
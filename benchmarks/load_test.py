@@ -0,0 +1,127 @@
+"""HTTP load test reporting throughput and p50/p95/p99 latency per endpoint.
+
+Usage: python benchmarks/load_test.py [--url http://127.0.0.1:8000] [--products 100000]
+                                      [--workers 4] [--concurrency 32] [--processes 4]
+                                      [--seconds 10] [--output load.json]
+
+Without --url, starts benchmarks/serve.py with a synthetic dataset of
+``--products`` products and stops it afterwards. Each endpoint is loaded
+on its own for ``--seconds`` by ``--concurrency`` concurrent clients,
+spread over ``--processes`` client processes. Every request opens a new
+connection, so latencies include a local TCP connect.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from common import REQUEST_ERRORS, environment, percentiles, request, wait_until_ready, write_results
+
+ORDER = json.dumps({'items': [{'id': 1, 'quantity': 1}, {'id': 2, 'quantity': 2}]}).encode()
+LOGIN = json.dumps({'email': 'user1@example.com', 'password': 'password123'}).encode()
+CONTACT = json.dumps({'firstName': 'Ann', 'email': 'ann@example.com', 'message': 'Where is my order?'}).encode()
+
+# name -> (method, path, body); paths may use {i}, the request number
+ENDPOINTS = {
+    'products_page': ('GET', '/api/products?limit=50', None),
+    'product_detail': ('GET', '/api/products/{product}', None),
+    'search': ('GET', '/api/products/search?q=pro&limit=20', None),
+    'search_uncached': ('GET', '/api/products/search?q=samsung+ultra&limit=20&n={i}', None),
+    'filter': ('GET', '/api/products/filter?brand=Samsung&min_price=500&max_price=900&limit=50', None),
+    'facets': ('GET', '/api/products/facets?brand=Apple,Samsung&storage=256GB&limit=50', None),
+    'brands': ('GET', '/api/brands', None),
+    'stats': ('GET', '/api/stats', None),
+    'user_orders': ('GET', '/api/user/orders?limit=20', None),
+    'create_order': ('POST', '/api/orders', ORDER),
+    'login': ('POST', '/api/auth/login', LOGIN),
+    'contact': ('POST', '/api/contact', CONTACT),
+}
+
+
+async def _clients(host, port, endpoint, concurrency, seconds, products, offset):
+    method, path, body = ENDPOINTS[endpoint]
+    deadline = time.monotonic() + seconds
+    latencies, errors = [], 0
+
+    async def client(n):
+        nonlocal errors
+        i = offset + n
+        while time.monotonic() < deadline:
+            url = path.format(i=i, product=i % products + 1)
+            start = time.perf_counter()
+            try:
+                status = await request(host, port, method, url, body or b'', 'application/json')
+                if status < 400:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+            except REQUEST_ERRORS:
+                errors += 1
+            i += concurrency * 1000
+
+    await asyncio.gather(*(client(n) for n in range(concurrency)))
+    return latencies, errors
+
+
+def _client_process(host, port, endpoint, concurrency, seconds, products, offset):
+    return asyncio.run(_clients(host, port, endpoint, concurrency, seconds, products, offset))
+
+
+def load_endpoint(pool, host, port, endpoint, args):
+    per_process = max(1, args.concurrency // args.processes)
+    results = pool.starmap(_client_process, [
+        (host, port, endpoint, per_process, args.seconds, args.products, p * per_process)
+        for p in range(args.processes)])
+    latencies = [latency for samples, _ in results for latency in samples]
+    errors = sum(e for _, e in results)
+    return dict(requests=len(latencies), errors=errors,
+                requests_per_sec=round(len(latencies) / args.seconds, 1), latency_ms=percentiles(latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url')
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--processes', type=int, default=min(4, os.cpu_count()))
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS))
+    parser.add_argument('--port', type=int, default=8790)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    server = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+    else:
+        host, port = '127.0.0.1', args.port
+        server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(__file__), 'serve.py'),
+                                   '--products', str(args.products), '--workers', str(args.workers),
+                                   '--threads', str(args.threads), '--port', str(port)])
+    try:
+        wait_until_ready(host, port, timeout=600)
+        results = {}
+        with multiprocessing.Pool(args.processes) as pool:
+            for endpoint in args.endpoints.split(','):
+                results[endpoint] = load_endpoint(pool, host, port, endpoint, args)
+                print(f'{endpoint:<16} {results[endpoint]["requests_per_sec"]:>9} req/s '
+                      f'p99 {results[endpoint]["latency_ms"]["p99"]} ms', file=sys.stderr)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    write_results({'benchmark': 'load', 'environment': environment(), 'target': args.url or 'serve.py',
+                   'products': None if args.url else args.products, 'workers': None if args.url else args.workers,
+                   'concurrency': args.concurrency, 'seconds': args.seconds, 'endpoints': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
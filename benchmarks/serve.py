@@ -0,0 +1,64 @@
+"""Run the app under gunicorn with a synthetic dataset loaded.
+
+Usage: python benchmarks/serve.py [--products 100000] [--users 1000] [--orders 10000]
+                                  [--workers 4] [--threads 1] [--port 8000]
+
+The dataset is installed once in the gunicorn master before the workers
+fork, so every worker starts with the same copy. Writes made by one worker
+are not seen by the others; this is a load target, not a deployment.
+"""
+import argparse
+import os
+import sys
+
+os.environ.setdefault('NGM_DATA_DIR', '')
+os.environ.setdefault('NGM_SLOW_REQUEST_MS', '0')
+os.environ.setdefault('NGM_RATE_LIMITS', 'off')
+os.environ.setdefault('NGM_DEFAULT_STOCK', str(10 ** 9))  # checkouts never run out
+
+from gunicorn.app.base import BaseApplication  # noqa: E402
+
+from common import ROOT  # noqa: E402
+from datasets import install, make_orders, make_products, make_users  # noqa: E402
+
+
+class _Server(BaseApplication):
+    def __init__(self, application, options):
+        self.application = application
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.application
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import app as app_module
+
+    products = make_products(args.products)
+    install(app_module, products, make_users(args.users),
+            make_orders(args.orders, args.users, products[:1000]))
+    _Server(app_module.app, {
+        'bind': f'{args.host}:{args.port}', 'workers': args.workers, 'threads': args.threads,
+        'preload_app': True, 'loglevel': 'warning',
+    }).run()
+
+
+if __name__ == '__main__':
+    main()
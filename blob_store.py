@@ -0,0 +1,264 @@
+"""Content-addressed storage for uploaded files.
+
+Uploads are streamed to a temporary file in fixed-size chunks while their
+SHA-256 is computed, then renamed to ``blobs/<first two hex digits>/<digest>``.
+A second upload of the same bytes finds the blob already there and only
+discards its temporary copy. Partial uploads let a client send a file in
+several requests and resume after a dropped connection. Each open one holds
+a temporary file until it completes or expires, so their number is capped,
+in total and per client.
+"""
+import bisect
+import hashlib
+import os
+import threading
+import time
+import uuid
+
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Raised when a partial upload is unknown, out of order or too large."""
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class _PartialUpload:
+    def __init__(self, path, filename, max_size, client=None):
+        self.path = path
+        self.filename = filename
+        self.max_size = max_size
+        self.client = client
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.touched = time.monotonic()
+
+
+class BlobWriter:
+    """Hashes and writes one blob chunk by chunk.
+
+    Call finish() to move the content into the store, or abort() to drop it.
+    """
+
+    def __init__(self, store, max_size=None):
+        self._store = store
+        self.max_size = max_size
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._tmp = store._tmp_path()
+        self._file = open(self._tmp, 'wb')
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            self.abort()
+            raise UploadError('File too large', status=413)
+        self._hasher.update(chunk)
+        self._file.write(chunk)
+
+    def finish(self):
+        """Store the content; returns (digest, size, path)"""
+        self._file.close()
+        digest = self._hasher.hexdigest()
+        try:
+            return digest, self.size, self._store._commit(self._tmp, digest)
+        except BaseException:
+            _unlink(self._tmp)
+            raise
+
+    def abort(self):
+        self._file.close()
+        _unlink(self._tmp)
+
+
+class BlobStore:
+    """Stores each distinct file content once under its SHA-256."""
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE, partial_ttl=3600, max_partials=1000,
+                 max_partials_per_client=10):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.partial_ttl = partial_ttl
+        self.max_partials = max_partials
+        self.max_partials_per_client = max_partials_per_client
+        self._tmp_dir = os.path.join(root, '.tmp')
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        self._partials = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], digest)
+
+    def relative_name(self, digest):
+        return f'blobs/{digest[:2]}/{digest}'
+
+    def write(self, stream, max_size=None):
+        """Copy a readable stream into the store; returns (digest, size, path)"""
+        writer = self.writer(max_size)
+        try:
+            for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+                writer.write(chunk)
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.finish()
+
+    def writer(self, max_size=None):
+        """Return a BlobWriter for content that arrives piece by piece"""
+        return BlobWriter(self, max_size)
+
+    def begin(self, filename, max_size, client=None):
+        """Open a partial upload for ``client`` and return its id.
+
+        Raises UploadError with status 503 when ``max_partials`` uploads are
+        open, or 429 when the client already has ``max_partials_per_client``.
+        """
+        self._expire_partials()
+        upload_id = uuid.uuid4().hex
+        partial = _PartialUpload(os.path.join(self._tmp_dir, upload_id), filename, max_size, client)
+        with self._lock:
+            if len(self._partials) >= self.max_partials:
+                raise UploadError('Too many uploads in progress', status=503)
+            if sum(p.client == client for p in self._partials.values()) >= self.max_partials_per_client:
+                raise UploadError('Too many uploads in progress for this client', status=429)
+            self._partials[upload_id] = partial
+        try:
+            open(partial.path, 'wb').close()
+        except BaseException:
+            with self._lock:
+                self._partials.pop(upload_id, None)
+            raise
+        return upload_id
+
+    def status(self, upload_id):
+        """Return (filename, bytes received so far) for a partial upload"""
+        partial = self._partial(upload_id)
+        return partial.filename, partial.size
+
+    def append(self, upload_id, offset, stream):
+        """Append a chunk that starts at ``offset``; returns the new size"""
+        partial = self._partial(upload_id)
+        with partial.lock:
+            if offset != partial.size:
+                raise UploadError('Chunk does not start at the current offset', status=409, offset=partial.size)
+            with open(partial.path, 'ab') as out:
+                for chunk in iter(lambda: stream.read(self.chunk_size), b''):
+                    if partial.size + len(chunk) > partial.max_size:
+                        out.truncate(partial.size)
+                        raise UploadError('File too large', status=413, offset=partial.size)
+                    partial.hasher.update(chunk)
+                    out.write(chunk)
+                    partial.size += len(chunk)
+            partial.touched = time.monotonic()
+            return partial.size
+
+    def finish(self, upload_id):
+        """Move a completed partial upload into the store.
+
+        Returns (filename, digest, size, path).
+        """
+        with self._lock:
+            partial = self._partials.pop(upload_id, None)
+        if partial is None:
+            raise UploadError('Unknown upload', status=404)
+        with partial.lock:
+            digest = partial.hasher.hexdigest()
+            return partial.filename, digest, partial.size, self._commit(partial.path, digest)
+
+    def _partial(self, upload_id):
+        partial = self._partials.get(upload_id)
+        if partial is None:
+            raise UploadError('Unknown upload', status=404)
+        return partial
+
+    def _expire_partials(self):
+        cutoff = time.monotonic() - self.partial_ttl
+        with self._lock:
+            stale = [uid for uid, p in self._partials.items() if p.touched < cutoff]
+            for upload_id in stale:
+                _unlink(self._partials.pop(upload_id).path)
+
+    def _commit(self, tmp, digest):
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            _unlink(tmp)  # same bytes already stored
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+        return path
+
+    def _tmp_path(self):
+        return os.path.join(self._tmp_dir, uuid.uuid4().hex)
+
+
+class FileIndex:
+    """Metadata of each user's uploaded files, in upload order."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_user = {}
+        self._ids = set()
+        self._by_date = []  # sorted list of (upload_date, seq)
+        self._entries = {}  # seq -> (user id, file)
+        self._seq = 0
+
+    def for_user(self, user_id):
+        return list(self._by_user.get(user_id, ()))
+
+    def add(self, user_id, file_info):
+        """Record a file for a user; a file id already recorded is ignored"""
+        with self._lock:
+            if file_info['id'] not in self._ids:
+                self._ids.add(file_info['id'])
+                self._by_user.setdefault(user_id, []).append(file_info)
+                self._seq += 1
+                self._entries[self._seq] = (user_id, file_info)
+                bisect.insort(self._by_date, (file_info.get('upload_date') or '', self._seq))
+
+    def items(self):
+        """Return [user id, files] pairs"""
+        with self._lock:
+            return [[user_id, list(files)] for user_id, files in self._by_user.items()]
+
+    def scan(self, since=None, before=None, batch=500):
+        """Yield (user id, file) pairs by upload date, reading the index ``batch`` entries at a time.
+
+        ``since`` (inclusive) and ``before`` (exclusive) bound upload_date,
+        compared as ISO 8601 strings.
+        """
+        position = None if since is None else (since,)
+        while True:
+            with self._lock:
+                start = 0 if position is None else bisect.bisect_right(self._by_date, position)
+                keys = self._by_date[start:start + batch]
+                entries = [self._entries.get(seq) for _, seq in keys]
+            for key, entry in zip(keys, entries):
+                if before is not None and key[0] >= before:
+                    return
+                if entry is not None:
+                    yield entry
+            if len(keys) < batch:
+                return
+            position = keys[-1]
+
+    def replace_all(self, items):
+        with self._lock:
+            self._by_user.clear()
+            self._ids.clear()
+            self._by_date.clear()
+            self._entries.clear()
+        for user_id, files in items:
+            for file_info in files:
+                self.add(user_id, file_info)
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
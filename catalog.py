@@ -0,0 +1,181 @@
+"""In-memory product catalog with id, brand and price indexes."""
+import bisect
+import itertools
+import threading
+
+# Versions are unique across every Catalog in the process, so a version seen
+# on one catalog is never mistaken for the same state of a catalog replacing it
+_versions = itertools.count(1)
+
+
+class Catalog:
+    """Product catalog indexed by id, brand and price.
+
+    Products keep the order they were added in, and every listing or filter
+    result comes back in that order, so the output matches a linear scan over
+    the original product list.
+    """
+
+    def __init__(self, products=()):
+        self._lock = threading.Lock()
+        self._products = {}  # seq -> product, in catalog order
+        self._seqs = []  # sorted seqs of the products above
+        self._seq_by_id = {}  # product id -> seq
+        self._by_brand = {}  # lowercased brand -> sorted list of seq
+        self._brand_counts = {}  # brand as written -> number of products
+        self._prices = []  # sorted list of (price, seq)
+        self._next_seq = 0
+        self._listeners = []
+        self.version = next(_versions)
+        self._load(products)
+
+    def __len__(self):
+        return len(self._products)
+
+    def __iter__(self):
+        return iter(list(self._products.values()))
+
+    def all(self):
+        """Return every product in catalog order"""
+        return list(self._products.values())
+
+    def get(self, product_id):
+        """Return the product with the given id, or None"""
+        try:
+            seq = self._seq_by_id.get(product_id)
+        except TypeError:  # unhashable ids from JSON bodies never match
+            return None
+        if seq is None:
+            return None
+        return self._products.get(seq)
+
+    def brands(self):
+        """Return the distinct brand names, sorted"""
+        return sorted(self._brand_counts)
+
+    def filter(self, brand=None, min_price=None, max_price=None):
+        """Return products matching a brand and/or an inclusive price range"""
+        if not brand and min_price is None and max_price is None:
+            return self.all()
+        return [self._products[s] for s in self._filter_seqs(brand, min_price, max_price)]
+
+    def page(self, brand=None, min_price=None, max_price=None, after=None, limit=None):
+        """Return one page of filtered products as (products, cursor).
+
+        ``after`` is the cursor returned with the previous page; ``cursor`` is
+        None once the last matching product has been returned. Cursors are
+        positions in catalog order, so pages stay stable while products are
+        added or removed between requests.
+        """
+        seqs = self._filter_seqs(brand, min_price, max_price)
+        start = 0 if after is None else bisect.bisect_right(seqs, after)
+        end = len(seqs) if limit is None else min(start + limit, len(seqs))
+        products = [self._products[s] for s in seqs[start:end]]
+        cursor = seqs[end - 1] if end < len(seqs) and end > start else None
+        return products, cursor
+
+    def subscribe(self, listener):
+        """Call listener(event, product) after every change to the catalog.
+
+        ``event`` is ``'upsert'`` or ``'remove'``. Listeners run while the
+        catalog's write lock is held, so they see changes in commit order.
+        """
+        self._listeners.append(listener)
+
+    def upsert(self, product):
+        """Add a product, or replace the one with the same id in place"""
+        with self._lock:
+            existing = self._seq_by_id.get(product['id'])
+            if existing is not None:
+                self._unindex(existing)
+            self._insert(product, existing)
+            self.version = next(_versions)
+            self._notify('upsert', product)
+
+    def remove(self, product_id):
+        """Remove a product by id; returns the removed product or None"""
+        with self._lock:
+            seq = self._seq_by_id.pop(product_id, None)
+            if seq is None:
+                return None
+            product = self._unindex(seq)
+            del self._products[seq]
+            del self._seqs[bisect.bisect_left(self._seqs, seq)]
+            self.version = next(_versions)
+            self._notify('remove', product)
+            return product
+
+    def _notify(self, event, product):
+        for listener in self._listeners:
+            listener(event, product)
+
+    def _load(self, products):
+        """Index the initial products, sorting the price index once at the end"""
+        for product in products:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seqs.append(seq)
+            self._products[seq] = product
+            self._seq_by_id[product['id']] = seq
+            brand = product['brand']
+            self._by_brand.setdefault(brand.lower(), []).append(seq)  # seqs only grow
+            self._brand_counts[brand] = self._brand_counts.get(brand, 0) + 1
+            self._prices.append((product['price'], seq))
+        self._prices.sort()
+
+    def _insert(self, product, seq=None):
+        if seq is None:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._seqs.append(seq)
+        self._products[seq] = product
+        self._seq_by_id[product['id']] = seq
+        brand = product['brand']
+        bisect.insort(self._by_brand.setdefault(brand.lower(), []), seq)
+        self._brand_counts[brand] = self._brand_counts.get(brand, 0) + 1
+        bisect.insort(self._prices, (product['price'], seq))
+
+    def _unindex(self, seq):
+        product = self._products[seq]
+        brand = product['brand']
+        key = brand.lower()
+        seqs = self._by_brand[key]
+        del seqs[bisect.bisect_left(seqs, seq)]
+        if not seqs:
+            del self._by_brand[key]
+        self._brand_counts[brand] -= 1
+        if not self._brand_counts[brand]:
+            del self._brand_counts[brand]
+        del self._prices[bisect.bisect_left(self._prices, (product['price'], seq))]
+        return product
+
+    def _filter_seqs(self, brand, min_price, max_price):
+        if brand:
+            seqs = self._by_brand.get(brand.lower(), [])
+            if min_price is not None or max_price is not None:
+                seqs = [s for s in seqs
+                        if self._price_matches(self._products[s]['price'], min_price, max_price)]
+            return seqs
+        if min_price is not None or max_price is not None:
+            return sorted(seq for _, seq in self._price_range(min_price, max_price))
+        return self._seqs
+
+    def _price_range(self, min_price, max_price):
+        if _is_nan(min_price) or _is_nan(max_price):
+            return []
+        lo = 0 if min_price is None else bisect.bisect_left(self._prices, (min_price,))
+        hi = (len(self._prices) if max_price is None
+              else bisect.bisect_right(self._prices, (max_price, float('inf'))))
+        return self._prices[lo:hi]
+
+    @staticmethod
+    def _price_matches(price, min_price, max_price):
+        if min_price is not None and not price >= min_price:
+            return False
+        if max_price is not None and not price <= max_price:
+            return False
+        return True
+
+
+def _is_nan(value):
+    return value is not None and value != value
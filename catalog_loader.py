@@ -0,0 +1,193 @@
+"""Catalog file loading, deferred index builds and background catalog reloads.
+
+The catalog lives in a JSON Lines file, one product object per line.
+Loading is eager: every line is parsed (with orjson when that is
+installed) and validated before startup goes on, because the catalog
+indexes need every product. The file is read a line at a time, so it is
+never held in memory as a whole; a million products take a few seconds.
+
+Structures derived from a catalog that take long to build (the search and
+facet indexes) are wrapped in ``Deferred``: they are built in a background
+thread the first time they are needed, and anything that uses one before
+it is ready waits for it instead of seeing part of it.
+
+``CatalogReloader`` builds a new catalog and everything derived from it in
+a background thread and only then hands it over to be swapped in, so a
+request sees either the old catalog or the new one, never one in between.
+"""
+import json
+import os
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:  # the standard library parser is used without it
+    orjson = None
+
+_loads = orjson.loads if orjson is not None else json.loads
+_DECODE_ERRORS = (ValueError, orjson.JSONDecodeError) if orjson is not None else (ValueError,)
+
+REQUIRED_FIELDS = ('id', 'name', 'price', 'brand')
+
+
+class CatalogFileError(Exception):
+    """The catalog file is missing or holds something that is not a valid product."""
+
+
+def read_products(path):
+    """Products from a JSON Lines file, in file order; blank lines are skipped"""
+    try:
+        with open(path, 'rb') as f:
+            return _parse(f, path)
+    except OSError as e:
+        raise CatalogFileError(f'Cannot read catalog {path}: {e.strerror}') from e
+
+
+def write_products(path, products):
+    """Write products as JSON Lines, replacing the file in one rename"""
+    temp = f'{path}.{os.getpid()}.tmp'
+    with open(temp, 'w', encoding='utf-8') as f:
+        for product in products:
+            f.write(json.dumps(product, ensure_ascii=False))
+            f.write('\n')
+    os.replace(temp, path)
+
+
+def _parse(lines, path):
+    products = []
+    seen = set()
+    for number, line in enumerate(lines, 1):
+        if line.isspace():
+            continue
+        try:
+            product = _loads(line)
+        except _DECODE_ERRORS as e:
+            raise CatalogFileError(f'{path}:{number}: invalid JSON ({e})') from e
+        if not isinstance(product, dict) or any(field not in product for field in REQUIRED_FIELDS):
+            raise CatalogFileError(f'{path}:{number}: a product needs {", ".join(REQUIRED_FIELDS)}')
+        if not _valid_types(product):
+            raise CatalogFileError(f'{path}:{number}: id must be an integer or string, brand a string '
+                                   'and price a number')
+        if product['id'] in seen:
+            raise CatalogFileError(f'{path}:{number}: duplicate product id {product["id"]!r}')
+        seen.add(product['id'])
+        products.append(product)
+    return products
+
+
+def _valid_types(product):
+    id_, price = product['id'], product['price']
+    return (isinstance(id_, (int, str)) and not isinstance(id_, bool) and isinstance(product['brand'], str)
+            and isinstance(price, (int, float)) and not isinstance(price, bool))
+
+
+class Deferred:
+    """An object built in a background thread on first use.
+
+    Attribute access waits until the build has finished and then goes to
+    the built object. ``start`` begins the build early; nothing runs until
+    it or an attribute access is called, so an instance made before a fork
+    starts its thread in the process that uses it.
+    """
+
+    def __init__(self, build, name='deferred-build'):
+        self._build = build
+        self._name = name
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._thread = None
+        self._value = None
+        self._error = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+
+    def get(self):
+        """The built object, waiting for the build if it is still running"""
+        if not self._ready.is_set():
+            self.start()
+            self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __len__(self):
+        return len(self.get())
+
+    def _run(self):
+        try:
+            self._value = self._build()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._ready.set()
+
+
+class CatalogReloader:
+    """Builds replacement catalogs in a background thread, one at a time.
+
+    ``reload(load)`` calls ``load()`` for the products, ``build(products)``
+    for the catalog and its derived structures, fully built, and then
+    ``install(built)`` to swap them in. A load or build that fails leaves
+    the current catalog in place; ``status`` reports what happened.
+    """
+
+    def __init__(self, build, install):
+        self._build = build
+        self._install = install
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last = None
+
+    @property
+    def running(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def reload(self, load):
+        """Start a reload; returns False if one is already running"""
+        with self._lock:
+            if self.running:
+                return False
+            self._thread = threading.Thread(target=self._run, args=(load,), name='catalog-reload', daemon=True)
+            self._thread.start()
+            return True
+
+    def wait(self, timeout=None):
+        """Wait for a running reload to finish; returns False on timeout"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return not self.running
+
+    def status(self):
+        return {'running': self.running, 'last': self._last}
+
+    def _run(self, load):
+        started = time.time()
+        result = {'startedAt': _timestamp(started)}
+        try:
+            products = load()
+            self._install(self._build(products))
+            result.update(status='ok', products=len(products))
+        except Exception as e:
+            result.update(status='failed', error=str(e))
+        result['seconds'] = round(time.time() - started, 3)
+        self._last = result
+
+
+def _timestamp(seconds):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seconds))
@@ -220,6 +220,15 @@ function checkAuthStatus() {
 }
 
 function logout() {
+    const token = localStorage.getItem('token');
+    if (token) {
+        // End the server-side session; ignore failures since we log out locally anyway
+        fetch('/api/auth/logout', {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}` },
+            keepalive: true
+        }).catch(() => {});
+    }
     localStorage.removeItem('user');
     localStorage.removeItem('token');
     window.location.href = 'index.html';
@@ -315,6 +324,13 @@ function initializeCommon() {
     }
 }
 
+// srcset/sizes attributes for a product's resized image variants, if the API sent any
+function responsiveImageAttrs(product, sizes) {
+    if (!product || !product.images || !product.images.srcset) return '';
+    return `srcset="${product.images.srcset}" sizes="${sizes}"`;
+}
+window.responsiveImageAttrs = responsiveImageAttrs;
+
 // CSRF token helpers (front-end double-submit cookie pattern)
 function getCsrfToken() {
     try {
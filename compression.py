@@ -0,0 +1,119 @@
+"""gzip/brotli response compression negotiated from Accept-Encoding.
+
+``Compressor.install(app)`` adds an after-request hook that compresses
+text, JSON and JavaScript bodies of at least ``min_size`` bytes, using
+brotli when the client accepts it and the Brotli package is installed, and
+gzip otherwise. Streamed responses (the large paginated lists) are
+compressed chunk by chunk as they are sent. Files sent with send_file,
+range and conditional responses and bodies that already have a
+Content-Encoding are left alone.
+
+A compressed response gets its own ETag (``<etag>-br`` / ``<etag>-gzip``),
+and If-None-Match with that tag is answered with 304. Bodies with a strong
+ETag, such as cached catalog responses, are compressed once per encoding
+and kept in a small LRU, so repeated hits cost a lookup.
+"""
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # gzip only without the package
+    brotli = None
+
+COMPRESSIBLE = ('text/', 'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+                'image/svg+xml')
+
+
+class Compressor:
+    """Compresses responses in an after_request hook."""
+
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5, memo_entries=256, memo_bytes=32 * 1024 * 1024):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self._memo = OrderedDict()  # (etag, encoding) -> compressed body
+        self._memo_size = 0
+        self._memo_entries = memo_entries
+        self._memo_bytes = memo_bytes
+        self._lock = threading.Lock()
+
+    def install(self, app):
+        app.after_request(self.compress)
+
+    def compress(self, response):
+        if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or not response.mimetype.startswith(COMPRESSIBLE)):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None or request.method == 'HEAD':
+            return response
+
+        etag, weak = response.get_etag()
+        if response.is_streamed:
+            response.response = self._stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            compressed = self._memo_get(etag, encoding) if etag and not weak else None
+            if compressed is None:
+                compressed = self._compress(body, encoding)
+                if etag and not weak:
+                    self._memo_put(etag, encoding, compressed)
+            response.set_data(compressed)
+        response.content_encoding = encoding
+        if etag:
+            tagged = f'{etag}-{encoding}'
+            response.set_etag(tagged, weak=weak)
+            if request.if_none_match.contains_weak(tagged) if weak else request.if_none_match.contains(tagged):
+                response.status_code = 304
+                response.set_data(b'')
+                response.headers.pop('Content-Length', None)
+        return response
+
+    def _compress(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)  # 31: gzip container
+        return compressor.compress(body) + compressor.flush()
+
+    def _stream(self, chunks, encoding):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            compress, finish = compressor.process, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+            compress, finish = compressor.compress, compressor.flush
+        try:
+            for chunk in chunks:
+                out = compress(chunk.encode() if isinstance(chunk, str) else chunk)
+                if out:
+                    yield out
+            yield finish()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _memo_get(self, etag, encoding):
+        with self._lock:
+            body = self._memo.get((etag, encoding))
+            if body is not None:
+                self._memo.move_to_end((etag, encoding))
+            return body
+
+    def _memo_put(self, etag, encoding, body):
+        with self._lock:
+            if (etag, encoding) in self._memo or len(body) > self._memo_bytes:
+                return
+            self._memo[(etag, encoding)] = body
+            self._memo_size += len(body)
+            while len(self._memo) > self._memo_entries or self._memo_size > self._memo_bytes:
+                _, dropped = self._memo.popitem(last=False)
+                self._memo_size -= len(dropped)
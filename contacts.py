@@ -0,0 +1,109 @@
+"""Contact form messages with an atomic id counter and listing indexes."""
+import bisect
+import threading
+
+
+def _key(message):
+    """Listing order: submission time, ties by id"""
+    return (message.get('submittedAt') or '', message['id'])
+
+
+def _subject(message):
+    subject = message.get('subject')
+    return subject if isinstance(subject, str) else None
+
+
+class ContactStore:
+    """Contact messages with ids from an atomic counter.
+
+    Messages are indexed by submission time, by subject and by newsletter
+    opt-in. Each index is a sorted list of (submittedAt, id) keys, so
+    ``page`` finds a date range and a cursor position by bisection and only
+    reads the messages it returns.
+    """
+
+    def __init__(self, messages=()):
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._clear()
+        for message in messages:
+            self.put(message)
+
+    def _clear(self):
+        self._by_id = {}
+        self._all = []
+        self._by_subject = {}  # subject -> sorted keys
+        self._by_newsletter = {True: [], False: []}
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(sorted(self._by_id.values(), key=lambda m: m['id']))
+
+    def next_id(self):
+        """Allocate a new, unique message id"""
+        with self._lock:
+            self._last_id += 1
+            return self._last_id
+
+    def add(self, build):
+        """Store the message returned by build(new_id) and return it"""
+        message = build(self.next_id())
+        self.put(message)
+        return message
+
+    def put(self, message):
+        """Store a message with a known id; ids already stored are ignored"""
+        self.put_many([message])
+
+    def put_many(self, messages):
+        with self._lock:
+            for message in messages:
+                if message['id'] in self._by_id:
+                    continue
+                self._by_id[message['id']] = message
+                self._last_id = max(self._last_id, message['id'])
+                key = _key(message)
+                bisect.insort(self._all, key)
+                bisect.insort(self._by_subject.setdefault(_subject(message), []), key)
+                bisect.insort(self._by_newsletter[message.get('newsletter') is True], key)
+
+    def replace_all(self, messages):
+        with self._lock:
+            self._clear()
+            self._last_id = 0
+        self.put_many(messages)
+
+    def page(self, after=None, limit=None, since=None, before=None, subject=None, newsletter=None):
+        """Return messages in submission order, filtered and starting after message id ``after``.
+
+        ``since`` (inclusive) and ``before`` (exclusive) bound submittedAt,
+        compared as ISO 8601 strings. ``newsletter`` is True or False.
+        """
+        with self._lock:
+            if subject is not None:
+                keys = self._by_subject.get(subject, [])
+            elif newsletter is not None:
+                keys = self._by_newsletter[newsletter]
+            else:
+                keys = self._all
+            start = 0 if since is None else bisect.bisect_left(keys, (since,))
+            end = len(keys) if before is None else bisect.bisect_left(keys, (before,))
+            if after is not None:
+                seen = self._by_id.get(after)
+                if seen is not None:
+                    start = max(start, bisect.bisect_right(keys, _key(seen)))
+                else:
+                    start = next((i for i in range(start, end) if keys[i][1] > after), end)
+            page = []
+            for i in range(start, end):
+                message = self._by_id[keys[i][1]]
+                if newsletter is not None and (message.get('newsletter') is True) != newsletter:
+                    continue
+                page.append(message)
+                if limit is not None and len(page) == limit:
+                    break
+            return page
+
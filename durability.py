@@ -0,0 +1,291 @@
+"""Append-only write-ahead log and snapshots for the in-memory stores.
+
+Every state change is written as one JSON line to the current log segment.
+A background writer batches appends into one write per flush (group
+commit) and fsyncs according to the configured policy:
+
+``always``    callers wait until their record is fsynced
+``interval``  callers return at once; the writer fsyncs every flush interval
+``never``     records are handed to the OS and never explicitly fsynced
+
+Snapshots capture the full state and record the last log sequence number
+(LSN) they cover. Startup loads the snapshot and replays only the log tail,
+and older segments are deleted once a snapshot covers them. Replay may see
+a record whose effect is already in the snapshot, so records must be
+idempotent (put/delete by id).
+"""
+import json
+import os
+import threading
+import time
+
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+_SEGMENT_PREFIX = 'wal-'
+_SEGMENT_SUFFIX = '.log'
+_SNAPSHOT_FILE = 'snapshot.json'
+
+
+def _fsync_dir(directory):
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadLog:
+    """Segmented append-only log with a group-commit writer thread."""
+
+    def __init__(self, directory, fsync='interval', flush_interval=0.05, segment_bytes=64 * 1024 * 1024):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f'fsync must be one of {FSYNC_POLICIES}')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._wakeup = threading.Condition(self._lock)
+        self._pending = []
+        self._last_lsn = self._scan_last_lsn()
+        self._durable_lsn = self._last_lsn
+        self._sync_requested = False
+        self._rotate_requested = False
+        self._rotations = 0
+        self._closed = False
+        self._file = None
+        # Always continue in a new segment: the last one may end in a torn record
+        self._open_segment(self._last_lsn + 1)
+        self._writer = threading.Thread(target=self._run, name='wal-writer', daemon=True)
+        self._writer.start()
+
+    @property
+    def last_lsn(self):
+        return self._last_lsn
+
+    def append(self, kind, data):
+        """Append a record and return its LSN"""
+        line = json.dumps(data, separators=(',', ':'))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('write-ahead log is closed')
+            self._last_lsn += 1
+            lsn = self._last_lsn
+            self._pending.append(f'{{"lsn":{lsn},"k":{json.dumps(kind)},"d":{line}}}\n')
+            if self.fsync == 'always':
+                self._wakeup.notify()
+                while self._durable_lsn < lsn and not self._closed:
+                    self._flushed.wait()
+        return lsn
+
+    def sync(self):
+        """Block until everything appended so far is written and fsynced"""
+        with self._lock:
+            target = self._last_lsn
+            self._sync_requested = True
+            self._wakeup.notify()
+            while self._durable_lsn < target and not self._closed:
+                self._flushed.wait()
+
+    def rotate(self):
+        """Start a new segment; returns the last LSN stored before it"""
+        with self._lock:
+            boundary = self._last_lsn
+            target = self._rotations + 1
+            self._rotate_requested = True
+            self._wakeup.notify()
+            while self._rotations < target and not self._closed:
+                self._flushed.wait()
+        return boundary
+
+    def discard_through(self, lsn):
+        """Delete segments whose records all have LSN <= lsn"""
+        segments = self._segments()
+        for (_, path), (next_start, _) in zip(segments, segments[1:]):
+            if next_start - 1 <= lsn:
+                os.remove(path)
+
+    def replay(self, after_lsn=0):
+        """Yield (lsn, kind, data) for every record with LSN > after_lsn"""
+        for _, path in self._segments():
+            for lsn, kind, data in _read_segment(path):
+                if lsn > after_lsn:
+                    yield lsn, kind, data
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join()
+        self._file.close()
+
+    def _segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith(_SEGMENT_PREFIX) and name.endswith(_SEGMENT_SUFFIX):
+                start = int(name[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)])
+                segments.append((start, os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _scan_last_lsn(self):
+        segments = self._segments()
+        if not segments:
+            return 0
+        start, path = segments[-1]
+        last = start - 1
+        for lsn, _, _ in _read_segment(path):
+            last = lsn
+        return last
+
+    def _open_segment(self, first_lsn):
+        if self._file is not None:
+            self._file.close()
+        path = os.path.join(self.directory, f'{_SEGMENT_PREFIX}{first_lsn:020d}{_SEGMENT_SUFFIX}')
+        self._file = open(path, 'ab')
+        self._segment_size = self._file.tell()
+        _fsync_dir(self.directory)
+
+    def _run(self):
+        last_fsync = time.monotonic()
+        unsynced = False
+        while True:
+            with self._lock:
+                if not (self._pending or self._rotate_requested or self._sync_requested or self._closed):
+                    self._wakeup.wait(None if self.fsync == 'always' else self.flush_interval)
+                batch, self._pending = self._pending, []
+                batch_lsn = self._last_lsn
+                rotate, self._rotate_requested = self._rotate_requested, False
+                forced, self._sync_requested = self._sync_requested, False
+                closed = self._closed
+            if batch:
+                data = ''.join(batch).encode()
+                self._file.write(data)
+                self._file.flush()
+                self._segment_size += len(data)
+                unsynced = True
+            now = time.monotonic()
+            if unsynced and self.fsync != 'never' and (
+                    self.fsync == 'always' or forced or rotate or closed
+                    or now - last_fsync >= self.flush_interval):
+                os.fsync(self._file.fileno())
+                last_fsync = now
+                unsynced = False
+            with self._lock:
+                if rotate or self._segment_size >= self.segment_bytes:
+                    self._open_segment(batch_lsn + 1)
+                    self._rotations += 1
+                if not unsynced or self.fsync == 'never':
+                    self._durable_lsn = batch_lsn
+                self._flushed.notify_all()
+                if closed and not self._pending:
+                    return
+
+
+def _read_segment(path):
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # torn write at the end of a segment
+            yield record['lsn'], record['k'], record['d']
+
+
+class SnapshotStore:
+    """A single snapshot file replaced atomically on every write."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.path = os.path.join(directory, _SNAPSHOT_FILE)
+
+    def load(self):
+        """Return (lsn, state), or (0, None) when there is no snapshot yet"""
+        try:
+            with open(self.path, 'rb') as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return 0, None
+        return snapshot['lsn'], snapshot['state']
+
+    def write(self, lsn, state):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'lsn': lsn, 'state': state}, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        _fsync_dir(self.directory)
+
+
+class Durability:
+    """Ties a WriteAheadLog and a SnapshotStore to the application state.
+
+    ``capture()`` returns the full state as JSON-compatible data,
+    ``restore(state)`` loads a snapshot and ``apply(kind, data)`` replays one
+    log record. Mutations must be applied in memory *before* they are
+    logged; a snapshot taken after rotating at LSN n then reflects every
+    record up to n.
+    """
+
+    def __init__(self, directory, capture, restore, apply, fsync='interval',
+                 snapshot_interval=300, snapshot_min_records=10000, **log_options):
+        self.snapshots = SnapshotStore(directory)
+        self._capture = capture
+        self._restore = restore
+        self._apply = apply
+        self._snapshot_lock = threading.Lock()
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_min_records = snapshot_min_records
+        self.log = WriteAheadLog(directory, fsync=fsync, **log_options)
+        self._snapshot_lsn = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def recover(self):
+        """Load the latest snapshot and replay the log after it; returns replayed count"""
+        lsn, state = self.snapshots.load()
+        if state is not None:
+            self._restore(state)
+        self._snapshot_lsn = lsn
+        replayed = 0
+        for _, kind, data in self.log.replay(after_lsn=lsn):
+            self._apply(kind, data)
+            replayed += 1
+        return replayed
+
+    def record(self, kind, data):
+        """Log one state change that has already been applied in memory"""
+        return self.log.append(kind, data)
+
+    def snapshot(self):
+        """Write a snapshot now and drop the log segments it covers"""
+        with self._snapshot_lock:
+            boundary = self.log.rotate()
+            self.snapshots.write(boundary, self._capture())
+            self._snapshot_lsn = boundary
+            self.log.discard_through(boundary)
+            return boundary
+
+    def start(self):
+        """Take snapshots in the background every snapshot_interval seconds"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='snapshotter', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.log.close()
+
+    def _run(self):
+        while not self._stop.wait(self.snapshot_interval):
+            if self.log.last_lsn - self._snapshot_lsn >= self.snapshot_min_records:
+                self.snapshot()
@@ -0,0 +1,91 @@
+"""Streamed CSV and NDJSON exports of orders and uploads metadata.
+
+Rows come from store scans, which read their indexes one batch at a time,
+and are encoded into chunks of about ``CHUNK_SIZE`` bytes as the client
+reads them. An export holds one batch and one chunk in memory however many
+rows it sends.
+"""
+import csv
+import io
+
+from flask import Response, current_app
+
+CHUNK_SIZE = 64 * 1024
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+ORDER_COLUMNS = ('orderId', 'orderNumber', 'userId', 'date', 'createdAt', 'status', 'total', 'shippingAddress',
+                 'trackingNumber', 'itemId', 'itemName', 'itemPrice', 'quantity', 'lineTotal')
+FILE_COLUMNS = ('userId', 'id', 'filename', 'size', 'sha256', 'upload_date', 'saved_filename')
+
+# Spreadsheets run cells starting with these as formulas
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def order_rows(orders):
+    """One row per line item; an order without items gives one row with empty item columns"""
+    for order in orders:
+        for item in order.get('items') or [{}]:
+            price, quantity = item.get('price'), item.get('quantity')
+            numeric = all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (price, quantity))
+            yield {
+                'orderId': order['id'],
+                'orderNumber': order.get('orderNumber'),
+                'userId': order.get('userId'),
+                'date': order.get('date'),
+                'createdAt': order.get('createdAt'),
+                'status': order.get('status'),
+                'total': order.get('total'),
+                'shippingAddress': order.get('shippingAddress'),
+                'trackingNumber': order.get('trackingNumber'),
+                'itemId': item.get('id'),
+                'itemName': item.get('name'),
+                'itemPrice': price,
+                'quantity': quantity,
+                'lineTotal': price * quantity if numeric else None,
+            }
+
+
+def file_rows(entries):
+    """One row per uploaded file from (user id, file) pairs"""
+    for user_id, file_info in entries:
+        row = {column: file_info.get(column) for column in FILE_COLUMNS}
+        row['userId'] = user_id
+        yield row
+
+
+def export_response(rows, columns, fmt, filename):
+    """Stream rows as a CSV (with a header line) or NDJSON download"""
+    response = Response(_encode(rows, columns, fmt, current_app.json.dumps), mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+def _encode(rows, columns, fmt, dumps):
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(columns)
+
+        def write(row):
+            writer.writerow([_cell(row.get(column)) for column in columns])
+    else:
+        def write(row):
+            buffer.write(dumps(row))
+            buffer.write('\n')
+
+    for row in rows:
+        write(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
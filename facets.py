@@ -0,0 +1,195 @@
+"""Bitmap indexes over product facets, with facet counts.
+
+Every product gets a bit position (in catalog order) and every facet value
+(a brand, storage size, color or price bucket) a bitmap: a Python int with
+the bits of the products that have it. A query ORs the bitmaps of the
+values selected within a facet and ANDs the facets together, so any
+combination costs a handful of big-integer operations, done in C.
+
+Counts are computed the usual way for faceted navigation: each facet is
+counted against the filters on the *other* facets, so a shopper who picked
+one brand still sees how many products the other brands would add.
+"""
+import re
+import threading
+
+FACETS = ('brand', 'storage', 'color', 'price')
+# Upper bounds of the price buckets; the last bucket has no upper bound
+PRICE_EDGES = (500, 800, 1000)
+
+_NONZERO_BYTE = re.compile(rb'[^\x00]')
+_BYTE_BITS = [tuple(i for i in range(8) if b >> i & 1) for b in range(256)]
+
+
+def price_bucket(price, edges=PRICE_EDGES):
+    """Label of the bucket a price falls in, e.g. '500-800' or '1000+'"""
+    low = 0
+    for edge in edges:
+        if price < edge:
+            return f'{low}-{edge}'
+        low = edge
+    return f'{low}+'
+
+
+def _facet_values(product):
+    values = {
+        'brand': product.get('brand'),
+        'storage': product.get('storage'),
+        'color': product.get('color'),
+        'price': price_bucket(product['price']) if isinstance(product.get('price'), (int, float)) else None,
+    }
+    return {facet: value for facet, value in values.items() if isinstance(value, str)}
+
+
+def _bitmap(positions, size):
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class FacetIndex:
+    """Facet bitmaps over a Catalog, kept in sync with it."""
+
+    def __init__(self, catalog=None):
+        self._lock = threading.Lock()
+        self._products = []  # bit position -> product, None once removed
+        self._position = {}  # product id -> bit position
+        self._live = 0  # bitmap of positions holding a product
+        self._bitmaps = {facet: {} for facet in FACETS}  # facet -> lowercased value -> bitmap
+        self._sizes = {facet: {} for facet in FACETS}  # facet -> lowercased value -> bits set in its bitmap
+        self._labels = {facet: {} for facet in FACETS}  # facet -> lowercased value -> value as written
+        if catalog is not None:
+            with self._lock:
+                # Listening before the load means no change can slip between the
+                # two; one that arrives mid-load waits on the lock
+                catalog.subscribe(self._on_catalog_change)
+                self._load(catalog.all())
+
+    def __len__(self):
+        return len(self._position)
+
+    def add(self, product):
+        """Index a product, keeping its position if it is already indexed"""
+        with self._lock:
+            position = self._position.get(product['id'])
+            if position is None:
+                position = len(self._products)
+                self._products.append(product)
+                self._position[product['id']] = position
+            else:
+                self._clear(position)
+                self._products[position] = product
+            bit = 1 << position
+            self._live |= bit
+            for facet, value in _facet_values(product).items():
+                key = value.lower()
+                self._bitmaps[facet][key] = self._bitmaps[facet].get(key, 0) | bit
+                self._sizes[facet][key] = self._sizes[facet].get(key, 0) + 1
+                self._labels[facet][key] = value
+
+    def remove(self, product_id):
+        with self._lock:
+            position = self._position.pop(product_id, None)
+            if position is not None:
+                self._clear(position)
+                self._products[position] = None
+                self._live &= ~(1 << position)
+
+    def search(self, filters, after=None, limit=None):
+        """Return (products, total, counts, cursor) for {facet: [values]} filters.
+
+        Values within a facet are alternatives (OR); facets combine with AND.
+        Unknown values match nothing. ``counts`` maps each facet to
+        {value: number of matching products}. ``after`` and the returned
+        ``cursor`` are bit positions, so pages stay stable as products
+        change.
+        """
+        with self._lock:
+            selected = {}
+            for facet, values in filters.items():
+                if values:
+                    bitmaps = self._bitmaps[facet]
+                    union = 0
+                    for value in values:
+                        union |= bitmaps.get(value.lower(), 0)
+                    selected[facet] = union
+
+            result = self._live
+            for bitmap in selected.values():
+                result &= bitmap
+            counts = {}
+            for facet in FACETS:
+                labels = self._labels[facet]
+                others = [bitmap for other, bitmap in selected.items() if other != facet]
+                if not others:
+                    # Nothing narrows this facet: its counts are the bitmap sizes
+                    counts[facet] = {labels[key]: size for key, size in self._sizes[facet].items()}
+                    continue
+                base = result if facet not in selected else self._live
+                if facet in selected:
+                    for bitmap in others:
+                        base &= bitmap
+                counts[facet] = {labels[key]: (bitmap & base).bit_count() if base else 0
+                                 for key, bitmap in self._bitmaps[facet].items()}
+            total = len(self._position) if not selected else result.bit_count()
+            positions, cursor = _positions(result, 0 if after is None else after + 1, limit)
+            products = [self._products[p] for p in positions]
+        return products, total, counts, cursor
+
+    def _load(self, products):
+        positions = {facet: {} for facet in FACETS}
+        for product in products:
+            position = len(self._products)
+            self._products.append(product)
+            self._position[product['id']] = position
+            for facet, value in _facet_values(product).items():
+                key = value.lower()
+                positions[facet].setdefault(key, []).append(position)
+                self._labels[facet][key] = value
+        size = len(self._products)
+        self._live = (1 << size) - 1
+        for facet, by_value in positions.items():
+            self._bitmaps[facet] = {key: _bitmap(found, size) for key, found in by_value.items()}
+            self._sizes[facet] = {key: len(found) for key, found in by_value.items()}
+
+    def _clear(self, position):
+        mask = ~(1 << position)
+        for facet, value in _facet_values(self._products[position]).items():
+            key = value.lower()
+            bitmaps = self._bitmaps[facet]
+            bitmaps[key] &= mask
+            self._sizes[facet][key] -= 1
+            if not self._sizes[facet][key]:
+                del bitmaps[key]
+                del self._sizes[facet][key]
+                del self._labels[facet][key]
+
+    def _on_catalog_change(self, event, product):
+        if event == 'remove':
+            self.remove(product['id'])
+        else:
+            self.add(product)
+
+
+def _positions(bitmap, start, limit, span=4096):
+    """Set bit positions of bitmap from ``start`` on, at most ``limit`` of them, and the next cursor.
+
+    Bits are read through a window that doubles in size while it comes up
+    short, so a page costs a few shifts of the bitmap rather than a
+    conversion of all of it.
+    """
+    found = []
+    end = bitmap.bit_length()
+    while start < end:
+        window = (bitmap >> start) & ((1 << span) - 1)
+        data = window.to_bytes(span // 8, 'little')
+        for match in _NONZERO_BYTE.finditer(data):
+            index = match.start()
+            for bit in _BYTE_BITS[data[index]]:
+                if limit is not None and len(found) == limit:
+                    return found, found[-1]
+                found.append(start + index * 8 + bit)
+        start += span
+        span *= 2
+    return found, None
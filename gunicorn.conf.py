@@ -0,0 +1,29 @@
+"""Gunicorn settings for serving the app with several worker processes.
+
+    gunicorn app:app
+
+NGM_WORKERS sets the number of worker processes (one per CPU core by
+default) and NGM_THREADS the threads per worker. With more than one worker,
+state lives in the SQLite database at NGM_SHARED_DB (data/shared.db unless
+set) so every worker sees the same catalog, orders, users and sessions,
+and /metrics adds up the totals each worker leaves in NGM_METRICS_DIR.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('NGM_WORKERS', multiprocessing.cpu_count()))
+threads = int(os.environ.get('NGM_THREADS', 1))
+
+if workers > 1:
+    # Set before the workers start, so each one imports app.py in shared mode
+    data_dir = os.environ.get('NGM_DATA_DIR') or 'data'
+    os.environ.setdefault('NGM_SHARED_DB', os.path.join(data_dir, 'shared.db'))
+    os.environ.setdefault('NGM_METRICS_DIR', os.path.join(data_dir, 'metrics'))
+
+
+def on_starting(server):
+    # Per-process metrics left by a previous run would be counted again
+    if os.environ.get('NGM_METRICS_DIR'):
+        from metrics import clear_directory
+        clear_directory(os.environ['NGM_METRICS_DIR'])
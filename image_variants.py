@@ -0,0 +1,142 @@
+"""Resized, re-encoded variants of product photos with an on-disk cache.
+
+Each source image under ``images/`` can be served at a few fixed widths
+(``VARIANTS``) as AVIF, WebP or JPEG. Rendered files are cached under
+``<cache dir>/<source sha256>-<variant>.<format>``, so a replaced photo gets
+new cache entries and new URLs automatically. Without Pillow installed the
+originals are served unchanged.
+
+Run ``python image_variants.py`` to render every variant ahead of time.
+"""
+import hashlib
+import os
+import threading
+from urllib.parse import quote
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is optional; fall back to the original files
+    Image = None
+
+# Variant name -> maximum width in pixels
+VARIANTS = {'thumb': 160, 'card': 400, 'detail': 800}
+DEFAULT_VARIANT = 'card'
+
+# Preferred first; only formats this Pillow build can encode are offered
+_FORMATS = (
+    ('avif', 'image/avif', {'quality': 50}),
+    ('webp', 'image/webp', {'quality': 80, 'method': 4}),
+    ('jpeg', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+
+def _supported_formats():
+    if Image is None:
+        return ()
+    return tuple((name, mimetype, options) for name, mimetype, options in _FORMATS
+                 if name == 'jpeg' or features.check(name))
+
+
+class ImageVariants:
+    """Renders and caches size/format variants of images in ``source_dir``."""
+
+    def __init__(self, source_dir, cache_dir, url_prefix='/api/images'):
+        self.source_dir = os.path.abspath(source_dir)
+        self.cache_dir = cache_dir
+        self.url_prefix = url_prefix
+        self.formats = _supported_formats()
+        self._digests = {}  # source path -> (mtime_ns, size, sha256)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return bool(self.formats)
+
+    def source_path(self, name):
+        """Resolve an image name inside source_dir; None if missing or outside it"""
+        path = os.path.abspath(os.path.join(self.source_dir, name))
+        if os.path.commonpath([path, self.source_dir]) != self.source_dir or not os.path.isfile(path):
+            return None
+        return path
+
+    def negotiate(self, accept_mimetypes, requested=None):
+        """Pick (format, mimetype) from ?format= or the Accept header"""
+        for name, mimetype, _ in self.formats:
+            if requested == name:
+                return name, mimetype
+        # Only explicit entries count; */* and image/* do not promise AVIF support
+        accepted = {value for value, quality in accept_mimetypes if quality > 0}
+        for name, mimetype, _ in self.formats:
+            if mimetype in accepted:
+                return name, mimetype
+        return 'jpeg', 'image/jpeg'
+
+    def render(self, source, variant, fmt):
+        """Return the cached file for a variant, rendering it on first use"""
+        digest = self.source_digest(source)
+        path = os.path.join(self.cache_dir, f'{digest}-{variant}.{fmt}')
+        if os.path.exists(path):
+            return path
+        options = next(o for name, _, o in self.formats if name == fmt)
+        width = VARIANTS[variant]
+        with Image.open(source) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.width > width:
+                img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+            if fmt == 'jpeg' and img.mode not in ('RGB', 'L'):
+                img = img.convert('RGB')
+            tmp = f'{path}.{threading.get_ident()}.tmp'
+            img.save(tmp, format=fmt.upper(), **options)
+        os.replace(tmp, path)
+        return path
+
+    def source_digest(self, source):
+        """SHA-256 of a source file, recomputed only when it changes on disk"""
+        stat = os.stat(source)
+        cached = self._digests.get(source)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        h = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self._lock:
+            self._digests[source] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def describe(self, name):
+        """URLs for an image's variants plus a ready-made srcset, or None"""
+        source = self.source_path(name) if self.enabled else None
+        if source is None:
+            return None
+        version = self.source_digest(source)[:12]
+        quoted = quote(os.path.relpath(source, self.source_dir).replace(os.sep, '/'))
+        urls = {v: f'{self.url_prefix}/{v}/{quoted}?v={version}' for v in VARIANTS}
+        return {
+            'src': urls[DEFAULT_VARIANT],
+            'srcset': ', '.join(f'{urls[v]} {w}w' for v, w in VARIANTS.items()),
+            'variants': urls,
+        }
+
+    def warm(self):
+        """Render every variant of every source image; returns the count"""
+        count = 0
+        for root, dirs, files in os.walk(self.source_dir):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for filename in files:
+                source = os.path.join(root, filename)
+                if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+                    for variant in VARIANTS:
+                        for fmt, _, _ in self.formats:
+                            self.render(source, variant, fmt)
+                            count += 1
+        return count
+
+
+if __name__ == '__main__':
+    variants = ImageVariants('images', os.path.join('images', '.cache'))
+    if not variants.enabled:
+        raise SystemExit('Pillow is not installed; nothing to render')
+    print(f'Rendered {variants.warm()} image variants')
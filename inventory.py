@@ -0,0 +1,96 @@
+"""Per-product stock counters with all-or-nothing reservations.
+
+Counters are spread over a fixed set of striped locks. A reservation locks
+only the stripes of the products it touches, always in stripe order so two
+orders can never wait on each other, checks every line and then takes
+them all. Checkouts for different products rarely share a stripe and so
+rarely wait.
+
+A product's counter is created the first time it is touched, from
+``initial_stock(product_id)``.
+"""
+import threading
+
+# Number of lock stripes guarding the counters
+STRIPES = 64
+
+
+class OutOfStock(Exception):
+    """Raised when a reservation asks for more than is available."""
+
+    def __init__(self, shortages):
+        super().__init__('Insufficient stock')
+        self.shortages = shortages  # [{'id', 'requested', 'available'}]
+
+
+def valid_quantity(quantity):
+    return isinstance(quantity, int) and not isinstance(quantity, bool) and quantity > 0
+
+
+def order_quantities(items):
+    """Add up quantities per product id for a list of order items.
+
+    Items without a positive integer quantity, which older orders may
+    have, take no stock.
+    """
+    quantities = {}
+    for item in items:
+        if valid_quantity(item.get('quantity')):
+            quantities[item['id']] = quantities.get(item['id'], 0) + item['quantity']
+    return quantities
+
+
+class Inventory:
+    """Stock counters keyed by product id."""
+
+    def __init__(self, initial_stock, stripes=STRIPES):
+        self._initial_stock = initial_stock
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._counts = [{} for _ in range(stripes)]
+
+    def available(self, product_id):
+        stripe = self._stripe(product_id)
+        with self._locks[stripe]:
+            return self._count(stripe, product_id)
+
+    def reserve(self, quantities):
+        """Take {product id: quantity} from stock, all of it or none; raises OutOfStock"""
+        stripes = sorted({self._stripe(pid) for pid in quantities})
+        for stripe in stripes:
+            self._locks[stripe].acquire()
+        try:
+            shortages = []
+            for pid, quantity in quantities.items():
+                available = self._count(self._stripe(pid), pid)
+                if available < quantity:
+                    shortages.append({'id': pid, 'requested': quantity, 'available': max(available, 0)})
+            if shortages:
+                raise OutOfStock(shortages)
+            for pid, quantity in quantities.items():
+                self._counts[self._stripe(pid)][pid] -= quantity
+        finally:
+            for stripe in reversed(stripes):
+                self._locks[stripe].release()
+
+    def release(self, quantities):
+        """Return reserved stock, e.g. when an order is cancelled"""
+        self._adjust(quantities, 1)
+
+    def consume(self, quantities):
+        """Take stock without checking, for orders placed before this process started"""
+        self._adjust(quantities, -1)
+
+    def _adjust(self, quantities, sign):
+        for pid, quantity in quantities.items():
+            stripe = self._stripe(pid)
+            with self._locks[stripe]:
+                self._counts[stripe][pid] = self._count(stripe, pid) + sign * quantity
+
+    def _count(self, stripe, product_id):
+        counts = self._counts[stripe]
+        if product_id not in counts:
+            counts[product_id] = self._initial_stock(product_id)
+        return counts[product_id]
+
+    def _stripe(self, product_id):
+        return hash(product_id) % len(self._locks)
@@ -0,0 +1,51 @@
+"""Flask JSON provider that encodes with orjson when it is installed.
+
+orjson is several times faster than the standard library encoder on the
+large product and order lists. Output stays equivalent: keys are sorted,
+non-string keys become strings, and dates, decimals and anything else
+orjson cannot encode natively go through Flask's usual ``default``. Values
+orjson rejects (integers wider than 64 bits, for instance) fall back to
+the standard encoder, as does everything when orjson is missing.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # the standard library encoder is used without it
+    orjson = None
+
+if orjson is not None:
+    _OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with an orjson fast path for compact output."""
+
+    def __init__(self, app, use_orjson=True):
+        super().__init__(app)
+        self.use_orjson = use_orjson and orjson is not None
+
+    @property
+    def encoder(self):
+        return 'orjson' if self.use_orjson else 'json'
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson and set(kwargs) <= {'separators'}:
+            encoded = self._orjson(obj)
+            if encoded is not None:
+                return encoded.decode()
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if self.use_orjson and not ((self.compact is None and self._app.debug) or self.compact is False):
+            encoded = self._orjson(self._prepare_response_obj(args, kwargs))
+            if encoded is not None:
+                return self._app.response_class(encoded + b'\n', mimetype=self.mimetype)
+        return super().response(*args, **kwargs)
+
+    def _orjson(self, obj):
+        try:
+            return orjson.dumps(obj, default=self.default, option=_OPTIONS)
+        except TypeError:
+            return None
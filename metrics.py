@@ -0,0 +1,304 @@
+"""Per-route request metrics in Prometheus text format, and a slow-request log.
+
+``Metrics.instrument(app)`` hooks into a Flask app and records, for each
+route and method: a latency histogram, request and response byte counts,
+the number of requests in flight, status codes and exceptions that views
+turned into 500 responses. Each request costs a few clock reads and one
+short lock per route.
+
+Latency is split into ``before`` (request hooks), ``view``, ``after``
+(response hooks) and ``stream`` (sending the body). Requests slower than
+``slow_ms`` are logged with that breakdown, the route and the query
+parameters.
+
+With several worker processes, pass ``directory``: every process then
+writes its totals there once a second, and ``render`` adds up the files of
+all processes. In-flight gauges of processes that have exited are dropped.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import g, request
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNMATCHED = '<unmatched>'
+# Methods that get a series of their own; any other is counted as OTHER_METHOD
+METHODS = frozenset(('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'))
+OTHER_METHOD = 'other'
+
+slow_log = logging.getLogger('ngm.slow_requests')
+
+
+class _Series:
+    """Totals for one (route, method) pair."""
+
+    __slots__ = ('key', 'lock', 'buckets', 'count', 'sum', 'request_bytes', 'response_bytes', 'in_flight', 'statuses')
+
+    def __init__(self, key):
+        self.key = key
+        self.lock = threading.Lock()
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.in_flight = 0
+        self.statuses = {}
+
+    def dump(self):
+        with self.lock:
+            return [list(self.buckets), self.count, self.sum, self.request_bytes,
+                    self.response_bytes, self.in_flight, dict(self.statuses)]
+
+
+class Metrics:
+    """Collects request metrics for one process."""
+
+    def __init__(self, slow_ms=None, directory=None, flush_interval=1.0, clock=time.perf_counter):
+        self.slow_ms = slow_ms
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._series = {}  # (route, method) -> _Series
+        self._exceptions = {}  # (route, exception class name) -> count
+        self._flusher = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def instrument(self, app):
+        """Record every request to ``app``; call after all routes are added"""
+        # First before_request hook and last after_request hook to run
+        app.before_request_funcs.setdefault(None, []).insert(0, self._before)
+        app.after_request_funcs.setdefault(None, []).insert(0, self._after)
+        app.teardown_request(self._teardown)
+        for endpoint, view in list(app.view_functions.items()):
+            app.view_functions[endpoint] = self._timed(view)
+
+    def record_exception(self, error):
+        """Count an exception a view caught and answered with an error response"""
+        key = (_route(), type(error).__name__)
+        with self._lock:
+            self._exceptions[key] = self._exceptions.get(key, 0) + 1
+
+    def render(self):
+        """Return all metrics in Prometheus text exposition format"""
+        series = {key: s.dump() for key, s in list(self._series.items())}
+        with self._lock:
+            exceptions = dict(self._exceptions)
+        if self.directory:
+            self._merge_other_processes(series, exceptions)
+
+        lines = [
+            '# HELP ngm_http_request_duration_seconds Request latency by route.',
+            '# TYPE ngm_http_request_duration_seconds histogram',
+        ]
+        for (route, method), (buckets, count, total, *_rest) in sorted(series.items()):
+            labels = f'route="{_escape(route)}",method="{_escape(method)}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ('+Inf',), buckets):
+                cumulative += n
+                lines.append(f'ngm_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'ngm_http_request_duration_seconds_sum{{{labels}}} {total}')
+            lines.append(f'ngm_http_request_duration_seconds_count{{{labels}}} {count}')
+
+        for name, kind, index, help_text in (
+                ('ngm_http_request_bytes_total', 'counter', 3, 'Request body bytes received.'),
+                ('ngm_http_response_bytes_total', 'counter', 4, 'Response body bytes sent.'),
+                ('ngm_http_requests_in_flight', 'gauge', 5, 'Requests being handled.')):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (route, method), values in sorted(series.items()):
+                lines.append(f'{name}{{route="{_escape(route)}",method="{_escape(method)}"}} {values[index]}')
+
+        lines.append('# HELP ngm_http_requests_total Requests completed, by status code.')
+        lines.append('# TYPE ngm_http_requests_total counter')
+        for (route, method), values in sorted(series.items()):
+            for status, n in sorted(values[6].items()):
+                lines.append(f'ngm_http_requests_total{{route="{_escape(route)}",method="{_escape(method)}",status="{status}"}} {n}')
+
+        lines.append('# HELP ngm_handler_exceptions_total Exceptions caught by views and returned as errors.')
+        lines.append('# TYPE ngm_handler_exceptions_total counter')
+        for (route, exception), n in sorted(exceptions.items()):
+            lines.append(f'ngm_handler_exceptions_total{{route="{_escape(route)}",exception="{exception}"}} {n}')
+        return '\n'.join(lines) + '\n'
+
+    # Request hooks
+
+    def _before(self):
+        if self.directory and self._flusher is None:
+            self._start_flusher()
+        series = self._series_for(_route(), _method())
+        with series.lock:
+            series.in_flight += 1
+        g.metrics = [series, self._clock()]
+
+    def _timed(self, view):
+        @wraps(view)
+        def timed_view(*args, **kwargs):
+            marks = g.get('metrics')
+            if marks is not None:
+                marks.append(self._clock())
+            try:
+                return view(*args, **kwargs)
+            finally:
+                if marks is not None:
+                    marks.append(self._clock())
+        return timed_view
+
+    def _after(self, response):
+        marks = g.pop('metrics', None)
+        if marks is None:
+            return response
+        marks.append(self._clock())
+        sent = [response.content_length]
+        if sent[0] is None and response.is_streamed and not response.direct_passthrough:
+            sent[0] = 0
+            response.response = _counting(response.response, sent)
+        details = (request.path, request.query_string, request.view_args, request.content_length or 0)
+        response.call_on_close(lambda: self._finish(marks, response.status_code, sent, details))
+        return response
+
+    def _teardown(self, error):
+        marks = g.pop('metrics', None)
+        if marks is not None:  # no response was produced
+            with marks[0].lock:
+                marks[0].in_flight -= 1
+
+    def _finish(self, marks, status, sent, details):
+        end = self._clock()
+        series, start = marks[0], marks[1]
+        elapsed = end - start
+        with series.lock:
+            series.in_flight -= 1
+            series.count += 1
+            series.sum += elapsed
+            series.buckets[bisect.bisect_left(BUCKETS, elapsed)] += 1
+            series.statuses[status] = series.statuses.get(status, 0) + 1
+            series.request_bytes += details[3]
+            series.response_bytes += sent[0] or 0
+        if self.slow_ms and elapsed * 1000 >= self.slow_ms:
+            self._log_slow(marks, end, status, details)
+
+    def _log_slow(self, marks, end, status, details):
+        path, query, view_args, request_bytes = details
+        points = marks[1:]
+        if len(points) == 4:  # start, view start, view end, response hooks done
+            names = ('before', 'view', 'after')
+        else:
+            names = ('handler',)
+        breakdown = {name: round((b - a) * 1000, 2) for name, a, b in zip(names, points, points[1:])}
+        breakdown['stream'] = round((end - points[-1]) * 1000, 2)
+        route, method = marks[0].key
+        slow_log.warning('slow request %s', json.dumps({
+            'route': route, 'method': method, 'path': path, 'query': query.decode('latin-1'),
+            'view_args': view_args, 'status': status, 'request_bytes': request_bytes,
+            'total_ms': round((end - points[0]) * 1000, 2), 'breakdown_ms': breakdown,
+        }, default=str))
+
+    def _series_for(self, route, method):
+        key = (route, method)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, _Series(key))
+        return series
+
+    # Sharing totals between worker processes
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Write this process's totals for the other processes to read"""
+        with self._lock:
+            exceptions = [[route, name, n] for (route, name), n in self._exceptions.items()]
+        state = {
+            'pid': os.getpid(),
+            'series': [[route, method, *s.dump()] for (route, method), s in list(self._series.items())],
+            'exceptions': exceptions,
+        }
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(path + '.tmp', path)
+
+    def _merge_other_processes(self, series, exceptions):
+        own = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _pid_alive(state['pid'])
+            for route, method, buckets, count, total, request_bytes, response_bytes, in_flight, statuses in state['series']:
+                merged = series.setdefault((route, method), [[0] * len(buckets), 0, 0.0, 0, 0, 0, {}])
+                merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+                merged[1] += count
+                merged[2] += total
+                merged[3] += request_bytes
+                merged[4] += response_bytes
+                merged[5] += in_flight if alive else 0
+                for status, n in statuses.items():
+                    merged[6][int(status)] = merged[6].get(int(status), 0) + n
+            for route, name, n in state['exceptions']:
+                exceptions[(route, name)] = exceptions.get((route, name), 0) + n
+
+
+def clear_directory(directory):
+    """Remove totals left by earlier server runs"""
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        os.remove(path)
+
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else UNMATCHED
+
+
+def _method():
+    # The method comes from the client: clamp it so it cannot create new series
+    return request.method if request.method in METHODS else OTHER_METHOD
+
+
+def _counting(iterable, sent):
+    try:
+        for chunk in iterable:
+            sent[0] += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
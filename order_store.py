@@ -0,0 +1,152 @@
+"""Thread-safe in-memory order store with id and per-user indexes."""
+import bisect
+import threading
+
+# Number of lock stripes guarding the per-user indexes
+_USER_STRIPES = 16
+
+
+def _order_key(order):
+    """Sort key that keeps a user's history in date order, ties by id"""
+    return (order.get('createdAt') or order.get('date') or '', order['id'])
+
+
+class OrderStore:
+    """Orders indexed by id, by userId and by date.
+
+    Ids come from an atomic counter. The id index has its own lock and each
+    user's history is guarded by one of a fixed set of striped locks, so
+    checkouts by different users rarely wait on each other.
+    """
+
+    def __init__(self, orders=()):
+        self._by_id = {}
+        self._id_lock = threading.Lock()
+        self._by_user = {}  # userId -> sorted list of (key, order id)
+        self._user_locks = [threading.Lock() for _ in range(_USER_STRIPES)]
+        self._by_date = []  # sorted keys of every order
+        self._date_lock = threading.Lock()
+        self._listeners = []
+        self._last_id = 0
+        self._counter_lock = threading.Lock()
+        for order in orders:
+            self._index(order)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        return iter(list(self._by_id.values()))
+
+    def subscribe(self, listener):
+        """Call listener(event, order) after an order is added or removed.
+
+        ``event`` is ``'add'`` or ``'remove'``.
+        """
+        self._listeners.append(listener)
+
+    def next_id(self):
+        """Allocate a new, unique order id"""
+        with self._counter_lock:
+            self._last_id += 1
+            return self._last_id
+
+    def reserve(self, order_id):
+        """Make sure next_id() never returns order_id or anything below it"""
+        with self._counter_lock:
+            self._last_id = max(self._last_id, order_id)
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def add(self, order):
+        """Store an order; ids not taken from next_id() are reserved too"""
+        self._index(order)
+        self._notify('add', order)
+        return order
+
+    def get(self, order_id):
+        return self._by_id.get(order_id)
+
+    def remove(self, order_id):
+        """Remove an order by id; returns it, or None if it was not stored"""
+        with self._id_lock:
+            order = self._by_id.pop(order_id, None)
+        if order is None:
+            return None
+        user_id = order.get('userId')
+        with self._user_lock(user_id):
+            entries = self._by_user.get(user_id, [])
+            i = bisect.bisect_left(entries, (_order_key(order), order_id))
+            if i < len(entries) and entries[i][1] == order_id:
+                del entries[i]
+            if not entries:
+                self._by_user.pop(user_id, None)
+        with self._date_lock:
+            i = bisect.bisect_left(self._by_date, _order_key(order))
+            if i < len(self._by_date) and self._by_date[i][1] == order_id:
+                del self._by_date[i]
+        self._notify('remove', order)
+        return order
+
+    def for_user(self, user_id, after=None, limit=None):
+        """Return a user's orders oldest first.
+
+        ``after`` is the id of the last order already seen; the next ``limit``
+        orders following it are returned.
+        """
+        with self._user_lock(user_id):
+            entries = list(self._by_user.get(user_id, ()))
+        start = 0
+        if after is not None:
+            after_order = self._by_id.get(after)
+            if after_order is not None and after_order.get('userId') == user_id:
+                start = bisect.bisect_right(entries, (_order_key(after_order), after))
+            else:
+                start = next((i for i, (_, oid) in enumerate(entries) if oid > after), len(entries))
+        end = len(entries) if limit is None else start + limit
+        return [self._by_id[oid] for _, oid in entries[start:end] if oid in self._by_id]
+
+    def count_for_user(self, user_id):
+        return len(self._by_user.get(user_id, ()))
+
+    def scan(self, since=None, before=None, statuses=None, batch=500):
+        """Yield every order oldest first, reading the date index ``batch`` entries at a time.
+
+        ``since`` (inclusive) and ``before`` (exclusive) bound the order date
+        (createdAt, or date for older orders), compared as ISO 8601 strings.
+        ``statuses`` is a collection of statuses to keep. Orders added or
+        removed while the scan runs may or may not be seen.
+        """
+        position = None if since is None else (since,)
+        while True:
+            with self._date_lock:
+                start = 0 if position is None else bisect.bisect_right(self._by_date, position)
+                keys = self._by_date[start:start + batch]
+            for key in keys:
+                if before is not None and key[0] >= before:
+                    return
+                order = self._by_id.get(key[1])
+                if order is not None and (statuses is None or order.get('status') in statuses):
+                    yield order
+            if len(keys) < batch:
+                return
+            position = keys[-1]
+
+    def _index(self, order):
+        self.reserve(order['id'])
+        with self._id_lock:
+            self._by_id[order['id']] = order
+        user_id = order.get('userId')
+        with self._user_lock(user_id):
+            bisect.insort(self._by_user.setdefault(user_id, []), (_order_key(order), order['id']))
+        with self._date_lock:
+            bisect.insort(self._by_date, _order_key(order))
+
+    def _user_lock(self, user_id):
+        return self._user_locks[hash(user_id) % _USER_STRIPES]
+
+    def _notify(self, event, order):
+        for listener in self._listeners:
+            listener(event, order)
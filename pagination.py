@@ -0,0 +1,90 @@
+"""Cursor pagination, field projection and streamed JSON for list endpoints."""
+import base64
+import binascii
+
+from flask import Response, current_app, jsonify, request
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+# Lists longer than this are streamed item by item instead of encoded in one go
+STREAM_THRESHOLD = 500
+
+
+class PaginationError(ValueError):
+    """Raised for malformed cursor or limit parameters."""
+
+
+def encode_cursor(position):
+    """Turn an integer position into an opaque cursor string"""
+    return base64.urlsafe_b64encode(str(position).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises PaginationError on bad input"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeError, ValueError):
+        raise PaginationError('Invalid cursor')
+
+
+def page_args():
+    """Read ``cursor``, ``limit`` and ``fields`` from the query string.
+
+    Returns (paginated, after, limit, fields). ``paginated`` is False when the
+    client asked for neither a cursor nor a limit, in which case the endpoint
+    returns its full list as before.
+    """
+    cursor = request.args.get('cursor')
+    limit = request.args.get('limit')
+    after = decode_cursor(cursor) if cursor else None
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise PaginationError('limit must be an integer')
+        if limit < 1:
+            raise PaginationError('limit must be positive')
+        limit = min(limit, MAX_PAGE_SIZE)
+    elif cursor:
+        limit = DEFAULT_PAGE_SIZE
+    return cursor is not None or limit is not None, after, limit, parse_fields(request.args.get('fields'))
+
+
+def parse_fields(value):
+    """Parse a comma separated ``fields=`` value into a tuple, or None"""
+    if not value:
+        return None
+    fields = tuple(f.strip() for f in value.split(',') if f.strip())
+    return fields or None
+
+
+def project(item, fields):
+    """Keep only the requested keys of a dict"""
+    if fields is None:
+        return item
+    return {k: item[k] for k in fields if k in item}
+
+
+def list_response(items, fields=None, next_cursor=None):
+    """Build a JSON array response, streaming it when the list is large.
+
+    The body is always a plain JSON array so existing clients keep working;
+    the cursor for the next page travels in the ``X-Next-Cursor`` header.
+    """
+    if len(items) > STREAM_THRESHOLD:
+        response = Response(_stream_array(items, fields, current_app.json.dumps),
+                            mimetype='application/json')
+    else:
+        response = jsonify([project(item, fields) for item in items])
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = encode_cursor(next_cursor)
+    return response
+
+
+def _stream_array(items, fields, dumps, batch=100):
+    yield '['
+    for start in range(0, len(items), batch):
+        chunk = ','.join(dumps(project(item, fields)) for item in items[start:start + batch])
+        yield chunk if start == 0 else ',' + chunk
+    yield ']\n'
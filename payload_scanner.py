@@ -0,0 +1,53 @@
+"""Signature matching for request payloads in a single pass.
+
+Each signature set is compiled once into a regular expression shaped like a
+trie: alternatives that share a prefix share a branch, so at every position
+of the input the engine follows at most one path per character instead of
+trying every signature. Cost per request stays flat as signatures are added.
+Inputs are lowercased before matching.
+"""
+import re
+
+# Login signatures are the old pattern list after .strip(), so 'or' alone matches
+LOGIN_SQLI = ["'", '"', ';', '--', '/*', '*/', 'union', 'select', 'drop', 'insert', 'update', 'delete',
+              'or', "' or '", "'1'='1", ' or 1=1']
+SEARCH_SQLI = ["' or ", '" or ', "'--", '/*', '*/', '--', ';', ' union ', ' select ', ' drop ', ' insert ',
+               ' update ', ' delete ', "'1'='1", ' or 1=1']
+CONTACT_XSS = ['<script>', '</script>', 'javascript:', 'onload=', 'onerror=', 'onclick=', 'alert(', 'document.cookie']
+
+
+def _trie_pattern(patterns):
+    trie = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[''] = {}  # a signature ends here
+
+    def branch(node):
+        if '' in node:  # a shorter signature already matched, longer ones add nothing
+            return ''
+        alternatives = [re.escape(char) + branch(child) for char, child in sorted(node.items())]
+        return alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+
+    return branch(trie)
+
+
+class Signatures:
+    """A compiled set of lowercase signatures."""
+
+    def __init__(self, patterns):
+        patterns = [p for p in patterns if p]
+        if not patterns:
+            raise ValueError('at least one non-empty signature is required')
+        self._regex = re.compile(_trie_pattern(patterns))
+
+    def search(self, text):
+        """Return the first signature found in text (case-insensitively), or None"""
+        match = self._regex.search(text.lower())
+        return match.group() if match else None
+
+
+login_sqli = Signatures(LOGIN_SQLI)
+search_sqli = Signatures(SEARCH_SQLI)
+contact_xss = Signatures(CONTACT_XSS)
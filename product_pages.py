@@ -0,0 +1,191 @@
+"""Server-side rendered product listing and detail pages.
+
+products.html and product-detail.html are sent with their products already
+in the markup, so the first paint does not wait for a fetch of the
+catalog. The data the page scripts need travels with the page in a JSON
+island (``productsData`` / ``productData``), so they neither fetch nor
+redraw it.
+
+Cards and detail blocks are rendered from the Jinja partials in
+templates/partials/. A product's picture is its own ``photo`` from the
+catalog, as the page scripts pick it too; the JSON carries it in
+``image`` so the scripts show the same one. Each product's card, detail block and JSON are rendered
+once and reused until that product changes. An entry is only valid for the product object
+it was rendered from, and the cache follows the catalog through
+``catalog.subscribe`` to drop the entries of products that were replaced
+or removed, so a change re-renders only the products it touched. A page
+is its static shell with the cached fragments joined into it; the
+assembled listing is kept until the catalog version or the shell changes.
+
+The listing renders at most ``max_listing`` products. When the catalog is
+larger, its JSON island is marked ``data-partial`` and the page script
+fetches the rest after the first paint, as it used to before showing
+anything.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from urllib.parse import quote
+
+from jinja2 import Undefined
+from markupsafe import escape
+
+LISTING_PAGE = 'products.html'
+DETAIL_PAGE = 'product-detail.html'
+# Placeholders in the page shells that the rendered products replace
+LISTING_SLOT = '<!-- Products will be loaded here -->'
+DETAIL_SLOT = '<!-- Product details will be loaded here -->'
+DETAIL_TITLE = '<title>Product Details - NextGen Mobiles</title>'
+# Markup of one product, under templates/
+CARD_TEMPLATE = 'partials/product_card.html'
+DETAIL_TEMPLATE = 'partials/product_detail.html'
+# Fields of each product the listing script uses, as it fetched them before
+LISTING_FIELDS = ('id', 'name', 'price', 'image', 'images', 'brand', 'description', 'storage', 'color')
+
+# What safeImageUrl() in the page scripts shows for a product with no picture
+_NO_IMAGE = 'https://via.placeholder.com/300x250?text=No+Image'
+# Characters encodeURI() leaves alone besides letters and digits
+_URI_SAFE = ";,/?:@&=+$-_.!~*'()#"
+
+
+def product_image(product):
+    """The picture the pages show for a product: its own photo under images/, else its image URL"""
+    photo = product.get('photo')
+    return f'images/{photo}' if photo else product.get('image')
+
+
+def _image_url(image):
+    """An image path as safeImageUrl() in the page scripts writes it into src"""
+    if not image:
+        return _NO_IMAGE
+    if re.match(r'(images|uploads)/', image, re.IGNORECASE):
+        image = './' + image
+    return quote(image, safe=_URI_SAFE)
+
+
+def _text(value):
+    """A value as the page scripts print it in a template literal, HTML-escaped"""
+    if value is None or isinstance(value, Undefined):
+        return 'undefined'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # JavaScript prints 999.0 as 999
+    return escape(value)
+
+
+def _script_json(value):
+    """JSON that is safe inside a <script> element"""
+    return (json.dumps(value, separators=(',', ':'))
+            .replace('<', '\\u003c').replace('>', '\\u003e').replace('&', '\\u0026'))
+
+
+def _island(element_id, data, partial=False):
+    attributes = ' data-partial="true"' if partial else ''
+    return f'<script type="application/json" id="{element_id}"{attributes}>{data}</script>\n'
+
+
+class ProductPages:
+    """Renders the product pages from a Catalog, caching per-product fragments.
+
+    ``page_path(filename)`` gives the file to use as a page's shell;
+    ``templates`` is the Jinja environment holding the product partials;
+    ``present(product)`` gives the product as the API returns it.
+    """
+
+    def __init__(self, catalog, page_path, templates, present=None, max_listing=500):
+        self._catalog = catalog
+        self._templates = templates
+        self._max_listing = max_listing
+        self._page_path = page_path
+        self._present = present or (lambda product: product)
+        self._lock = threading.Lock()
+        self._fragments = {}  # (product id, kind) -> (product, html)
+        self._shells = {}  # path -> (mtime, text)
+        self._listing = None  # (catalog version, shell text, page)
+        catalog.subscribe(self._on_catalog_change)
+
+    def listing(self):
+        """products.html with the products rendered in, as (body, etag), or None if the shell has no slot"""
+        version = self._catalog.version
+        shell = self._shell(LISTING_PAGE)
+        cached = self._listing
+        if cached is not None and cached[0] == version and cached[1] is shell:
+            return cached[2]
+        if LISTING_SLOT not in shell:
+            return None
+        products, more = self._catalog.page(limit=self._max_listing)
+        cards = ''.join(self._fragment(p, 'card') for p in products)
+        data = '[' + ','.join(self._fragment(p, 'listing_json') for p in products) + ']'
+        html = shell.replace(LISTING_SLOT, cards, 1)
+        page = _page(_insert_before_body_end(html, _island('productsData', data, partial=more is not None)))
+        self._listing = (version, shell, page)
+        return page
+
+    def detail(self, product_id):
+        """product-detail.html for one product as (body, etag), or None if it is unknown or the shell has no slot"""
+        product = self._catalog.get(product_id)
+        shell = self._shell(DETAIL_PAGE)
+        if product is None or DETAIL_SLOT not in shell:
+            return None
+        html = shell.replace(DETAIL_SLOT, self._fragment(product, 'detail'), 1)
+        html = html.replace(DETAIL_TITLE, f'<title>{_text(product.get("name"))} - Mobile Shop</title>', 1)
+        return _page(_insert_before_body_end(html, _island('productData', self._fragment(product, 'detail_json'))))
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self._shells.clear()
+            self._listing = None
+
+    def _fragment(self, product, kind):
+        key = (product['id'], kind)
+        entry = self._fragments.get(key)
+        if entry is not None and entry[0] is product:
+            return entry[1]
+        html = self._render(self._present(product), kind)
+        with self._lock:
+            self._fragments[key] = (product, html)
+        return html
+
+    def _render(self, product, kind):
+        product = dict(product, image=product_image(product))
+        if kind == 'listing_json':
+            return _script_json({field: product[field] for field in LISTING_FIELDS if field in product})
+        if kind == 'detail_json':
+            return _script_json(product)
+        if kind == 'card':
+            template, sizes = CARD_TEMPLATE, '(min-width: 768px) 33vw, 100vw'
+        else:
+            template, sizes = DETAIL_TEMPLATE, '(min-width: 992px) 50vw, 100vw'
+        return self._templates.get_template(template).render(
+            product=product, text=_text, image=_image_url(product['image']),
+            srcset=(product.get('images') or {}).get('srcset'), sizes=sizes, sku=str(product['id']).zfill(6))
+
+    def _shell(self, filename):
+        path = self._page_path(filename)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._shells.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, encoding='utf-8') as f:
+                cached = (mtime, f.read())
+            with self._lock:
+                self._shells[path] = cached
+        return cached[1]
+
+    def _on_catalog_change(self, event, product):
+        with self._lock:
+            for kind in ('card', 'listing_json', 'detail', 'detail_json'):
+                self._fragments.pop((product['id'], kind), None)
+
+
+def _page(html):
+    body = html.encode('utf-8')
+    return body, hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _insert_before_body_end(html, markup):
+    end = html.rfind('</body>')
+    return html + markup if end < 0 else html[:end] + markup + html[end:]
@@ -0,0 +1,152 @@
+"""Per-client token-bucket rate limits and a global concurrency limit.
+
+``RateLimiter.install(app)`` adds a request hook that, in order:
+
+1. sheds load: when ``max_concurrent`` requests are already being handled
+   by this process, answers 503 at once instead of queueing;
+2. for endpoints with a rule, takes a token from the client's bucket for
+   that endpoint, or answers 429 when the bucket is empty.
+
+Both answers carry ``Retry-After``. A rule is ``(rate, burst)``: buckets
+hold up to ``burst`` tokens and refill at ``rate`` tokens per second. The
+client key comes from a callable, so the app decides whether a request is
+counted per IP or per session token.
+
+Buckets live in LRU-ordered maps split over ``stripes`` locks, so two
+clients rarely contend. At most ``max_clients`` buckets are kept; the
+least recently used go first. An evicted bucket starts full again, so keep
+``max_clients`` well above the number of clients active within one refill
+period.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+
+# Environ key set by RateLimiter.admit(): whether the request took a concurrency slot
+ADMITTED = 'ngm.rate_limit.admitted'
+
+
+def parse_rules(text):
+    """Parse 'endpoint=rate:burst,...' into {endpoint: (rate, burst)}; rate 0 removes a rule"""
+    rules = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        try:
+            endpoint, spec = item.split('=')
+            rate, burst = spec.split(':')
+            rules[endpoint.strip()] = (float(rate), float(burst))
+        except ValueError:
+            raise ValueError(f'rate limit {item!r} is not endpoint=rate:burst')
+    return rules
+
+
+class RateLimiter:
+    """Token buckets per (endpoint, client) plus an in-flight request cap."""
+
+    def __init__(self, rules, client_key, max_concurrent=0, max_clients=100000, stripes=16,
+                 exempt=(), clock=time.monotonic):
+        self.rules = {endpoint: rule for endpoint, rule in rules.items() if rule[0] > 0}
+        self.client_key = client_key
+        self.max_concurrent = max_concurrent
+        self.exempt = set(exempt)
+        self._clock = clock
+        self._per_stripe = max(1, max_clients // stripes)
+        self._stripes = [(threading.Lock(), OrderedDict()) for _ in range(stripes)]
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def install(self, app):
+        app.before_request(self._before)
+        app.teardown_request(self._teardown)
+
+    def __len__(self):
+        return sum(len(buckets) for _, buckets in self._stripes)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self, endpoint, key):
+        """Take a token; returns 0 on success, else seconds until one is available"""
+        rule = self.rules.get(endpoint)
+        if rule is None:
+            return 0
+        rate, burst = rule
+        bucket_key = (endpoint, key)
+        lock, buckets = self._stripes[hash(bucket_key) % len(self._stripes)]
+        now = self._clock()
+        with lock:
+            bucket = buckets.get(bucket_key)
+            if bucket is None:
+                bucket = buckets[bucket_key] = [burst, now]
+                if len(buckets) > self._per_stripe:
+                    buckets.popitem(last=False)
+            else:
+                buckets.move_to_end(bucket_key)
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+    def admit(self):
+        """Run the admission checks for the current request ahead of its hooks.
+
+        For a server that has to decide before it reads a request body.
+        Returns the 503 or 429 response, or None once the request is let in;
+        either way the request's environ is marked so the hook does not
+        count it a second time. An admitted request holds a concurrency
+        slot until the teardown of a request context for the same environ,
+        or until ``release`` when it never gets one.
+        """
+        rejection, took_slot = self._admit()
+        if rejection is not None and took_slot:
+            self.release()
+            took_slot = False
+        request.environ[ADMITTED] = took_slot
+        return rejection
+
+    def release(self):
+        """Give back a concurrency slot taken by ``admit``"""
+        with self._lock:
+            self._in_flight -= 1
+
+    def _admit(self):
+        """Returns (rejection response or None, whether a concurrency slot was taken)"""
+        if request.endpoint in self.exempt:
+            return None, False
+        took_slot = False
+        if self.max_concurrent:
+            with self._lock:
+                if self._in_flight >= self.max_concurrent:
+                    return _reject(503, 'Server is busy; please retry', 1), False
+                self._in_flight += 1
+            took_slot = True
+        if request.endpoint in self.rules:
+            wait = self.acquire(request.endpoint, self.client_key())
+            if wait:
+                return _reject(429, 'Too many requests; please slow down', wait), took_slot
+        return None, took_slot
+
+    def _before(self):
+        if ADMITTED in request.environ:
+            # Already checked by admit(); only the slot is left to hand over
+            g.rate_limit_admitted = request.environ.pop(ADMITTED)
+            return None
+        rejection, g.rate_limit_admitted = self._admit()
+        return rejection
+
+    def _teardown(self, error):
+        if g.pop('rate_limit_admitted', False):
+            self.release()
+
+
+def _reject(status, message, retry_after):
+    seconds = max(1, math.ceil(retry_after))
+    response = jsonify({'error': message, 'retryAfter': seconds})
+    response.status_code = status
+    response.headers['Retry-After'] = str(seconds)
+    return response
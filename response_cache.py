@@ -0,0 +1,114 @@
+"""Versioned cache of encoded catalog responses with ETag support."""
+import functools
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+# Response headers worth replaying from a cached entry
+_KEPT_HEADERS = ('X-Next-Cursor', 'X-Total-Count')
+
+
+class ResponseCache:
+    """Cache of successful GET responses for views that only read the catalog.
+
+    Entries hold the encoded body, a strong ETag and the catalog version they
+    were built from. A version bump drops every entry at once, so nothing is
+    re-serialized while the catalog stays the same. Matching If-None-Match
+    requests get an empty 304.
+
+    Streamed responses (the large listings ``list_response`` streams) are
+    collected and cached like any other, so a large catalog is encoded once
+    per version too. Memory is bounded: a body over ``max_entry_bytes`` is
+    streamed on uncached from where collecting stopped, and the least
+    recently used entries are dropped to keep the total under ``max_bytes``.
+    """
+
+    def __init__(self, version, max_entries=1024, max_entry_bytes=32 * 1024 * 1024,
+                 max_bytes=256 * 1024 * 1024):
+        self._version = version
+        self._max_entries = max_entries
+        self._max_entry_bytes = max_entry_bytes
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._entries = OrderedDict()
+        self._entries_version = None
+        self._lock = threading.Lock()
+
+    def cached(self, view):
+        """Decorator that serves a view from the cache"""
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            version = self._version()
+            entry = self._lookup(key, version)
+            if entry is None:
+                response = view(*args, **kwargs)
+                if not isinstance(response, Response) or response.status_code != 200:
+                    return response
+                entry = self._store(key, version, response)
+                if isinstance(entry, Response):
+                    return entry  # too large to keep
+            return self._respond(entry)
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _lookup(self, key, version):
+        with self._lock:
+            if self._entries_version != version:
+                self._entries.clear()
+                self._bytes = 0
+                self._entries_version = version
+                return None
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _store(self, key, version, response):
+        """Cache a response's body; returns the entry, or a response streaming it on if too large"""
+        if response.is_streamed:
+            chunks, size = [], 0
+            encoded = response.iter_encoded()
+            for chunk in encoded:
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > self._max_entry_bytes:
+                    response.response = itertools.chain(chunks, encoded)
+                    return response
+            body = b''.join(chunks)
+        else:
+            body = response.get_data()
+            if len(body) > self._max_entry_bytes:
+                return response
+        etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+        headers = [(h, response.headers[h]) for h in _KEPT_HEADERS if h in response.headers]
+        entry = (body, etag, response.mimetype, headers)
+        with self._lock:
+            if self._entries_version == version:
+                previous = self._entries.pop(key, None)
+                if previous is not None:
+                    self._bytes -= len(previous[0])
+                self._entries[key] = entry
+                self._bytes += len(body)
+                while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                    self._bytes -= len(self._entries.popitem(last=False)[1][0])
+        return entry
+
+    @staticmethod
+    def _respond(entry):
+        body, etag, mimetype, headers = entry
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, mimetype=mimetype)
+            response.headers.extend(headers)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,156 @@
+"""Running sales aggregates maintained as orders are created and deleted."""
+import threading
+import time
+from datetime import datetime
+
+# Windows accepted by /api/stats?window=, in seconds
+WINDOWS = {
+    '1m': 60, '5m': 300, '15m': 900, '1h': 3600,
+    '6h': 6 * 3600, '24h': 86400, '7d': 7 * 86400, '30d': 30 * 86400,
+}
+
+# Rolling buckets as (bucket width, number of buckets): minutes, hours, days
+RINGS = ((60, 60), (3600, 48), (86400, 45))
+
+
+class _Ring:
+    """Fixed number of time buckets, each holding an order count and revenue."""
+
+    def __init__(self, width, size):
+        self.width = width
+        self.size = size
+        self._starts = [None] * size
+        self._counts = [0] * size
+        self._revenue = [0.0] * size
+
+    def add(self, ts, count, revenue, now):
+        start = int(ts // self.width) * self.width
+        if start <= now - self.width * self.size:
+            return  # older than anything this ring can report
+        i = (start // self.width) % self.size
+        if self._starts[i] != start:
+            if self._starts[i] is not None and self._starts[i] > start:
+                return  # slot already reused by a newer bucket
+            self._starts[i], self._counts[i], self._revenue[i] = start, 0, 0.0
+        self._counts[i] += count
+        self._revenue[i] += revenue
+
+    def total(self, since):
+        count, revenue = 0, 0.0
+        for start, c, r in zip(self._starts, self._counts, self._revenue):
+            if start is not None and start >= since:
+                count += c
+                revenue += r
+        return count, revenue
+
+
+def window_start(seconds, now):
+    """Return (bucket width, first bucket start) covering the last ``seconds``"""
+    width = next(w for w, size in RINGS if w * size >= seconds)
+    return width, int((now - seconds) // width) * width
+
+
+def order_contribution(order, brand_of):
+    """Return (total, [(product id, brand, amount)], timestamp) for an order.
+
+    Each line counts for the brand recorded on it when the order was placed,
+    so removing an order takes its revenue back from the same brand even
+    after the catalog changed; ``brand_of`` covers lines without one.
+    """
+    lines = []
+    for item in order.get('items', ()):
+        brand = item.get('brand') or brand_of(item.get('id')) or 'Unknown'
+        lines.append((item.get('id'), brand, item.get('price', 0) * item.get('quantity', 0)))
+    return order.get('total', 0) or 0, lines, order_timestamp(order)
+
+
+def order_timestamp(order):
+    """Epoch seconds for an order's createdAt (or date for older orders)"""
+    value = order.get('createdAt') or order.get('date')
+    if not value:
+        return time.time()
+    try:
+        return datetime.fromisoformat(value.rstrip('Z')).timestamp()
+    except ValueError:
+        return time.time()
+
+
+class SalesAggregates:
+    """Order counts and revenue kept up to date from OrderStore events.
+
+    Totals, per-brand and per-product revenue are adjusted on every add and
+    remove. Rolling minute, hour and day buckets answer windowed queries by
+    summing a bounded number of buckets instead of rescanning history.
+    Windows line up with bucket boundaries, so a window can include up to one
+    extra bucket's worth of older orders.
+    """
+
+    def __init__(self, order_store=None, brand_of=None):
+        self._lock = threading.Lock()
+        self._brand_of = brand_of or (lambda product_id: None)
+        self.order_count = 0
+        self.revenue = 0.0
+        self._by_brand = {}
+        self._by_product = {}
+        self._rings = tuple(_Ring(width, size) for width, size in RINGS)
+        if order_store is not None:
+            for order in order_store:
+                self.add(order)
+            order_store.subscribe(self._on_order_event)
+
+    def add(self, order):
+        self._apply(order, 1)
+
+    def remove(self, order):
+        self._apply(order, -1)
+
+    def snapshot(self):
+        """Return the current totals as a dict"""
+        with self._lock:
+            return {
+                'total_orders': self.order_count,
+                'total_revenue': self.revenue,
+                'average_order_value': (self.revenue / self.order_count) if self.order_count > 0 else 0,
+                'revenue_by_brand': dict(self._by_brand),
+                'revenue_by_product': {str(pid): revenue for pid, revenue in self._by_product.items()},
+            }
+
+    def window(self, name, now=None):
+        """Return order count, revenue and average for a named window"""
+        now = time.time() if now is None else now
+        width, since = window_start(WINDOWS[name], now)
+        ring = next(r for r in self._rings if r.width == width)
+        with self._lock:
+            count, revenue = ring.total(since)
+        return {
+            'window': name,
+            'orders': count,
+            'revenue': revenue,
+            'average_order_value': (revenue / count) if count > 0 else 0,
+        }
+
+    def _apply(self, order, sign):
+        total, lines, ts = order_contribution(order, self._brand_of)
+        now = time.time()
+        with self._lock:
+            self.order_count += sign
+            self.revenue += sign * total
+            for product_id, brand, amount in lines:
+                _bump(self._by_brand, brand, sign * amount)
+                _bump(self._by_product, product_id, sign * amount)
+            for ring in self._rings:
+                ring.add(ts, sign, sign * total, now)
+
+    def _on_order_event(self, event, order):
+        if event == 'remove':
+            self.remove(order)
+        else:
+            self.add(order)
+
+
+def _bump(totals, key, amount):
+    value = totals.get(key, 0) + amount
+    if value:
+        totals[key] = value
+    else:
+        totals.pop(key, None)
@@ -35,6 +35,8 @@ const ALLOWED_IMAGES = [
 ];
 
 function mapImageForProduct(p) {
+    // The catalog's own photo when it has one; otherwise a guess from brand and name
+    if (p.photo) return `images/${p.photo}`;
     const name = (p.name || '').toLowerCase();
     const brand = (p.brand || '').toLowerCase();
     if (brand.includes('apple') || /iphone/.test(name)) return 'images/15pro.jpg';
@@ -76,8 +78,11 @@ window.displayFilteredProducts = displayFilteredProducts;
 
 // Load products from backend
 async function loadProducts() {
+    // Pages without a product grid (such as product details) need no catalog
+    if (!document.getElementById('productsContainer')) return;
     try {
-        const response = await fetch('/api/products');
+        // The grid only needs these fields; skip the rest of each product
+        const response = await fetch('/api/products?fields=id,name,price,image,images,brand,description');
         const data = await response.json();
         products = data.map(p => ({ ...p, image: mapImageForProduct(p) }));
         window.products = products; // Update global reference
@@ -180,7 +185,7 @@ function createProductCard(product) {
 
     col.innerHTML = `
         <div class="card product-card h-100">
-            <img src="${safeImageUrl(product.image)}" class="card-img-top product-img" alt="${product.name}" onclick="viewProduct(${product.id})" onerror="this.onerror=null;this.src='https://via.placeholder.com/300x250?text=Image+Not+Found';">
+            <img src="${safeImageUrl(product.image)}" ${responsiveImageAttrs(product, '(min-width: 768px) 33vw, 100vw')} class="card-img-top product-img" alt="${product.name}" onclick="viewProduct(${product.id})" onerror="this.onerror=null;this.src='https://via.placeholder.com/300x250?text=Image+Not+Found';">
             <div class="card-body d-flex flex-column">
                 <h5 class="card-title" onclick="viewProduct(${product.id})" style="cursor: pointer;">${product.name}</h5>
                 <p class="card-text text-muted">${product.description}</p>
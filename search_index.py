@@ -0,0 +1,192 @@
+"""Inverted index for ranked product search.
+
+Each product is split into lowercase word tokens from its name, brand,
+description and color. A query term matches a token exactly, as a prefix,
+as a substring (through a trigram index over the vocabulary) or, when
+nothing else matches, within a small edit distance (a swap of two
+neighbouring letters counts as one edit). Every query term must
+match; results are ranked by field weight, match quality and rarity.
+"""
+import bisect
+import math
+import re
+import threading
+
+FIELD_WEIGHTS = {'name': 3.0, 'brand': 2.0, 'color': 1.0, 'description': 1.0}
+
+# Score multipliers for the different ways a query term can hit a token
+EXACT, PREFIX, SUBSTRING, FUZZY = 1.0, 0.7, 0.5, 0.4
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Split text into lowercase word tokens"""
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+class SearchIndex:
+    """Token and trigram index over a Catalog, kept in sync with it."""
+
+    def __init__(self, catalog=None):
+        self._lock = threading.RLock()
+        self._docs = {}  # product id -> (seq, product)
+        self._doc_tokens = {}  # product id -> set of tokens
+        self._postings = {}  # token -> {product id: field weight}
+        self._grams = {}  # trigram -> set of tokens
+        self._vocab = []  # sorted tokens, for prefix lookups
+        self._next_seq = 0
+        if catalog is not None:
+            with self._lock:
+                # Subscribed first: a change made during the build waits for the
+                # lock and is applied after it
+                catalog.subscribe(self._on_catalog_change)
+                for product in catalog:
+                    self.add(product)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, product):
+        """Index a product, replacing any earlier version of it"""
+        with self._lock:
+            previous = self._docs.get(product['id'])
+            if previous is not None:
+                seq = previous[0]
+                self._drop_postings(product['id'])
+            else:
+                seq = self._next_seq
+                self._next_seq += 1
+            weights = {}
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(product.get(field)):
+                    weights[token] = weights.get(token, 0.0) + weight
+            for token, weight in weights.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = {}
+                    self._add_token(token)
+                postings[product['id']] = weight
+            self._docs[product['id']] = (seq, product)
+            self._doc_tokens[product['id']] = set(weights)
+
+    def remove(self, product_id):
+        """Drop a product from the index"""
+        with self._lock:
+            if self._docs.pop(product_id, None) is not None:
+                self._drop_postings(product_id)
+
+    def search(self, query, limit=None, offset=0):
+        """Return (total, products) for the ranked matches of a query"""
+        terms = tokenize(query)
+        if not terms:
+            return 0, []
+        with self._lock:
+            scores = None
+            doc_count = len(self._docs) or 1
+            for term in dict.fromkeys(terms):
+                term_scores = {}
+                for token, quality in self._expand(term):
+                    postings = self._postings[token]
+                    idf = math.log(1 + doc_count / len(postings))
+                    for product_id, weight in postings.items():
+                        score = quality * weight * idf
+                        if score > term_scores.get(product_id, 0.0):
+                            term_scores[product_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: s + term_scores[pid] for pid, s in scores.items() if pid in term_scores}
+                if not scores:
+                    return 0, []
+            ranked = sorted(scores, key=lambda pid: (-scores[pid], self._docs[pid][0]))
+            end = None if limit is None else offset + limit
+            return len(ranked), [self._docs[pid][1] for pid in ranked[offset:end]]
+
+    def _expand(self, term):
+        """Yield (token, quality) for every vocabulary token the term hits"""
+        matched = {}
+        if term in self._postings:
+            matched[term] = EXACT
+        start = bisect.bisect_left(self._vocab, term)
+        for token in self._vocab[start:]:
+            if not token.startswith(term):
+                break
+            matched.setdefault(token, PREFIX)
+        if len(term) >= 3:
+            for token in self._tokens_with_grams(_trigrams(term)):
+                if term in token:
+                    matched.setdefault(token, SUBSTRING)
+            if not matched and len(term) >= 4:
+                max_distance = 1 if len(term) < 8 else 2
+                for token in self._fuzzy_candidates(term, max_distance):
+                    if _within_distance(term, token, max_distance):
+                        matched[token] = FUZZY
+        return matched.items()
+
+    def _tokens_with_grams(self, grams):
+        sets = sorted((self._grams.get(g, set()) for g in grams), key=len)
+        if not sets or not sets[0]:
+            return set()
+        return sets[0].intersection(*sets[1:])
+
+    def _fuzzy_candidates(self, term, max_distance):
+        # One edit touches at most four trigrams (three, or four for a swap of
+        # two neighbours), so a near match still shares most of the term's
+        # trigrams; count overlaps to avoid a vocabulary scan.
+        grams = _trigrams(term)
+        needed = max(1, len(grams) - 4 * max_distance)
+        counts = {}
+        for gram in grams:
+            for token in self._grams.get(gram, ()):
+                counts[token] = counts.get(token, 0) + 1
+        return [t for t, c in counts.items()
+                if c >= needed and abs(len(t) - len(term)) <= max_distance]
+
+    def _add_token(self, token):
+        bisect.insort(self._vocab, token)
+        for gram in _trigrams(token):
+            self._grams.setdefault(gram, set()).add(token)
+
+    def _drop_postings(self, product_id):
+        for token in self._doc_tokens.pop(product_id, ()):
+            postings = self._postings[token]
+            postings.pop(product_id, None)
+            if postings:
+                continue
+            del self._postings[token]
+            del self._vocab[bisect.bisect_left(self._vocab, token)]
+            for gram in _trigrams(token):
+                tokens = self._grams[gram]
+                tokens.discard(token)
+                if not tokens:
+                    del self._grams[gram]
+
+    def _on_catalog_change(self, event, product):
+        if event == 'remove':
+            self.remove(product['id'])
+        else:
+            self.add(product)
+
+
+def _within_distance(a, b, max_distance):
+    """Bounded optimal string alignment check: a swap of two neighbouring letters is one edit"""
+    if abs(len(a) - len(b)) > max_distance:
+        return False
+    before, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        # A swap reaches back two rows, so both must be out of range to stop early
+        if min(current) > max_distance and min(previous) > max_distance:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= max_distance
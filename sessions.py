@@ -0,0 +1,90 @@
+"""Bounded bearer-token session store with timing-wheel expiry."""
+import heapq
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+# Most expired wheel slots one call clears; the rest wait for later calls
+MAX_SWEEP_SLOTS = 16
+
+
+class SessionStore:
+    """Maps login tokens to user ids.
+
+    Every session lives for ``ttl`` seconds. Expiry uses a timing wheel
+    whose slots are made on demand: a session goes into the slot for the
+    tick in which it expires, so there are never more slots than live
+    sessions. Each create clears at most ``MAX_SWEEP_SLOTS`` slots whose
+    tick has passed, however long the store sat idle; a session still
+    waiting to be cleared is already refused by ``resolve``. Validation is
+    a single dict lookup. When more than ``max_sessions`` are live, the
+    oldest ones are evicted first.
+    """
+
+    def __init__(self, ttl=86400, max_sessions=100000, tick=1.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.tick = tick
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()  # token -> (user_id, expiry tick), oldest first
+        self._slots = {}  # expiry tick -> tokens
+        self._slot_ticks = []  # heap of the ticks in _slots
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, user_id):
+        """Start a session for a user and return its token"""
+        token = secrets.token_urlsafe(32)
+        now = self._clock()
+        with self._lock:
+            self._sweep(now)
+            expires = self._tick_of(now + self.ttl)
+            self._sessions[token] = (user_id, expires)
+            slot = self._slots.get(expires)
+            if slot is None:
+                slot = self._slots[expires] = set()
+                heapq.heappush(self._slot_ticks, expires)
+            slot.add(token)
+            while len(self._sessions) > self.max_sessions:
+                oldest, (_, oldest_expires) = self._sessions.popitem(last=False)
+                self._discard(oldest, oldest_expires)
+        return token
+
+    def resolve(self, token):
+        """Return the user id for a live token, or None"""
+        if not token:
+            return None
+        session = self._sessions.get(token)
+        if session is None:
+            return None
+        if session[1] <= self._tick_of(self._clock()):
+            self.revoke(token)
+            return None
+        return session[0]
+
+    def revoke(self, token):
+        with self._lock:
+            session = self._sessions.pop(token, None)
+            if session is not None:
+                self._discard(token, session[1])
+
+    def _tick_of(self, timestamp):
+        return int(timestamp // self.tick)
+
+    def _discard(self, token, expires):
+        slot = self._slots.get(expires)
+        if slot is not None:
+            slot.discard(token)
+            if not slot:
+                del self._slots[expires]  # its tick stays in the heap until swept
+
+    def _sweep(self, now):
+        current = self._tick_of(now)
+        for _ in range(MAX_SWEEP_SLOTS):
+            if not self._slot_ticks or self._slot_ticks[0] > current:
+                return
+            for token in self._slots.pop(heapq.heappop(self._slot_ticks), ()):
+                del self._sessions[token]
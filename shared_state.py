@@ -0,0 +1,723 @@
+"""State shared by several worker processes through one SQLite database.
+
+In multi-worker mode every process opens the same database file in WAL mode.
+Orders, stock, users, sessions, contact messages and uploads metadata are
+read and written there directly. The stores below have the same methods as
+their in-memory versions, so the app uses them the same way. Ids are
+allocated inside ``BEGIN IMMEDIATE`` transactions, which hold the database
+write lock, so two processes can never hand out the same id.
+
+The catalog is read on every request, so each worker keeps its own in-memory
+``Catalog`` and ``SharedCatalog`` brings it up to date whenever the shared
+catalog version changes. Sales aggregates are updated in the same
+transaction as the order they come from.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from inventory import OutOfStock
+from sales_stats import RINGS, WINDOWS, order_contribution, window_start
+
+# durability.py fsync policy -> SQLite synchronous setting
+SYNCHRONOUS = {'always': 'FULL', 'interval': 'NORMAL', 'never': 'OFF'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS products (seq INTEGER PRIMARY KEY, id UNIQUE NOT NULL, body TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS orders (id INTEGER PRIMARY KEY, user_id, sort_key TEXT NOT NULL, body TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS orders_by_user ON orders (user_id, sort_key, id);
+CREATE INDEX IF NOT EXISTS orders_by_date ON orders (sort_key, id);
+CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, email, body TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS users_by_email ON users (email);
+CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, user_id, expires REAL NOT NULL) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions_by_expiry ON sessions (expires);
+CREATE TABLE IF NOT EXISTS contacts (id INTEGER PRIMARY KEY, body TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS contacts_by_date ON contacts (ifnull(json_extract(body, '$.submittedAt'), ''), id);
+CREATE INDEX IF NOT EXISTS contacts_by_subject
+    ON contacts (json_extract(body, '$.subject'), ifnull(json_extract(body, '$.submittedAt'), ''), id);
+CREATE INDEX IF NOT EXISTS contacts_by_newsletter
+    ON contacts (json_type(body, '$.newsletter') = 'true', ifnull(json_extract(body, '$.submittedAt'), ''), id);
+CREATE TABLE IF NOT EXISTS user_files (seq INTEGER PRIMARY KEY, user_id, file_id TEXT UNIQUE NOT NULL, body TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS user_files_by_user ON user_files (user_id, seq);
+CREATE INDEX IF NOT EXISTS user_files_by_date ON user_files (ifnull(json_extract(body, '$.upload_date'), ''), seq);
+CREATE TABLE IF NOT EXISTS stock (product_id PRIMARY KEY, available INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sales_totals (
+    kind TEXT NOT NULL, key TEXT NOT NULL, orders INTEGER NOT NULL, revenue REAL NOT NULL,
+    PRIMARY KEY (kind, key)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sales_buckets (
+    width INTEGER NOT NULL, start INTEGER NOT NULL, orders INTEGER NOT NULL, revenue REAL NOT NULL,
+    PRIMARY KEY (width, start)) WITHOUT ROWID;
+"""
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def _is_id(value):
+    """True for values the in-memory stores could ever have stored as an id"""
+    return isinstance(value, int)
+
+
+def _is_bindable(value):
+    return value is None or isinstance(value, (int, float, str))
+
+
+class SharedDatabase:
+    """One SQLite file in WAL mode with a connection per thread."""
+
+    def __init__(self, path, synchronous='NORMAL', timeout=30.0):
+        self.path = path
+        self.synchronous = synchronous
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection().executescript(_SCHEMA)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; write() opens transactions explicitly
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f'PRAGMA synchronous={self.synchronous}')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def write(self):
+        """Run a block in a write transaction and yield its connection.
+
+        The write lock is taken up front, so reads inside the block see the
+        latest committed state. A nested write() runs in a savepoint of the
+        outer transaction: an exception leaving it undoes only its own
+        changes, and the outer block decides whether to go on or roll back.
+        """
+        conn = self.connection()
+        if conn.in_transaction:
+            depth = getattr(self._local, 'savepoints', 0) + 1
+            self._local.savepoints = depth
+            savepoint = f'write_{depth}'
+            conn.execute(f'SAVEPOINT {savepoint}')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute(f'ROLLBACK TO {savepoint}')
+                conn.execute(f'RELEASE {savepoint}')
+                raise
+            else:
+                conn.execute(f'RELEASE {savepoint}')
+            finally:
+                self._local.savepoints = depth - 1
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def meta(self, key, default=0):
+        row = self.query('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def claim(self, key):
+        """Set a flag once; returns True only for the caller that set it"""
+        with self.write() as conn:
+            return conn.execute('INSERT OR IGNORE INTO meta VALUES (?, 1)', (key,)).rowcount == 1
+
+    def increment(self, key, amount=1):
+        """Add to a counter and return its new value"""
+        with self.write() as conn:
+            return conn.execute('INSERT INTO meta VALUES (?, ?) ON CONFLICT (key) DO UPDATE '
+                                'SET value = value + excluded.value RETURNING value', (key, amount)).fetchone()[0]
+
+    def raise_to(self, key, value):
+        """Make a counter at least ``value``"""
+        with self.write() as conn:
+            conn.execute('INSERT INTO meta VALUES (?, ?) ON CONFLICT (key) DO UPDATE '
+                         'SET value = max(value, excluded.value)', (key, value))
+
+
+class SharedCatalog:
+    """Keeps a worker's in-memory Catalog in step with the products table.
+
+    ``publish`` replaces the shared catalog and bumps its version. Each
+    worker calls ``refresh`` before handling a request; it checks the
+    version at most once per ``interval`` seconds and applies only the
+    products that changed, so the search index and response cache follow
+    through the usual catalog events.
+
+    With ``rebuild`` set, a version published after the first refresh is
+    handed over whole instead: ``rebuild(load)`` is expected to build a new
+    catalog from ``load()`` elsewhere and swap it in, returning False when
+    it cannot start yet (the next refresh tries again).
+    """
+
+    def __init__(self, db, catalog, interval=1.0, rebuild=None):
+        self._db = db
+        self.catalog = catalog
+        self.interval = interval
+        self.rebuild = rebuild
+        self._version = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def publish(self, products):
+        with self._db.write() as conn:
+            conn.execute('DELETE FROM products')
+            conn.executemany('INSERT INTO products (id, body) VALUES (?, ?)',
+                             [(p['id'], _dumps(p)) for p in products])
+            version = self._db.increment('catalog_version')
+        if self.rebuild is None:
+            return
+        # The publisher swaps in these products itself
+        with self._lock:
+            self._version = version
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked < self.interval:
+            return
+        if not self._lock.acquire(blocking=force):
+            return  # another thread of this worker is already refreshing
+        try:
+            self._checked = now
+            version = self._db.meta('catalog_version')
+            if version == self._version:
+                return
+            if self.rebuild is not None and self._version is not None:
+                if self.rebuild(self.products):
+                    self._version = version
+                return
+            products = self.products()
+            ids = {p['id'] for p in products}
+            for product in self.catalog.all():
+                if product['id'] not in ids:
+                    self.catalog.remove(product['id'])
+            for product in products:
+                if self.catalog.get(product['id']) != product:
+                    self.catalog.upsert(product)
+            self._version = version
+        finally:
+            self._lock.release()
+
+    def products(self):
+        """Every published product, in catalog order"""
+        rows = self._db.query('SELECT body FROM products ORDER BY seq').fetchall()
+        return [json.loads(body) for body, in rows]
+
+
+class SqliteOrderStore:
+    """Orders in the shared database; same interface as OrderStore."""
+
+    def __init__(self, db):
+        self._db = db
+        self._listeners = []
+        self._hooks = []
+
+    def __len__(self):
+        return self._db.query('SELECT COUNT(*) FROM orders').fetchone()[0]
+
+    def __iter__(self):
+        rows = self._db.query('SELECT body FROM orders ORDER BY id').fetchall()
+        return iter([json.loads(body) for body, in rows])
+
+    def subscribe(self, listener):
+        """Call listener(event, order) in this process after its own changes"""
+        self._listeners.append(listener)
+
+    def subscribe_in_transaction(self, hook):
+        """Call hook(conn, event, order) inside every add/remove transaction"""
+        self._hooks.append(hook)
+
+    def next_id(self):
+        return self._db.increment('last_order_id')
+
+    def reserve(self, order_id):
+        self._db.raise_to('last_order_id', order_id)
+
+    @property
+    def last_id(self):
+        return self._db.meta('last_order_id')
+
+    def add(self, order):
+        """Store an order; an order whose id is already stored is left as is"""
+        with self._db.write() as conn:
+            self.reserve(order['id'])
+            added = conn.execute('INSERT OR IGNORE INTO orders VALUES (?, ?, ?, ?)',
+                                 (order['id'], order.get('userId'), _sort_key(order), _dumps(order))).rowcount
+            if added:
+                for hook in self._hooks:
+                    hook(conn, 'add', order)
+        if added:
+            self._notify('add', order)
+        return order
+
+    def get(self, order_id):
+        if not _is_id(order_id):
+            return None
+        row = self._db.query('SELECT body FROM orders WHERE id = ?', (order_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def remove(self, order_id):
+        if not _is_id(order_id):
+            return None
+        with self._db.write() as conn:
+            row = conn.execute('DELETE FROM orders WHERE id = ? RETURNING body', (order_id,)).fetchone()
+            if row is None:
+                return None
+            order = json.loads(row[0])
+            for hook in self._hooks:
+                hook(conn, 'remove', order)
+        self._notify('remove', order)
+        return order
+
+    def for_user(self, user_id, after=None, limit=None):
+        """Return a user's orders oldest first, starting after order id ``after``"""
+        if not _is_bindable(user_id):
+            return []
+        limit = -1 if limit is None else limit
+        if after is None:
+            rows = self._db.query('SELECT body FROM orders WHERE user_id = ? ORDER BY sort_key, id LIMIT ?',
+                                  (user_id, limit)).fetchall()
+            return [json.loads(body) for body, in rows]
+        row = self._db.query('SELECT sort_key, id FROM orders WHERE id = ? AND user_id = ?',
+                             (after, user_id)).fetchone()
+        if row is not None:
+            condition = '(sort_key, id) > (?, ?)'
+        else:
+            # The cursor order is gone; resume at the first later id, as OrderStore does
+            row = self._db.query('SELECT sort_key, id FROM orders WHERE user_id = ? AND id > ? '
+                                 'ORDER BY sort_key, id LIMIT 1', (user_id, after)).fetchone()
+            if row is None:
+                return []
+            condition = '(sort_key, id) >= (?, ?)'
+        rows = self._db.query(f'SELECT body FROM orders WHERE user_id = ? AND {condition} '
+                              'ORDER BY sort_key, id LIMIT ?', (user_id, *row, limit)).fetchall()
+        return [json.loads(body) for body, in rows]
+
+    def count_for_user(self, user_id):
+        if not _is_bindable(user_id):
+            return 0
+        return self._db.query('SELECT COUNT(*) FROM orders WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+    def scan(self, since=None, before=None, statuses=None, batch=500):
+        """Yield every order oldest first, ``batch`` rows per query"""
+        conditions, params = [], []
+        if since is not None:
+            conditions.append('sort_key >= ?')
+            params.append(since)
+        if before is not None:
+            conditions.append('sort_key < ?')
+            params.append(before)
+        if statuses is not None:
+            conditions.append(f"json_extract(body, '$.status') IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        for body, in _keyset_scan(self._db, 'orders', 'sort_key', 'id', conditions, params, batch):
+            yield json.loads(body)
+
+    def _notify(self, event, order):
+        for listener in self._listeners:
+            listener(event, order)
+
+
+def _sort_key(order):
+    return order.get('createdAt') or order.get('date') or ''
+
+
+def _keyset_scan(db, table, key, tiebreak, conditions, params, batch, columns='body'):
+    """Yield rows in (key, tiebreak) order, one query per ``batch`` rows.
+
+    Each query starts after the last row of the one before, so no read
+    transaction stays open while the caller works through a batch.
+    """
+    where = ' AND '.join(conditions) or '1'
+    last = ()
+    while True:
+        resume = f' AND ({key}, {tiebreak}) > (?, ?)' if last else ''
+        rows = db.query(f'SELECT {columns}, {key}, {tiebreak} FROM {table} WHERE {where}{resume} '
+                        f'ORDER BY {key}, {tiebreak} LIMIT ?', (*params, *last, batch)).fetchall()
+        for row in rows:
+            yield row[:-2]
+        if len(rows) < batch:
+            return
+        last = rows[-1][-2:]
+
+
+class SqliteSalesAggregates:
+    """SalesAggregates kept in the shared database.
+
+    Totals and the rolling minute/hour/day buckets are rows updated in the
+    transaction that adds or removes the order, so every worker reports the
+    same numbers. Buckets older than their ring are deleted as new ones are
+    written, so queries still read a bounded number of rows.
+    """
+
+    def __init__(self, db, order_store, brand_of=None):
+        self._db = db
+        self._brand_of = brand_of or (lambda product_id: None)
+        order_store.subscribe_in_transaction(self._apply)
+
+    def snapshot(self):
+        rows = self._db.query('SELECT kind, key, orders, revenue FROM sales_totals').fetchall()
+        order_count, revenue = 0, 0.0
+        by_brand, by_product = {}, {}
+        for kind, key, orders, amount in rows:
+            if kind == 'all':
+                order_count, revenue = orders, amount
+            elif kind == 'brand':
+                by_brand[key] = amount
+            else:
+                by_product[key] = amount
+        return {
+            'total_orders': order_count,
+            'total_revenue': revenue,
+            'average_order_value': (revenue / order_count) if order_count > 0 else 0,
+            'revenue_by_brand': by_brand,
+            'revenue_by_product': by_product,
+        }
+
+    def window(self, name, now=None):
+        now = time.time() if now is None else now
+        width, since = window_start(WINDOWS[name], now)
+        count, revenue = self._db.query(
+            'SELECT COALESCE(SUM(orders), 0), TOTAL(revenue) FROM sales_buckets WHERE width = ? AND start >= ?',
+            (width, since)).fetchone()
+        return {
+            'window': name,
+            'orders': count,
+            'revenue': revenue,
+            'average_order_value': (revenue / count) if count > 0 else 0,
+        }
+
+    def _apply(self, conn, event, order):
+        sign = -1 if event == 'remove' else 1
+        total, lines, ts = order_contribution(order, self._brand_of)
+        _bump(conn, 'all', '', sign, sign * total)
+        for product_id, brand, amount in lines:
+            _bump(conn, 'brand', brand, 0, sign * amount)
+            _bump(conn, 'product', str(product_id), 0, sign * amount)
+        now = time.time()
+        for width, size in RINGS:
+            oldest = now - width * size
+            conn.execute('DELETE FROM sales_buckets WHERE width = ? AND start <= ?', (width, oldest))
+            start = int(ts // width) * width
+            if start > oldest:
+                conn.execute('INSERT INTO sales_buckets VALUES (?, ?, ?, ?) ON CONFLICT (width, start) DO UPDATE '
+                             'SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue',
+                             (width, start, sign, sign * total))
+
+
+def _bump(conn, kind, key, orders, revenue):
+    conn.execute('INSERT INTO sales_totals VALUES (?, ?, ?, ?) ON CONFLICT (kind, key) DO UPDATE '
+                 'SET orders = orders + excluded.orders, revenue = revenue + excluded.revenue',
+                 (kind, key, orders, revenue))
+    if kind != 'all':
+        conn.execute('DELETE FROM sales_totals WHERE kind = ? AND key = ? AND revenue = 0', (kind, key))
+
+
+class SqliteUserStore:
+    """Users in the shared database; same interface as UserStore."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def __len__(self):
+        return self._db.query('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def __iter__(self):
+        rows = self._db.query('SELECT body FROM users ORDER BY id').fetchall()
+        return iter([json.loads(body) for body, in rows])
+
+    def get(self, user_id):
+        if not _is_id(user_id):
+            return None
+        row = self._db.query('SELECT body FROM users WHERE id = ?', (user_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def get_by_email(self, email):
+        if not _is_bindable(email):
+            return None
+        row = self._db.query('SELECT body FROM users WHERE email IS ? ORDER BY id DESC LIMIT 1',
+                             (email,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def create(self, build):
+        """Add the user returned by build(new_id); None if the email is taken"""
+        with self._db.write() as conn:
+            new_id = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM users').fetchone()[0]
+            user = build(new_id)
+            if conn.execute('SELECT 1 FROM users WHERE email IS ?', (user['email'],)).fetchone():
+                return None
+            self._put(conn, user)
+            return user
+
+    def put(self, user):
+        with self._db.write() as conn:
+            self._put(conn, user)
+
+    def update(self, user, changes):
+        """Apply changes to the stored copy of a user and to ``user`` itself; None if the new email is taken"""
+        with self._db.write() as conn:
+            email = changes.get('email')
+            if ('email' in changes and _is_bindable(email)
+                    and conn.execute('SELECT 1 FROM users WHERE email IS ? AND id != ?',
+                                     (email, user['id'])).fetchone()):
+                return None
+            row = conn.execute('SELECT body FROM users WHERE id = ?', (user['id'],)).fetchone()
+            stored = json.loads(row[0]) if row is not None else dict(user)
+            stored.update(changes)
+            self._put(conn, stored)
+        user.update(stored)
+        return user
+
+    def replace_all(self, users):
+        with self._db.write() as conn:
+            conn.execute('DELETE FROM users')
+            for user in users:
+                self._put(conn, user)
+
+    @staticmethod
+    def _put(conn, user):
+        email = user.get('email')
+        conn.execute('INSERT OR REPLACE INTO users VALUES (?, ?, ?)',
+                     (user['id'], email if _is_bindable(email) else None, _dumps(user)))
+
+
+class SqliteSessionStore:
+    """Login sessions in the shared database; same interface as SessionStore.
+
+    Expired sessions are deleted through the expiry index, and the
+    ``max_sessions`` cap is enforced every ``prune_every`` logins, so the
+    table can briefly hold up to that many extra sessions.
+    """
+
+    def __init__(self, db, ttl=86400, max_sessions=100000, prune_every=256, clock=time.time):
+        self._db = db
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.prune_every = prune_every
+        self._clock = clock
+        self._created = 0
+
+    def __len__(self):
+        return self._db.query('SELECT COUNT(*) FROM sessions WHERE expires > ?', (self._clock(),)).fetchone()[0]
+
+    def create(self, user_id):
+        token = secrets.token_urlsafe(32)
+        now = self._clock()
+        with self._db.write() as conn:
+            conn.execute('INSERT INTO sessions VALUES (?, ?, ?)', (token, user_id, now + self.ttl))
+            conn.execute('DELETE FROM sessions WHERE expires <= ?', (now,))
+            self._created += 1
+            if self._created % self.prune_every == 0:
+                excess = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0] - self.max_sessions
+                if excess > 0:
+                    conn.execute('DELETE FROM sessions WHERE token IN '
+                                 '(SELECT token FROM sessions ORDER BY expires LIMIT ?)', (excess,))
+        return token
+
+    def resolve(self, token):
+        if not token:
+            return None
+        row = self._db.query('SELECT user_id, expires FROM sessions WHERE token = ?', (token,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= self._clock():
+            self.revoke(token)
+            return None
+        return row[0]
+
+    def revoke(self, token):
+        if token:
+            with self._db.write() as conn:
+                conn.execute('DELETE FROM sessions WHERE token = ?', (token,))
+
+
+class SqliteInventory:
+    """Stock counters in the shared database; same interface as Inventory.
+
+    A reservation is one write transaction, so it is all-or-nothing across
+    processes. Inside another write() it runs in a savepoint, so OutOfStock
+    undoes only that reservation's decrements; the outer transaction goes
+    on if its caller handles the error.
+    """
+
+    def __init__(self, db, initial_stock):
+        self._db = db
+        self._initial_stock = initial_stock
+
+    def available(self, product_id):
+        row = self._db.query('SELECT available FROM stock WHERE product_id = ?', (product_id,)).fetchone()
+        return self._initial_stock(product_id) if row is None else row[0]
+
+    def reserve(self, quantities):
+        with self._db.write() as conn:
+            shortages = []
+            for pid, quantity in quantities.items():
+                available = self._count(conn, pid)
+                if available < quantity:
+                    shortages.append({'id': pid, 'requested': quantity, 'available': max(available, 0)})
+            if shortages:
+                raise OutOfStock(shortages)
+            conn.executemany('UPDATE stock SET available = available - ? WHERE product_id = ?',
+                             [(quantity, pid) for pid, quantity in quantities.items()])
+
+    def release(self, quantities):
+        self._adjust(quantities, 1)
+
+    def consume(self, quantities):
+        self._adjust(quantities, -1)
+
+    def _adjust(self, quantities, sign):
+        with self._db.write() as conn:
+            for pid, quantity in quantities.items():
+                self._count(conn, pid)
+                conn.execute('UPDATE stock SET available = available + ? WHERE product_id = ?', (sign * quantity, pid))
+
+    def _count(self, conn, product_id):
+        row = conn.execute('SELECT available FROM stock WHERE product_id = ?', (product_id,)).fetchone()
+        if row is not None:
+            return row[0]
+        available = self._initial_stock(product_id)
+        conn.execute('INSERT INTO stock VALUES (?, ?)', (product_id, available))
+        return available
+
+
+class SqliteContactStore:
+    """Contact messages in the shared database; same interface as ContactStore.
+
+    The listing indexes are expression indexes over the JSON body, matching
+    the conditions ``page`` builds.
+    """
+
+    def __init__(self, db):
+        self._db = db
+        # Databases written before the id counter existed
+        db.raise_to('last_contact_id', db.query('SELECT COALESCE(MAX(id), 0) FROM contacts').fetchone()[0])
+
+    def __len__(self):
+        return self._db.query('SELECT COUNT(*) FROM contacts').fetchone()[0]
+
+    def __iter__(self):
+        rows = self._db.query('SELECT body FROM contacts ORDER BY id').fetchall()
+        return iter([json.loads(body) for body, in rows])
+
+    def next_id(self):
+        return self._db.increment('last_contact_id')
+
+    def add(self, build):
+        with self._db.write():
+            message = build(self.next_id())
+            self.put(message)
+            return message
+
+    def put(self, message):
+        self.put_many([message])
+
+    def put_many(self, messages):
+        with self._db.write() as conn:
+            conn.executemany('INSERT OR IGNORE INTO contacts VALUES (?, ?)',
+                             [(m['id'], _dumps(m)) for m in messages])
+            if messages:
+                self._db.raise_to('last_contact_id', max(m['id'] for m in messages))
+
+    def replace_all(self, messages):
+        with self._db.write() as conn:
+            conn.execute('DELETE FROM contacts')
+            self.put_many(list(messages))
+
+    def page(self, after=None, limit=None, since=None, before=None, subject=None, newsletter=None):
+        conditions, params = [], []
+        if subject is not None:
+            conditions.append(f"{_CONTACT_SUBJECT} = ? AND json_type(body, '$.subject') = 'text'")
+            params.append(subject)
+        if newsletter is not None:
+            conditions.append(f'({_CONTACT_NEWSLETTER}) = ?')
+            params.append(int(newsletter))
+        if since is not None:
+            conditions.append(f'{_CONTACT_DATE} >= ?')
+            params.append(since)
+        if before is not None:
+            conditions.append(f'{_CONTACT_DATE} < ?')
+            params.append(before)
+        if after is not None:
+            row = self._db.query(f'SELECT {_CONTACT_DATE}, id FROM contacts WHERE id = ?', (after,)).fetchone()
+            condition = f'({_CONTACT_DATE}, id) > (?, ?)'
+            if row is None:
+                # The cursor message is gone; resume at the first later id, as ContactStore does
+                where = ' AND '.join(conditions + ['id > ?'])
+                row = self._db.query(f'SELECT {_CONTACT_DATE}, id FROM contacts WHERE {where} '
+                                     f'ORDER BY {_CONTACT_DATE}, id LIMIT 1', (*params, after)).fetchone()
+                if row is None:
+                    return []
+                condition = f'({_CONTACT_DATE}, id) >= (?, ?)'
+            conditions.append(condition)
+            params.extend(row)
+        where = ' AND '.join(conditions) or '1'
+        rows = self._db.query(f'SELECT body FROM contacts WHERE {where} ORDER BY {_CONTACT_DATE}, id LIMIT ?',
+                              (*params, -1 if limit is None else limit)).fetchall()
+        return [json.loads(body) for body, in rows]
+
+
+# Expressions the contacts indexes in _SCHEMA are built on
+_CONTACT_DATE = "ifnull(json_extract(body, '$.submittedAt'), '')"
+_CONTACT_SUBJECT = "json_extract(body, '$.subject')"
+_CONTACT_NEWSLETTER = "json_type(body, '$.newsletter') = 'true'"
+_FILE_DATE = "ifnull(json_extract(body, '$.upload_date'), '')"
+
+
+class SqliteFileIndex:
+    """Uploads metadata in the shared database; same interface as FileIndex."""
+
+    def __init__(self, db):
+        self._db = db
+
+    def for_user(self, user_id):
+        if not _is_bindable(user_id):
+            return []
+        rows = self._db.query('SELECT body FROM user_files WHERE user_id = ? ORDER BY seq', (user_id,)).fetchall()
+        return [json.loads(body) for body, in rows]
+
+    def add(self, user_id, file_info):
+        with self._db.write() as conn:
+            conn.execute('INSERT OR IGNORE INTO user_files (user_id, file_id, body) VALUES (?, ?, ?)',
+                         (user_id, file_info['id'], _dumps(file_info)))
+
+    def items(self):
+        grouped = {}
+        for user_id, body in self._db.query('SELECT user_id, body FROM user_files ORDER BY seq'):
+            grouped.setdefault(user_id, []).append(json.loads(body))
+        return [[user_id, files] for user_id, files in grouped.items()]
+
+    def scan(self, since=None, before=None, batch=500):
+        """Yield (user id, file) pairs by upload date, ``batch`` rows per query"""
+        conditions, params = [], []
+        if since is not None:
+            conditions.append(f'{_FILE_DATE} >= ?')
+            params.append(since)
+        if before is not None:
+            conditions.append(f'{_FILE_DATE} < ?')
+            params.append(before)
+        for user_id, body in _keyset_scan(self._db, 'user_files', _FILE_DATE, 'seq', conditions, params, batch,
+                                          columns='user_id, body'):
+            yield user_id, json.loads(body)
+
+    def replace_all(self, items):
+        with self._db.write() as conn:
+            conn.execute('DELETE FROM user_files')
+            for user_id, files in items:
+                for file_info in files:
+                    self.add(user_id, file_info)
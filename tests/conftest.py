@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The modules under test live at the top level of the project
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture
+def app_module(monkeypatch):
+    """The app module with state in memory only; its catalog is put back afterwards"""
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv('NGM_DATA_DIR', '')
+    monkeypatch.setenv('NGM_RATE_LIMITS', 'off')
+    import app
+    original = app.catalog.all()
+    yield app
+    app.install_catalog(app.build_catalog(original, ready=True))
@@ -0,0 +1,110 @@
+"""Catalog files, deferred index builds and background reloads."""
+import threading
+
+import pytest
+
+from catalog_loader import CatalogFileError, CatalogReloader, Deferred, read_products, write_products
+
+
+def products(count, brand='Acme', price=100):
+    return [{'id': i, 'name': f'Phone {i}', 'price': price, 'brand': brand} for i in range(1, count + 1)]
+
+
+def test_read_products_round_trip(tmp_path):
+    path = str(tmp_path / 'catalog.jsonl')
+    write_products(path, products(3))
+    assert read_products(path) == products(3)
+
+
+@pytest.mark.parametrize('line, message', [
+    ('{"id": 1, "name": "x", "price": 1}', 'needs'),
+    ('{"id": 1, "name": "x", "price": "1", "brand": "b"}', 'price a number'),
+    ('{"id": 1, "name": "x", "price": 1, "brand": "b"', 'invalid JSON'),
+])
+def test_read_products_reports_the_bad_line(tmp_path, line, message):
+    path = tmp_path / 'catalog.jsonl'
+    path.write_text('{"id": 0, "name": "ok", "price": 1, "brand": "b"}\n\n' + line + '\n')
+    with pytest.raises(CatalogFileError, match=f':3: .*{message}'):
+        read_products(str(path))
+
+
+def test_read_products_rejects_duplicate_ids(tmp_path):
+    path = str(tmp_path / 'catalog.jsonl')
+    write_products(path, products(2) + products(1))
+    with pytest.raises(CatalogFileError, match='duplicate product id 1'):
+        read_products(path)
+
+
+def test_deferred_builds_once_and_raises_build_errors():
+    calls = []
+    deferred = Deferred(lambda: calls.append(1) or [1, 2])
+    assert not deferred.ready
+    assert len(deferred) == 2 and len(deferred) == 2
+    assert calls == [1]
+
+    def fail():
+        raise ValueError('bad index')
+    with pytest.raises(ValueError, match='bad index'):
+        Deferred(fail).get()
+
+
+def test_reloader_installs_only_finished_builds():
+    installed = []
+    gate = threading.Event()
+    reloader = CatalogReloader(lambda items: gate.wait() and list(items), installed.append)
+    assert reloader.reload(lambda: [1, 2])
+    assert not reloader.reload(lambda: [3])  # one reload at a time
+    assert installed == []
+    gate.set()
+    assert reloader.wait(5)
+    assert installed == [[1, 2]]
+    assert reloader.status()['last']['status'] == 'ok'
+
+
+def test_failed_reload_keeps_the_current_catalog():
+    installed = []
+    reloader = CatalogReloader(list, installed.append)
+
+    def load():
+        raise CatalogFileError('catalog.jsonl:2: invalid JSON')
+    reloader.reload(load)
+    reloader.wait(5)
+    assert installed == []
+    last = reloader.status()['last']
+    assert (last['status'], last['error']) == ('failed', 'catalog.jsonl:2: invalid JSON')
+
+
+def test_reload_swaps_the_whole_catalog_under_load(app_module, tmp_path, monkeypatch):
+    app = app_module
+    path = str(tmp_path / 'catalog.jsonl')
+    write_products(path, products(200, brand='New', price=7))
+    monkeypatch.setitem(app.app.config, 'CATALOG_PATH', path)
+    app.install_catalog(app.build_catalog(products(100, brand='Old', price=3), ready=True))
+
+    seen = set()
+    stop = threading.Event()
+
+    def read():
+        client = app.app.test_client()
+        while not stop.is_set():
+            listing = client.get('/api/products').get_json()
+            brands = client.get('/api/brands').get_json()
+            seen.add((len(listing), frozenset(p['brand'] for p in listing), tuple(brands)))
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        assert app.reload_catalog()
+        assert app.catalog_reloader.wait(10)
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    assert app.catalog_reloader.status()['last']['status'] == 'ok'
+    assert {(n, b) for n, b, _ in seen} <= {(100, frozenset({'Old'})), (200, frozenset({'New'}))}
+    client = app.app.test_client()
+    assert len(client.get('/api/products').get_json()) == 200
+    assert client.get('/api/brands').get_json() == ['New']
+    assert app.search_index.search('phone')[0] == 200
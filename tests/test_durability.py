@@ -0,0 +1,82 @@
+"""Recovery from the write-ahead log and snapshots."""
+import os
+
+from durability import Durability, WriteAheadLog
+
+
+def open_store(directory, state):
+    durable = Durability(
+        directory,
+        capture=lambda: dict(state),
+        restore=lambda snapshot: state.update(snapshot),
+        apply=lambda kind, data: state.update({data['id']: data}) if kind == 'put' else state.pop(data['id'], None),
+        fsync='always')
+    durable.recover()
+    return durable
+
+
+def put(durable, state, id_):
+    record = {'id': id_}
+    state[id_] = record
+    durable.record('put', record)
+
+
+def last_segment(directory):
+    return os.path.join(directory, max(name for name in os.listdir(directory) if name.endswith('.log')))
+
+
+def test_replay_stops_at_a_torn_record(tmp_path):
+    state = {}
+    durable = open_store(tmp_path, state)
+    for id_ in ('a', 'b', 'c'):
+        put(durable, state, id_)
+    durable.close()
+    with open(last_segment(tmp_path), 'ab') as f:
+        f.write(b'{"lsn":4,"k":"put","d":{"id":')  # crashed part-way through a write
+
+    recovered = {}
+    durable = open_store(tmp_path, recovered)
+    assert sorted(recovered) == ['a', 'b', 'c']
+    assert durable.log.last_lsn == 3
+    durable.close()
+
+
+def test_log_continues_after_a_torn_record(tmp_path):
+    state = {}
+    durable = open_store(tmp_path, state)
+    put(durable, state, 'a')
+    durable.close()
+    with open(last_segment(tmp_path), 'ab') as f:
+        f.write(b'{"lsn":2,"k":"pu')
+
+    durable = open_store(tmp_path, state)
+    put(durable, state, 'b')
+    durable.close()
+
+    recovered = {}
+    durable = open_store(tmp_path, recovered)
+    assert sorted(recovered) == ['a', 'b']
+    assert [lsn for lsn, _, _ in durable.log.replay()] == [1, 2]
+    durable.close()
+
+
+def test_snapshot_then_tail_replay(tmp_path):
+    state = {}
+    durable = open_store(tmp_path, state)
+    put(durable, state, 'a')
+    put(durable, state, 'b')
+    assert durable.snapshot() == 2
+    put(durable, state, 'c')
+    durable.log.append('delete', {'id': 'a'})
+    durable.close()
+
+    recovered = {}
+    durable = open_store(tmp_path, recovered)
+    assert sorted(recovered) == ['b', 'c']
+    durable.close()
+
+
+def test_empty_log_replays_nothing(tmp_path):
+    log = WriteAheadLog(tmp_path, fsync='always')
+    assert list(log.replay()) == []
+    log.close()
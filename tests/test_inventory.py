@@ -0,0 +1,78 @@
+"""All-or-nothing stock reservations, in memory and in the shared database."""
+import threading
+
+import pytest
+
+from inventory import Inventory, OutOfStock
+from shared_state import SharedDatabase, SqliteInventory
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return None, Inventory(lambda product_id: 5)
+    db = SharedDatabase(str(tmp_path / 'shared.db'))
+    return db, SqliteInventory(db, lambda product_id: 5)
+
+
+def test_out_of_stock_takes_nothing(store):
+    _, inventory = store
+    with pytest.raises(OutOfStock) as error:
+        inventory.reserve({1: 2, 2: 6})
+    assert error.value.shortages == [{'id': 2, 'requested': 6, 'available': 5}]
+    assert inventory.available(1) == 5
+    assert inventory.available(2) == 5
+
+
+def test_reserve_and_release(store):
+    _, inventory = store
+    inventory.reserve({1: 2, 2: 5})
+    assert (inventory.available(1), inventory.available(2)) == (3, 0)
+    inventory.release({1: 2})
+    assert inventory.available(1) == 5
+
+
+def test_concurrent_reservations_never_oversell(store):
+    _, inventory = store
+    results = []
+
+    def buy():
+        try:
+            inventory.reserve({1: 1})
+            results.append(True)
+        except OutOfStock:
+            results.append(False)
+
+    threads = [threading.Thread(target=buy) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 5
+    assert inventory.available(1) == 0
+
+
+def test_nested_out_of_stock_rolls_back_only_its_savepoint(tmp_path):
+    db = SharedDatabase(str(tmp_path / 'shared.db'))
+    inventory = SqliteInventory(db, lambda product_id: 5)
+    with db.write():
+        inventory.reserve({1: 1})
+        with pytest.raises(OutOfStock):
+            with db.write():
+                inventory.reserve({2: 2})
+                inventory.reserve({3: 6})
+        inventory.reserve({4: 1})
+    assert [inventory.available(pid) for pid in (1, 2, 3, 4)] == [4, 5, 5, 4]
+
+
+def test_error_in_outer_write_rolls_back_everything(tmp_path):
+    db = SharedDatabase(str(tmp_path / 'shared.db'))
+    inventory = SqliteInventory(db, lambda product_id: 5)
+    with pytest.raises(RuntimeError):
+        with db.write():
+            inventory.reserve({1: 1})
+            with db.write():
+                inventory.reserve({2: 1})
+            raise RuntimeError('abort')
+    assert inventory.available(1) == 5
+    assert inventory.available(2) == 5
@@ -0,0 +1,26 @@
+"""Server-rendered product pages."""
+import json
+import re
+
+
+def island(body, element_id):
+    return json.loads(re.search(rf'<script type="application/json" id="{element_id}"[^>]*>(.*?)</script>',
+                                body, re.S).group(1))
+
+
+def test_pages_show_the_catalog_photo(app_module):
+    app = app_module
+    app.install_catalog(app.build_catalog([
+        {'id': 1, 'name': 'iPhone 15 Pro', 'price': 999, 'brand': 'Apple', 'photo': 'nothing.jpg'},
+        {'id': 2, 'name': 'Mystery', 'price': 5, 'brand': 'Acme', 'image': 'https://example.com/m.jpg'},
+    ], ready=True))
+    client = app.app.test_client()
+
+    listing = client.get('/products.html').get_data(as_text=True)
+    assert 'src="./images/nothing.jpg"' in listing
+    assert 'src="https://example.com/m.jpg"' in listing
+    assert [p['image'] for p in island(listing, 'productsData')] == ['images/nothing.jpg', 'https://example.com/m.jpg']
+
+    detail = client.get('/product-detail.html?id=1').get_data(as_text=True)
+    assert 'src="./images/nothing.jpg"' in detail
+    assert island(detail, 'productData')['image'] == 'images/nothing.jpg'
@@ -0,0 +1,56 @@
+"""Cached catalog responses, including the large listings that are streamed."""
+from flask import Flask, Response
+
+from pagination import STREAM_THRESHOLD
+from response_cache import ResponseCache
+
+
+def products(count):
+    return [{'id': i, 'name': f'Phone {i}', 'price': 100 + i, 'brand': 'Acme'} for i in range(1, count + 1)]
+
+
+def test_streamed_listing_is_cached_and_answers_if_none_match(app_module):
+    app = app_module
+    app.install_catalog(app.build_catalog(products(STREAM_THRESHOLD + 1), ready=True))
+    client = app.app.test_client()
+    for path in ('/api/products', '/api/products/filter?brand=acme'):
+        first = client.get(path)
+        assert len(first.get_json()) == STREAM_THRESHOLD + 1
+        assert first.headers['ETag']
+        again = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+        assert again.status_code == 304
+        assert again.data == b''
+
+
+def test_body_over_the_entry_limit_streams_through_uncached():
+    flask_app = Flask(__name__)
+    cache = ResponseCache(lambda: 1, max_entry_bytes=10)
+    calls = []
+
+    @flask_app.route('/big')
+    @cache.cached
+    def big():
+        calls.append(1)
+        return Response(iter(['[', '1,2,3,4,5,', '6,7,8,9', ']']), mimetype='application/json')
+
+    client = flask_app.test_client()
+    for _ in range(2):
+        response = client.get('/big')
+        assert response.get_json() == [1, 2, 3, 4, 5, 6, 7, 8, 9]
+        assert 'ETag' not in response.headers
+    assert len(calls) == 2
+
+
+def test_total_size_is_bounded():
+    flask_app = Flask(__name__)
+    cache = ResponseCache(lambda: 1, max_entry_bytes=100, max_bytes=250)
+
+    @flask_app.route('/item/<int:n>')
+    @cache.cached
+    def item(n):
+        return Response('x' * 100)
+
+    client = flask_app.test_client()
+    for n in range(5):
+        client.get(f'/item/{n}')
+    assert len(cache._entries) == 2 and cache._bytes == 200
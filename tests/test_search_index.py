@@ -0,0 +1,43 @@
+"""Ranked product search and its typo tolerance."""
+import pytest
+
+from catalog import Catalog
+from search_index import SearchIndex, _within_distance
+
+PRODUCTS = [
+    {'id': 1, 'name': 'Google Pixel 8', 'brand': 'Google', 'price': 699},
+    {'id': 2, 'name': 'Samsung Galaxy S24', 'brand': 'Samsung', 'price': 899},
+    {'id': 3, 'name': 'Sony Xperia 1 V', 'brand': 'Sony', 'price': 1199},
+]
+
+
+@pytest.fixture
+def index():
+    return SearchIndex(Catalog(PRODUCTS))
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('pixle', [1]),  # neighbouring letters swapped
+    ('glaaxy', [2]),  # one letter too many
+    ('xperai', [3]),
+    ('samsnug galxay', [2]),
+])
+def test_typos_still_match(index, query, expected):
+    total, found = index.search(query)
+    assert [p['id'] for p in found] == expected
+
+
+@pytest.mark.parametrize('a, b, distance, within', [
+    ('pixle', 'pixel', 1, True),
+    ('pixel', 'pixel', 0, True),
+    ('ipxle', 'pixel', 1, False),
+    ('ipxle', 'pixel', 2, True),
+    ('pxiel', 'pixel', 1, True),
+    ('pixels', 'pxiel', 1, False),
+])
+def test_within_distance_counts_a_swap_as_one_edit(a, b, distance, within):
+    assert _within_distance(a, b, distance) is within
+
+
+def test_unrelated_terms_do_not_match(index):
+    assert index.search('zzzz') == (0, [])
@@ -0,0 +1,44 @@
+"""Session expiry and the session cap."""
+import sessions
+from sessions import SessionStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_sessions_expire_after_ttl():
+    clock = Clock()
+    store = SessionStore(ttl=60, clock=clock)
+    token = store.create(7)
+    clock.now += 59
+    assert store.resolve(token) == 7
+    clock.now += 1
+    assert store.resolve(token) is None
+    assert len(store) == 0
+
+
+def test_idle_store_holds_no_slots_and_sweeps_a_bounded_amount():
+    clock = Clock()
+    store = SessionStore(ttl=86400, clock=clock)
+    assert store._slots == {}
+    tokens = []
+    for _ in range(sessions.MAX_SWEEP_SLOTS * 2):
+        tokens.append(store.create(1))
+        clock.now += 1
+    clock.now += 86400 * 10  # long idle period
+    store.create(2)
+    assert len(store) == sessions.MAX_SWEEP_SLOTS + 1
+    assert all(store.resolve(token) is None for token in tokens)
+
+
+def test_oldest_sessions_are_evicted_past_the_cap():
+    store = SessionStore(max_sessions=2, clock=Clock())
+    first, second, third = store.create(1), store.create(2), store.create(3)
+    assert store.resolve(first) is None
+    assert (store.resolve(second), store.resolve(third)) == (2, 3)
+    assert sum(len(slot) for slot in store._slots.values()) == 2
@@ -0,0 +1,102 @@
+"""Bounded queue drained in batches by a background writer thread."""
+import collections
+import itertools
+import logging
+import threading
+import time
+
+log = logging.getLogger('ngm.write_behind')
+
+
+class QueueFull(Exception):
+    """Raised by submit() when max_pending items are already waiting."""
+
+
+class WriteBehindQueue:
+    """Accepts items at once and stores them later, in batches.
+
+    ``submit(build)`` calls build() under the queue lock and queues what it
+    returns, so items are queued in the order build() produced them (ids
+    allocated inside build() stay in order). A writer thread passes up to
+    ``batch_size`` waiting items at a time to ``write_batch``. Items count
+    against ``max_pending`` until they are written; past that, submit()
+    raises QueueFull so callers can push back instead of growing memory.
+    A failed batch is logged and retried after ``retry_interval`` seconds.
+    """
+
+    def __init__(self, write_batch, max_pending=10000, batch_size=500, retry_interval=1.0, name='write-behind'):
+        if max_pending < 1 or batch_size < 1:
+            raise ValueError('max_pending and batch_size must be positive')
+        self.write_batch = write_batch
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.name = name
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._written = threading.Condition(self._lock)
+        self._pending = collections.deque()
+        self._submitted = 0
+        self._done = 0
+        self._closed = False
+        self._writer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(self, build):
+        """Queue build()'s result and return it; raises QueueFull when full"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f'{self.name} queue is closed')
+            if len(self._pending) >= self.max_pending:
+                raise QueueFull(f'{len(self._pending)} items are waiting to be written')
+            item = build()
+            self._pending.append(item)
+            self._submitted += 1
+            if self._writer is None:
+                # Started on first use, so a server that forks workers after import gets one per worker
+                self._writer = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._writer.start()
+            self._wakeup.notify()
+            return item
+
+    def flush(self):
+        """Block until everything submitted so far has been written"""
+        with self._lock:
+            target = self._submitted
+            while self._done < target and self._writer is not None and self._writer.is_alive():
+                self._written.wait()
+
+    def close(self):
+        """Write what is still queued and stop the writer"""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+            writer = self._writer
+        if writer is not None:
+            writer.join()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if not self._pending:
+                    return
+                batch = list(itertools.islice(self._pending, self.batch_size))
+            try:
+                self.write_batch(batch)
+            except Exception:
+                if self._closed:
+                    log.exception('%s: writing %d items failed while closing; dropping them', self.name,
+                                  len(self._pending))
+                    return
+                log.exception('%s: writing %d items failed; retrying', self.name, len(batch))
+                time.sleep(self.retry_interval)
+                continue
+            with self._lock:
+                for _ in batch:
+                    self._pending.popleft()
+                self._done += len(batch)
+                self._written.notify_all()